@@ -0,0 +1,58 @@
+"""
+Measures building a CSR adjacency of a random graph and running analytics on it
+
+python benchmarks/bench_analytics.py [nodes] [edges]
+"""
+import sys
+import time
+
+import numpy as np
+
+from grapher.graph.analytics import CSRGraph
+
+
+def measure(label, run, repeat=1):
+    """
+    :type label str
+    :type run callable
+    :type repeat int
+    :rtype: object the last result
+    """
+    started = time.perf_counter()
+
+    for _ in range(repeat):
+        result = run()
+
+    print('{:>24} {:>10.1f}'.format(label, (time.perf_counter() - started) / repeat * 1000))
+    return result
+
+
+def main():
+    """
+    Build the graph and run each kind of analysis
+    """
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    edges = int(sys.argv[2]) if len(sys.argv) > 2 else 2000000
+
+    generator = np.random.RandomState(42)
+    sources = generator.randint(0, size, edges)
+    targets = generator.randint(0, size, edges)
+    nodes = [('Person', str(node)) for node in range(size)]
+
+    print('{} nodes, {} edges'.format(size, edges))
+    print('{:>24} {:>10}'.format('', 'time [ms]'))
+
+    graph = measure('build', lambda: CSRGraph(nodes, sources, targets))
+
+    pairs = generator.randint(0, size, (20, 2))
+    paths = iter(pairs.tolist() * 2)
+
+    measure('shortest path', lambda: graph.shortest_path(*next(paths)), repeat=20)
+    measure('3-hop neighbourhood', lambda: graph.get_neighbourhood(0, hops=3), repeat=10)
+    measure('rank by degree', lambda: graph.rank_by_degree(limit=10), repeat=10)
+    measure('pagerank', graph.get_pagerank)
+    measure('components', graph.get_components)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Measures how long it takes to get squads of many clubs with a query per club
+and with batch queries (a query per BATCH_QUERY_SIZE clubs)
+
+python benchmarks/bench_batch.py [host] [port] [clubs]
+"""
+import sys
+import time
+
+from grapher.graph import RedisGraph
+from grapher.graph.connection import close_pools
+from grapher.graph.results import ResultSet
+from grapher.scripts.query_football_graph import BATCH_QUERY_SIZE, QUERIES
+from grapher.utils import chunks
+
+
+def query_looped(graph, clubs):
+    """
+    :type graph Graph
+    :type clubs list[str]
+    :rtype: int queries sent
+    """
+    for club in clubs:
+        ResultSet.from_response(
+            graph.query(QUERIES.prepare('current_squad', club=club)).result_set)
+
+    return len(clubs)
+
+
+def query_batched(graph, clubs):
+    """
+    :type graph Graph
+    :type clubs list[str]
+    :rtype: int queries sent
+    """
+    queries = 0
+
+    for batch in chunks(clubs, BATCH_QUERY_SIZE):
+        ResultSet.from_response(graph.query(
+            QUERIES.prepare_batch('current_squad', 'club', batch)).result_set).split(batch)
+        queries += 1
+
+    return queries
+
+
+def main():
+    """
+    Ask for squads of the same clubs in both modes
+    """
+    host = sys.argv[1] if len(sys.argv) > 1 else 'localhost'
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 56379
+    count = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+
+    graph = RedisGraph(host=host, port=port).get_current_redisgraph('football')
+    clubs = ['Club #{}'.format(club) for club in range(count)]
+
+    print('Squads of {} clubs from {}:{}'.format(count, host, port))
+    print('{:>8} {:>8} {:>10} {:>12}'.format('', 'queries', 'time [s]', 'clubs / s'))
+
+    for (label, run) in (
+            ('looped', query_looped),
+            ('batched', query_batched),
+    ):
+        started = time.perf_counter()
+        queries = run(graph, clubs)
+        took = time.perf_counter() - started
+
+        print('{:>8} {:>8} {:>10.3f} {:>12.0f}'.format(label, queries, took, count / took))
+
+    close_pools()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Measures per-query latency when a new connection is made for each query
+(as query_redis used to do) and when connections are taken from the shared pool
+
+python benchmarks/bench_connection.py [host] [port] [queries]
+"""
+import sys
+import time
+
+import redis
+from redisgraph import Graph
+
+from grapher.graph import RedisGraph
+from grapher.graph.connection import close_pools
+
+QUERY = 'MATCH (n:SportsTeam) RETURN count(n)'
+
+
+def query_with_reconnect(host, port):
+    """
+    Connect, ask for the current graph version and query it
+
+    :type host str
+    :type port int
+    """
+    connection = redis.Redis(host, port)
+
+    try:
+        current = connection.get('graph:football:current')
+        Graph(current.decode('utf-8') if current else 'football', connection).query(QUERY)
+    finally:
+        connection.connection_pool.disconnect()
+
+
+def query_with_pool(graph):
+    """
+    :type graph RedisGraph
+    """
+    graph.get_current_redisgraph('football').query(QUERY)
+
+
+def measure(run, queries):
+    """
+    :type run callable
+    :type queries int
+    :rtype: list[float] sorted latencies [ms]
+    """
+    latencies = []
+
+    for _ in range(queries):
+        started = time.perf_counter()
+        run()
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    return sorted(latencies)
+
+
+def main():
+    """
+    Run the same queries in both modes
+    """
+    host = sys.argv[1] if len(sys.argv) > 1 else 'localhost'
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 56379
+    queries = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+
+    graph = RedisGraph(host=host, port=port)
+
+    print('{} queries against {}:{}'.format(queries, host, port))
+    print('{:>12} {:>10} {:>10} {:>10}'.format('', 'mean [ms]', 'p50 [ms]', 'p99 [ms]'))
+
+    for (label, run) in (
+            ('reconnect', lambda: query_with_reconnect(host, port)),
+            ('pool', lambda: query_with_pool(graph)),
+    ):
+        latencies = measure(run, queries)
+
+        print('{:>12} {:>10.3f} {:>10.3f} {:>10.3f}'.format(
+            label, sum(latencies) / queries, latencies[queries // 2],
+            latencies[int(queries * 0.99)]))
+
+    close_pools()
+
+
+if __name__ == '__main__':
+    main()
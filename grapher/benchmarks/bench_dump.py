@@ -0,0 +1,105 @@
+"""
+Measures how long it takes to dump the graph and how much memory it needs
+
+python benchmarks/bench_dump.py
+"""
+import time
+import tracemalloc
+from os import devnull
+
+from grapher.graph import RedisGraph
+from grapher.models import PersonModel, SportsTeamModel
+
+
+class ConcatenatingRedisGraph(RedisGraph):
+    """
+    Builds the dump by growing a single string (as it was done before dumps were streamed)
+    """
+    def dump(self, graph_name):
+        redis_graph = self._build_graph(graph_name)
+        query = ''
+
+        for _, node in redis_graph.nodes.items():
+            query += str(node) + ','
+
+        for edge in redis_graph.edges:
+            query += str(edge) + ','
+
+        if query[-1] == ',':
+            query = query[:-1]
+
+        query = query.replace('"', '\\"')
+
+        return 'GRAPH.QUERY {name} "CREATE {graph}"'.format(name=graph_name, graph=query)
+
+
+def fill(graph, players):
+    """
+    Add players (each with five clubs) and their clubs to the graph
+
+    :type graph RedisGraph
+    :type players int
+    """
+    clubs = max(players // 20, 1)
+
+    for index in range(clubs):
+        graph.add(SportsTeamModel(name='Club #{}'.format(index)))
+
+    for index in range(players):
+        model = PersonModel(name='Player #{}'.format(index))
+        model.add_property('birthDate', 1970 + index % 30)
+
+        for offset in range(5):
+            model.add_relation(
+                'athlete', SportsTeamModel.get_node_id_by_name(
+                    'Club #{}'.format((index + offset) % clubs)),
+                {'since': 1990 + offset, 'until': 1992 + offset})
+
+        graph.add(model)
+
+
+def measure(dump):
+    """
+    :type dump callable
+    :rtype: tuple[float, float] time [s] and peak memory [MB]
+    """
+    tracemalloc.start()
+    started = time.time()
+
+    dump()
+
+    took = time.time() - started
+    (_, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return took, peak / 1024 / 1024
+
+
+def main():
+    """
+    Compare both implementations for graphs of different sizes
+    """
+    print('{:>8} {:>8} {:>16} {:>16} {:>16} {:>16}'.format(
+        'players', 'edges', 'concat [s]', 'concat [MB]', 'stream [s]', 'stream [MB]'))
+
+    for players in (2000, 20000):
+        before = ConcatenatingRedisGraph(host='localhost')
+        fill(before, players)
+
+        after = RedisGraph(host='localhost')
+        fill(after, players)
+
+        def dump_to_file():
+            with open(devnull, 'wt') as output:
+                after.dump_to_file('football', output)
+
+        (before_time, before_memory) = measure(lambda: before.dump('football'))
+        (after_time, after_memory) = measure(dump_to_file)
+
+        print('{:>8} {:>8} {:>16.2f} {:>16.1f} {:>16.2f} {:>16.1f}'.format(
+            players, after.models.get_edges_count(),
+            before_time, before_memory, after_time, after_memory))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Measures how parsing of pages scales with the number of worker processes
+
+python benchmarks/bench_extract.py
+"""
+import logging
+import time
+from os import cpu_count, listdir, path
+
+from grapher.cache import CacheEntry
+from grapher.scripts.index_football_wiki import Wiki
+
+FIXTURES = path.join(path.dirname(__file__), '..', 'test', 'fixtures')
+
+# how many times each fixture page is parsed
+PAGES = 2000
+
+
+class FakeCache(object):
+    """
+    Warm cache - returns fixtures content for all pages
+    """
+    def __init__(self):
+        self.contents = []
+
+        for name in sorted(listdir(FIXTURES)):
+            with open(path.join(FIXTURES, name), 'rt') as fixture:
+                self.contents.append(fixture.read())
+
+    def get_entries(self, _, titles):
+        return {
+            title: CacheEntry(self.contents[int(title) % len(self.contents)], None, None, 0)
+            for title in titles
+        }
+
+    @staticmethod
+    def is_fresh(_):
+        return True
+
+
+def main():
+    """
+    Parse the same set of pages using a growing number of workers
+    """
+    logging.disable(logging.ERROR)
+
+    wiki = Wiki('football.wikia.com', cache=FakeCache())
+    titles = [str(i) for i in range(PAGES)]
+
+    print('{:>8} {:>10} {:>10} {:>8}'.format('workers', 'time [s]', 'pages/s', 'speedup'))
+    baseline = None
+
+    for workers in sorted({1, 2, 4, 8, 16, cpu_count()}):
+        if workers > cpu_count():
+            continue
+
+        start = time.time()
+        models = sum(1 for _ in wiki.iter_models_from_pages(titles, workers=workers))
+        took = time.time() - start
+
+        baseline = baseline or took
+        assert models == PAGES
+
+        print('{:>8} {:>10.2f} {:>10.0f} {:>7.1f}x'.format(
+            workers, took, PAGES / took, baseline / took))
+
+
+if __name__ == '__main__':
+    main()
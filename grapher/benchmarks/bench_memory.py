@@ -0,0 +1,172 @@
+"""
+Measures the memory needed to keep a large graph of models
+
+python benchmarks/bench_memory.py [nodes] [edges]
+"""
+import resource
+import sys
+from collections import OrderedDict
+from multiprocessing import Process, Queue
+
+from grapher.models import BaseModel, ModelStore, PersonModel, SportsTeamModel
+
+
+class LegacyModel(object):
+    """
+    Keeps properties and relations the way models did before node IDs and slots were used
+    """
+    def __init__(self, model_type, name):
+        self.type = model_type
+        self.name = name
+        self.properties = OrderedDict(name=name)
+        self.relations = list()
+
+
+def generate(nodes, edges):
+    """
+    Yield people (and clubs they played for) with given total number of relations
+
+    :type nodes int
+    :type edges int
+    :rtype: list[tuple[str, str, dict, list[tuple[str, str, dict]]]]
+    """
+    clubs = max(nodes // 20, 1)
+    (per_node, extra) = divmod(edges, nodes - clubs)
+
+    for index in range(nodes):
+        if index < clubs:
+            yield ('SportsTeam', 'Club #{}'.format(index), {'sport': 'Football'}, [])
+            continue
+
+        relations = [
+            ('athlete', 'Club #{}'.format((index + offset) % clubs),
+             {'since': 1990 + offset, 'until': 1992 + offset})
+            for offset in range(per_node + (1 if index - clubs < extra else 0))
+        ]
+
+        yield ('Person', 'Player #{}'.format(index),
+               {'birthDate': 1970 + index % 30, 'height': 1.70 + index % 30 / 100}, relations)
+
+
+def build_legacy(nodes, edges):
+    """
+    :type nodes int
+    :type edges int
+    :rtype: list[LegacyModel]
+    """
+    models = []
+
+    for (model_type, name, properties, relations) in generate(nodes, edges):
+        model = LegacyModel(model_type, name)
+        model.properties.update(properties)
+
+        for (relation, target, edge_properties) in relations:
+            # node name was built for each relation
+            model.relations.append((relation, '{}:SportsTeam'.format(
+                BaseModel.encode_name(target)), edge_properties))
+
+        models.append(model)
+
+    return models
+
+
+def iter_models(nodes, edges):
+    """
+    :type nodes int
+    :type edges int
+    :rtype: list[BaseModel]
+    """
+    classes = {'Person': PersonModel, 'SportsTeam': SportsTeamModel}
+
+    for (model_type, name, properties, relations) in generate(nodes, edges):
+        model = classes[model_type](name)
+
+        for (key, value) in properties.items():
+            model.add_property(key, value)
+
+        for (relation, target, edge_properties) in relations:
+            model.add_relation(
+                relation, SportsTeamModel.get_node_id_by_name(target), edge_properties)
+
+        yield model
+
+
+def build_registry(nodes, edges):
+    """
+    :type nodes int
+    :type edges int
+    """
+    for _ in iter_models(nodes, edges):
+        pass
+
+    return BaseModel.registry
+
+
+def build_objects(nodes, edges):
+    """
+    :type nodes int
+    :type edges int
+    :rtype: list[BaseModel]
+    """
+    return list(iter_models(nodes, edges))
+
+
+def build_store(nodes, edges):
+    """
+    :type nodes int
+    :type edges int
+    :rtype: ModelStore
+    """
+    store = ModelStore()
+
+    for model in iter_models(nodes, edges):
+        store.add(model)
+
+    return store
+
+
+def measure(build, nodes, edges, results):
+    """
+    Report how much the peak memory usage (RSS) has grown while building models [MB]
+
+    :type build callable
+    :type nodes int
+    :type edges int
+    :type results Queue
+    """
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    graph = build(nodes, edges)
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    results.put((after - before) / 1024)
+    del graph
+
+
+def main():
+    """
+    Build the graph in a fresh process for each representation
+    """
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    edges = int(sys.argv[2]) if len(sys.argv) > 2 else 5000000
+
+    print('{} nodes, {} edges'.format(nodes, edges))
+    print('{:>30} {:>10}'.format('', 'RSS [MB]'))
+
+    for (label, build) in (
+            ('objects with dicts (before)', build_legacy),
+            ('node registry only', build_registry),
+            ('slotted objects', build_objects),
+            ('columnar store', build_store),
+    ):
+        results = Queue()
+        process = Process(target=measure, args=(build, nodes, edges, results))
+        process.start()
+
+        size = results.get()
+        process.join()
+
+        print('{:>30} {:>10.1f}'.format(label, size))
+
+
+if __name__ == '__main__':
+    main()
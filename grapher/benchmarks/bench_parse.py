@@ -0,0 +1,88 @@
+"""
+Measures how long it takes to get models from club pages
+
+python benchmarks/bench_parse.py
+"""
+import json
+import timeit
+from os import path
+
+from grapher.sources import FootballWikiSource
+from grapher.sources.wiki import Template
+
+FIXTURES = path.join(path.dirname(__file__), '..', 'test', 'fixtures')
+
+
+class ReparsingFootballWikiSource(FootballWikiSource):
+    """
+    Decodes the content on each templates lookup (as it was done before templates were indexed)
+    """
+    def get_templates(self):
+        data = self.get_content_json()
+
+        for template in data.get('templates'):
+            yield Template(
+                page_title=data['title'],
+                name=template['name'],
+                parameters=template['parameters']
+            )
+
+    def get_templates_of_type(self, template_type):
+        return [
+            template
+            for template in self.get_templates() if template.get_name() == template_type
+        ]
+
+
+def get_club_page(squads=1):
+    """
+    Return Manchester United page with its squad repeated given number of times
+    (e.g. to mimic pages with reserves and youth teams listed)
+
+    :type squads int
+    :rtype: str
+    """
+    with open(path.join(FIXTURES, 'manchester_united.json'), 'rt') as fixture:
+        data = json.load(fixture)
+
+    data['templates'] = data['templates'][:2] + data['templates'][2:] * squads
+
+    return json.dumps(data)
+
+
+def measure(source_class, content, number):
+    """
+    :type source_class type
+    :type content str
+    :type number int
+    :rtype: float time per page [ms]
+    """
+    def get_models():
+        source = source_class()
+        source.set_content(content)
+        return list(source.get_models())
+
+    return timeit.timeit(get_models, number=number) / number * 1000
+
+
+def main():
+    """
+    Compare both implementations for club pages of different sizes
+    """
+    print('{:>10} {:>10} {:>14} {:>14} {:>8}'.format(
+        'templates', 'size [kB]', 'reparsing [ms]', 'indexed [ms]', 'speedup'))
+
+    for squads in (1, 5, 20):
+        content = get_club_page(squads)
+        templates = len(json.loads(content)['templates'])
+        number = 200 // squads
+
+        before = measure(ReparsingFootballWikiSource, content, number)
+        after = measure(FootballWikiSource, content, number)
+
+        print('{:>10} {:>10.1f} {:>14.2f} {:>14.2f} {:>7.1f}x'.format(
+            templates, len(content) / 1024, before, after, before / after))
+
+
+if __name__ == '__main__':
+    main()
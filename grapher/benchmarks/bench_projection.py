@@ -0,0 +1,151 @@
+"""
+Measures finding teammates with the sweep line and with a pairwise check of stints,
+then the whole projection (pairs aggregated in chunks spilled to files) and storing it.
+
+Relations are stored when RedisGraph host is given (e.g. docker-compose up),
+peak memory is the maximum resident set size of the process so far.
+
+python benchmarks/bench_projection.py [stints] [clubs] [chunk size] [host] [port]
+"""
+import random
+import resource
+import sys
+import time
+
+from grapher.graph import RedisGraph
+from grapher.graph.connection import close_pools
+from grapher.graph.projection import CHUNK_SIZE, TeammateProjection
+from grapher.models import PersonModel
+
+# the pairwise check is run for this many clubs only
+PAIRWISE_CLUBS = 10
+
+GRAPH_NAME = 'bench_projection'
+
+
+def get_stints(count, clubs):
+    """
+    :type count int
+    :type clubs int
+    :rtype: list[tuple[int, int, int, int]] club, player, since and until
+    """
+    generator = random.Random(42)
+    stints = []
+
+    for stint in range(count):
+        since = generator.randint(1870, 2019)
+        stints.append((generator.randrange(clubs), stint // 4, since,
+                       min(since + generator.randint(0, 6), 2019)))
+
+    return stints
+
+
+def get_projection(stints, chunk_size=CHUNK_SIZE):
+    """
+    :type stints list[tuple[int, int, int, int]]
+    :type chunk_size int
+    :rtype: TeammateProjection
+    """
+    projection = TeammateProjection(current_year=2019, chunk_size=chunk_size)
+
+    for (club, player, since, until) in stints:
+        projection.add('Club_{}:SportsTeam'.format(club), 'Player_{}:Person'.format(player),
+                       since, until)
+
+    return projection
+
+
+def pairwise(stints):
+    """
+    Check each pair of stints at every club
+
+    :type stints list[tuple[int, int, int, int]]
+    :rtype: int overlapping pairs
+    """
+    clubs = dict()
+    pairs = 0
+
+    for (club, player, since, until) in stints:
+        clubs.setdefault(club, []).append((player, since, until))
+
+    for club_stints in clubs.values():
+        for (index, (player, since, until)) in enumerate(club_stints):
+            for (other, other_since, other_until) in club_stints[index + 1:]:
+                if player != other and since <= other_until and other_since <= until:
+                    pairs += 1
+
+    return pairs
+
+
+def sweep(stints):
+    """
+    :type stints list[tuple[int, int, int, int]]
+    :rtype: int overlapping pairs
+    """
+    return sum(1 for _ in get_projection(stints).iter_overlaps())
+
+
+def measure(label, run, stints):
+    """
+    :type label str
+    :type run callable
+    :type stints list
+    """
+    started = time.perf_counter()
+    pairs = run(stints)
+
+    print('{:>24} {:>10} {:>12} {:>10.2f} {:>10}'.format(
+        label, len(stints), pairs, time.perf_counter() - started,
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024))
+
+
+def main():
+    """
+    Compare both on a few clubs, then run the sweep and the projection for all of them
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    clubs = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    chunk_size = int(sys.argv[3]) if len(sys.argv) > 3 else CHUNK_SIZE
+    host = sys.argv[4] if len(sys.argv) > 4 else None
+    port = int(sys.argv[5]) if len(sys.argv) > 5 else 56379
+
+    stints = get_stints(count, clubs)
+    sample = [stint for stint in stints if stint[0] < PAIRWISE_CLUBS]
+
+    print('{:>24} {:>10} {:>12} {:>10} {:>10}'.format(
+        '', 'stints', 'pairs', 'time [s]', 'peak [MB]'))
+
+    measure('pairwise ({} clubs)'.format(PAIRWISE_CLUBS), pairwise, sample)
+    measure('sweep ({} clubs)'.format(PAIRWISE_CLUBS), sweep, sample)
+    measure('sweep (all clubs)', sweep, stints)
+
+    measure('projection (all clubs)', lambda stints: sum(
+        1 for _ in get_projection(stints, chunk_size).iter_edges()), stints)
+
+    if host is None:
+        return
+
+    # players nodes are stored first, relations between them are stored many per query
+    graph = RedisGraph(host=host, port=port)
+
+    names = dict()
+
+    for player in range(count // 4 + 1):
+        model = PersonModel(name='Player_{}'.format(player))
+        names[model.get_node_name()] = model.get_name()
+        graph.add(model)
+
+    graph.store(GRAPH_NAME)
+
+    def store(stints):
+        return graph.store_relations(GRAPH_NAME, 'teammate',
+                                     get_projection(stints, chunk_size).iter_edges(), names)
+
+    measure('store (all clubs)', store, stints)
+
+    graph.get_redisgraph(GRAPH_NAME).delete()
+    close_pools()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,444 @@
+"""
+Storage for API responses
+"""
+import json
+import logging
+import re
+import sqlite3
+import time
+import zlib
+from collections import namedtuple, OrderedDict
+from hashlib import md5
+from os import listdir, path, replace, utime
+from tempfile import NamedTemporaryFile
+from threading import Lock
+
+# value with HTTP validators (ETag and Last-Modified headers) and when it was fetched (UNIX time)
+CacheEntry = namedtuple('CacheEntry', ['value', 'etag', 'last_modified', 'fetched_at'])
+
+
+class BaseCache(object):
+    """
+    All cache backends should inherit from this class.
+
+    Entries are grouped by type (e.g. "templates") and identified by name (e.g. a page title).
+    Entries older than ttl seconds are stale, they should be revalidated before being used.
+    """
+    def __init__(self, ttl=None):
+        """
+        :type ttl int|None entries never expire when not set
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.ttl = ttl
+
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    def _get_many(self, entry_type, names):
+        """
+        :type entry_type str
+        :type names list[str]
+        :rtype: dict[str, CacheEntry]
+        """
+        raise NotImplementedError('_get_many method needs to be implemented')
+
+    def _set_many(self, entry_type, entries):
+        """
+        :type entry_type str
+        :type entries dict[str, CacheEntry]
+        """
+        raise NotImplementedError('_set_many method needs to be implemented')
+
+    def _touch_many(self, entry_type, names, fetched_at):
+        """
+        :type entry_type str
+        :type names list[str]
+        :type fetched_at float
+        """
+        raise NotImplementedError('_touch_many method needs to be implemented')
+
+    def get_size(self):
+        """
+        Return the number of entries and their total size (in bytes)
+
+        :rtype: tuple[int, int]
+        """
+        raise NotImplementedError('get_size method needs to be implemented')
+
+    def is_fresh(self, entry):
+        """
+        :type entry CacheEntry
+        :rtype: bool
+        """
+        return self.ttl is None or entry.fetched_at + self.ttl > time.time()
+
+    def get_entries(self, entry_type, names):
+        """
+        Return cached entries for given names (including stale ones), misses are not included
+
+        :type entry_type str
+        :type names list[str]
+        :rtype: dict[str, CacheEntry]
+        """
+        entries = self._get_many(entry_type, names)
+        fresh = len([entry for entry in entries.values() if self.is_fresh(entry)])
+
+        self.hits += fresh
+        self.stale += len(entries) - fresh
+        self.misses += len(names) - len(entries)
+
+        return entries
+
+    def get_many(self, entry_type, names):
+        """
+        Return fresh cached values for given names, misses and stale entries are not included
+
+        :type entry_type str
+        :type names list[str]
+        :rtype: dict[str, str]
+        """
+        return {
+            name: entry.value
+            for (name, entry) in self.get_entries(entry_type, names).items()
+            if self.is_fresh(entry)
+        }
+
+    def get(self, entry_type, name):
+        """
+        :type entry_type str
+        :type name str
+        :rtype: str|None
+        """
+        return self.get_many(entry_type, [name]).get(name)
+
+    def set_many(self, entry_type, entries):
+        """
+        :type entry_type str
+        :type entries dict[str, str|CacheEntry] values are stored without validators
+        """
+        now = time.time()
+
+        self._set_many(entry_type, {
+            name: entry if isinstance(entry, CacheEntry) else CacheEntry(entry, None, None, now)
+            for (name, entry) in entries.items()
+        })
+
+    def set(self, entry_type, name, value):
+        """
+        :type entry_type str
+        :type name str
+        :type value str|CacheEntry
+        """
+        self.set_many(entry_type, {name: value})
+
+    def touch_many(self, entry_type, names):
+        """
+        Mark given entries as fresh again (e.g. after "304 Not Modified" response)
+
+        :type entry_type str
+        :type names list[str]
+        """
+        self.revalidated += len(names)
+        self._touch_many(entry_type, names, time.time())
+
+    def get_stats(self):
+        """
+        :rtype: dict
+        """
+        (entries, size) = self.get_size()
+        requests = self.hits + self.stale + self.misses
+
+        return {
+            'entries': entries,
+            'size': size,
+            'hits': self.hits,
+            'stale': self.stale,
+            'misses': self.misses,
+            'revalidated': self.revalidated,
+            'hit_ratio': float(self.hits) / requests if requests else 0.0,
+        }
+
+
+class DirectoryCache(BaseCache):
+    """
+    Keeps each entry in a separate JSON file named after md5 hash of its name.
+
+    Validators are not stored, file modification time tells when an entry was fetched.
+    """
+    def __init__(self, directory, ttl=None):
+        """
+        :type directory str
+        :type ttl int|None
+        """
+        super(DirectoryCache, self).__init__(ttl)
+        self.directory = directory
+
+    def get_filename(self, entry_type, name):
+        """
+        Return a hashed filename of cache entry for a given name
+
+        :type entry_type str
+        :type name str
+        :rtype: str
+        """
+        _hash = md5()
+        _hash.update(name.encode('utf-8'))
+
+        return path.join(
+            self.directory,
+            '{}_{}.json'.format(entry_type, _hash.hexdigest())
+        )
+
+    def _get_many(self, entry_type, names):
+        entries = dict()
+
+        for name in names:
+            cache_file = self.get_filename(entry_type, name)
+
+            if path.isfile(cache_file):
+                with open(cache_file, 'rt') as file:
+                    entries[name] = CacheEntry(file.read(), None, None, path.getmtime(cache_file))
+
+        return entries
+
+    def _set_many(self, entry_type, entries):
+        for (name, entry) in entries.items():
+            # write to a temporary file and then atomically move it,
+            # this way other workers will never read a partially written entry
+            with NamedTemporaryFile('wt', dir=self.directory, suffix='.tmp',
+                                    delete=False) as file:
+                file.write(entry.value)
+
+            utime(file.name, (entry.fetched_at, entry.fetched_at))
+            replace(file.name, self.get_filename(entry_type, name))
+
+    def _touch_many(self, entry_type, names, fetched_at):
+        for name in names:
+            utime(self.get_filename(entry_type, name), (fetched_at, fetched_at))
+
+    def get_files(self, entry_type):
+        """
+        Yield all cache files of a given type
+
+        :type entry_type str
+        :rtype: list[str]
+        """
+        pattern = re.compile(r'^' + re.escape(entry_type) + r'_[0-9a-f]{32}\.json$')
+
+        for name in sorted(listdir(self.directory)):
+            if pattern.match(name):
+                yield path.join(self.directory, name)
+
+    def get_size(self):
+        files = [
+            path.join(self.directory, name)
+            for name in listdir(self.directory) if name.endswith('.json')
+        ]
+
+        return len(files), sum(path.getsize(name) for name in files)
+
+
+class SqliteCache(BaseCache):
+    """
+    Keeps all entries in a single SQLite database, values are zlib-compressed.
+
+    Can be shared by many threads.
+    """
+    def __init__(self, filename, ttl=None, compression_level=6):
+        """
+        :type filename str
+        :type ttl int|None
+        :type compression_level int
+        """
+        super(SqliteCache, self).__init__(ttl)
+
+        self.filename = filename
+        self.compression_level = compression_level
+        self.lock = Lock()
+
+        self.logger.info('Using %s', filename)
+
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'type TEXT NOT NULL, name TEXT NOT NULL, value BLOB NOT NULL, '
+            'etag TEXT, last_modified TEXT, fetched_at REAL NOT NULL DEFAULT 0, '
+            'PRIMARY KEY (type, name)) WITHOUT ROWID'
+        )
+
+        # databases created before validators were stored
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(cache)')]
+
+        if 'fetched_at' not in columns:
+            self.connection.executescript(
+                'ALTER TABLE cache ADD COLUMN etag TEXT;'
+                'ALTER TABLE cache ADD COLUMN last_modified TEXT;'
+                'ALTER TABLE cache ADD COLUMN fetched_at REAL NOT NULL DEFAULT 0;'
+            )
+
+        self.connection.commit()
+
+    def _get_many(self, entry_type, names):
+        entries = dict()
+
+        # SQLite limits the number of bound parameters
+        for offset in range(0, len(names), 500):
+            chunk = names[offset:offset + 500]
+
+            with self.lock:
+                rows = self.connection.execute(
+                    'SELECT name, value, etag, last_modified, fetched_at FROM cache '
+                    'WHERE type = ? AND name IN ({})'.format(','.join(['?'] * len(chunk))),
+                    [entry_type] + list(chunk)
+                ).fetchall()
+
+            for (name, value, etag, last_modified, fetched_at) in rows:
+                entries[name] = CacheEntry(
+                    zlib.decompress(value).decode('utf-8'), etag, last_modified, fetched_at)
+
+        return entries
+
+    def _set_many(self, entry_type, entries):
+        rows = [
+            (
+                entry_type, name,
+                zlib.compress(entry.value.encode('utf-8'), self.compression_level),
+                entry.etag, entry.last_modified, entry.fetched_at
+            )
+            for (name, entry) in entries.items()
+        ]
+
+        with self.lock:
+            with self.connection:
+                self.connection.executemany(
+                    'INSERT OR REPLACE INTO cache '
+                    '(type, name, value, etag, last_modified, fetched_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def _touch_many(self, entry_type, names, fetched_at):
+        with self.lock:
+            with self.connection:
+                self.connection.executemany(
+                    'UPDATE cache SET fetched_at = ? WHERE type = ? AND name = ?',
+                    [(fetched_at, entry_type, name) for name in names])
+
+    def get_size(self):
+        with self.lock:
+            return tuple(self.connection.execute(
+                'SELECT count(*), coalesce(sum(length(value)), 0) FROM cache').fetchone())
+
+    def close(self):
+        """
+        Close the database connection
+        """
+        self.connection.close()
+
+
+class MemoryCache(BaseCache):
+    """
+    Keeps entries in memory, the least recently used ones are removed
+    once there are more than max_entries of them.
+
+    Can be shared by many threads.
+    """
+    def __init__(self, max_entries=1000, ttl=None):
+        """
+        :type max_entries int
+        :type ttl int|None
+        """
+        super(MemoryCache, self).__init__(ttl)
+
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+        self.evicted = 0
+
+    def _get_many(self, entry_type, names):
+        entries = dict()
+
+        with self.lock:
+            for name in names:
+                entry = self.entries.get((entry_type, name))
+
+                if entry is not None:
+                    self.entries.move_to_end((entry_type, name))
+                    entries[name] = entry
+
+        return entries
+
+    def _set_many(self, entry_type, entries):
+        with self.lock:
+            for (name, entry) in entries.items():
+                self.entries[(entry_type, name)] = entry
+                self.entries.move_to_end((entry_type, name))
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evicted += 1
+
+    def _touch_many(self, entry_type, names, fetched_at):
+        with self.lock:
+            for name in names:
+                entry = self.entries.get((entry_type, name))
+
+                if entry is not None:
+                    self.entries[(entry_type, name)] = entry._replace(fetched_at=fetched_at)
+
+    def get_size(self):
+        with self.lock:
+            return len(self.entries), sum(len(entry.value) for entry in self.entries.values())
+
+    def get_stats(self):
+        stats = super(MemoryCache, self).get_stats()
+        stats['evicted'] = self.evicted
+
+        return stats
+
+
+def migrate_directory_cache(source, target, entry_type, batch_size=500):
+    """
+    Copy entries from a directory cache to a given cache.
+
+    File names are hashes, so page title is taken from the JSON response and entries
+    which title does not match the file name are skipped.
+
+    :type source DirectoryCache
+    :type target BaseCache
+    :type entry_type str
+    :type batch_size int
+    :rtype: tuple[int, int] the number of migrated and skipped entries
+    """
+    migrated = 0
+    skipped = 0
+    entries = dict()
+
+    for cache_file in source.get_files(entry_type):
+        with open(cache_file, 'rt') as file:
+            value = file.read()
+
+        try:
+            name = json.loads(value)['title']
+        except (ValueError, KeyError, TypeError):
+            name = None
+
+        if name is None or source.get_filename(entry_type, name) != cache_file:
+            source.logger.warning('Skipping %s, title can not be recovered', cache_file)
+            skipped += 1
+            continue
+
+        entries[name] = CacheEntry(value, None, None, path.getmtime(cache_file))
+
+        if len(entries) >= batch_size:
+            target.set_many(entry_type, entries)
+            migrated += len(entries)
+            entries = dict()
+
+    if entries:
+        target.set_many(entry_type, entries)
+        migrated += len(entries)
+
+    return migrated, skipped
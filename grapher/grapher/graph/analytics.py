@@ -0,0 +1,487 @@
+"""
+In-process graph analytics over a compressed sparse row (CSR) adjacency
+
+Answers questions that are not practical to ask RedisGraph 1.0 with Cypher queries,
+e.g. the shortest chain of teammates between two players or clubs with most connections.
+"""
+import json
+import logging
+from os import path
+
+import numpy as np
+
+from .bulk import iter_unpacked, unpack_header
+from ..models import BaseModel, ModelStore
+
+# PageRank settings
+DAMPING = 0.85
+PAGERANK_ITERATIONS = 100
+PAGERANK_TOLERANCE = 1e-6
+
+
+def get_registry_nodes(registry):
+    """
+    :type registry grapher.models.registry.NodeRegistry
+    :rtype: list[tuple[str, str]] type and name of each node, indexed by node ID
+    """
+    nodes = []
+
+    for node_id in range(len(registry)):
+        key = registry.get_key(node_id)
+
+        if key is None:
+            # the node was referred to by its alias only, e.g. "Foo:Person"
+            (name, node_type) = registry.get_alias(node_id).split(':', 1)
+            key = (node_type, name)
+
+        nodes.append(key)
+
+    return nodes
+
+
+def expand(indptr, indices, frontier):
+    """
+    Return neighbours of all frontier nodes, together with the node each one is adjacent to
+
+    :type indptr numpy.ndarray
+    :type indices numpy.ndarray
+    :type frontier numpy.ndarray
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    starts = indptr[frontier]
+    counts = indptr[frontier + 1] - starts
+
+    # neighbours of the n-th frontier node are at starts[n]...starts[n] + counts[n] - 1
+    positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + \
+        np.arange(counts.sum(), dtype=np.int64)
+
+    return indices[positions], np.repeat(frontier, counts)
+
+
+class CSRGraph(object):
+    """
+    Adjacency of nodes kept in two numpy arrays: neighbours of the n-th node are
+    indices[indptr[n]:indptr[n + 1]].
+
+    Nodes are identified by integer IDs (registry IDs when built from models). Relations
+    are followed both ways unless the graph is directed, repeated edges are kept once.
+    """
+    # pylint: disable=too-many-instance-attributes
+    def __init__(self, nodes, sources, targets, directed=False):
+        """
+        :type nodes list[tuple[str, str]] type and name of each node, indexed by node ID
+        :type sources numpy.ndarray|list[int]
+        :type targets numpy.ndarray|list[int]
+        :type directed bool
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.nodes = nodes
+        self.directed = directed
+
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+
+        if not directed:
+            (sources, targets) = (np.concatenate((sources, targets)),
+                                  np.concatenate((targets, sources)))
+
+        (self.indptr, self.indices) = self._build(len(nodes), sources, targets)
+
+        # built when needed
+        self._reverse = None
+        self._node_ids = None
+        self._types = None
+
+        self.logger.info('Built adjacency of %d nodes and %d edges', len(self),
+                         self.get_edges_count())
+
+    @staticmethod
+    def _build(size, sources, targets):
+        """
+        :type size int
+        :type sources numpy.ndarray
+        :type targets numpy.ndarray
+        :rtype: tuple[numpy.ndarray, numpy.ndarray] indptr and indices
+        """
+        # sorted edge keys are ordered by the source and then by the target,
+        # repeated ones are next to each other (sorting is much faster than np.unique)
+        keys = np.sort(sources * size + targets)
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))] if keys.size else keys
+
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // size, minlength=size), out=indptr[1:])
+
+        return indptr, (keys % size).astype(np.int32 if size < 2 ** 31 else np.int64)
+
+    @classmethod
+    def from_models(cls, models, relations=None, directed=False):
+        """
+        :type models ModelStore|list[grapher.models.BaseModel]
+        :type relations list[str]|None types of relations to use, all of them by default
+        :type directed bool
+        :rtype: CSRGraph
+        """
+        if isinstance(models, ModelStore):
+            (sources, targets) = cls._get_store_edges(models, relations)
+        else:
+            edges = [
+                (model.get_node_id(), target)
+                for model in models
+                for (relation, target, _) in model.relations
+                if relations is None or relation in relations
+            ]
+
+            sources = [source for (source, _) in edges]
+            targets = [target for (_, target) in edges]
+
+        return cls(get_registry_nodes(BaseModel.registry), sources, targets, directed)
+
+    @staticmethod
+    def _get_store_edges(store, relations):
+        """
+        Take edges straight from the store columns, without re-creating models
+
+        :type store ModelStore
+        :type relations list[str]|None
+        :rtype: tuple[numpy.ndarray, numpy.ndarray]
+        """
+        counts = np.diff(np.frombuffer(store.edges_offsets, dtype=store.edges_offsets.typecode))
+
+        sources = np.repeat(
+            np.frombuffer(store.node_ids, dtype=store.node_ids.typecode).astype(np.int64),
+            counts.astype(np.int64))
+        targets = np.frombuffer(store.edge_targets, dtype=store.edge_targets.typecode)
+
+        if relations is not None:
+            mask = np.isin(
+                np.frombuffer(store.edge_relations, dtype=store.edge_relations.typecode),
+                [store.relation_type_ids[relation] for relation in relations
+                 if relation in store.relation_type_ids])
+
+            (sources, targets) = (sources[mask], targets[mask])
+
+        return sources, targets
+
+    @classmethod
+    def from_bulk(cls, directory, graph_name, relations=None, directed=False):
+        """
+        Load the graph from files written by RedisGraph.dump_bulk
+
+        :type directory str
+        :type graph_name str
+        :type relations list[str]|None
+        :type directed bool
+        :rtype: CSRGraph
+        """
+        with open(path.join(directory, '{}.json'.format(graph_name)), 'rt') as file:
+            manifest = json.load(file)
+
+        # node IDs are assigned in the order of node files
+        nodes = []
+
+        for entry in manifest['nodes']:
+            with open(path.join(directory, entry['file']), 'rb') as file:
+                blob = file.read()
+
+            # "name" is the first property
+            nodes += [(entry['label'], record[0]) for record in iter_unpacked(blob)]
+
+        pairs = [np.empty((0, 2), dtype=np.uint64)]
+
+        for entry in manifest['relations']:
+            if relations is not None and entry['type'] not in relations:
+                continue
+
+            with open(path.join(directory, entry['file']), 'rb') as file:
+                blob = file.read()
+
+            # records are just source and destination IDs
+            (_, _, offset) = unpack_header(blob)
+            pairs.append(np.frombuffer(blob, dtype=np.uint64, offset=offset).reshape(-1, 2))
+
+        pairs = np.concatenate(pairs).astype(np.int64)
+
+        return cls(nodes, pairs[:, 0], pairs[:, 1], directed)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def get_edges_count(self):
+        """
+        :rtype: int edges of undirected graphs are counted in both directions
+        """
+        return len(self.indices)
+
+    def get_node(self, node_id):
+        """
+        :type node_id int
+        :rtype: tuple[str, str] type and name
+        """
+        return self.nodes[node_id]
+
+    def get_node_id(self, node_type, name):
+        """
+        :type node_type str
+        :type name str
+        :rtype: int|None
+        """
+        if self._node_ids is None:
+            self._node_ids = {node: node_id for (node_id, node) in enumerate(self.nodes)}
+
+        return self._node_ids.get((node_type, name))
+
+    def get_neighbours(self, node_id):
+        """
+        :type node_id int
+        :rtype: numpy.ndarray
+        """
+        return self.indices[self.indptr[node_id]:self.indptr[node_id + 1]]
+
+    def get_degrees(self):
+        """
+        :rtype: numpy.ndarray the number of neighbours (outgoing edges) of each node
+        """
+        return np.diff(self.indptr)
+
+    def get_reverse(self):
+        """
+        :rtype: tuple[numpy.ndarray, numpy.ndarray] indptr and indices of reversed edges
+        """
+        if not self.directed:
+            return self.indptr, self.indices
+
+        if self._reverse is None:
+            sources = np.repeat(np.arange(len(self), dtype=np.int64), self.get_degrees())
+            self._reverse = self._build(len(self), self.indices.astype(np.int64), sources)
+
+        return self._reverse
+
+    def get_types_mask(self, node_type):
+        """
+        :type node_type str|None
+        :rtype: numpy.ndarray|None which nodes are of a given type, None for all nodes
+        """
+        if node_type is None:
+            return None
+
+        if self._types is None:
+            self._types = np.array([node[0] for node in self.nodes], dtype=object)
+
+        return self._types == node_type
+
+    def _step(self, adjacency, frontier, distances, parents):
+        """
+        Visit neighbours of frontier nodes that were not visited yet
+
+        :type adjacency tuple[numpy.ndarray, numpy.ndarray]
+        :type frontier numpy.ndarray
+        :type distances numpy.ndarray -1 for nodes not visited yet, updated
+        :type parents numpy.ndarray updated
+        :rtype: numpy.ndarray the next frontier
+        """
+        (neighbours, sources) = expand(adjacency[0], adjacency[1], frontier)
+
+        fresh = distances[neighbours] < 0
+        (neighbours, sources) = (neighbours[fresh], sources[fresh])
+
+        # a node reached from many frontier nodes can take any of them as the parent
+        parents[neighbours] = sources
+        distances[neighbours] = distances[frontier[0]] + 1
+
+        neighbours = np.sort(neighbours)
+        return neighbours[np.concatenate(([True], neighbours[1:] != neighbours[:-1]))] \
+            if neighbours.size else neighbours
+
+    def shortest_path(self, source, target):
+        """
+        Bidirectional breadth-first search, the smaller frontier is expanded each time
+
+        :type source int
+        :type target int
+        :rtype: list[int]|None node IDs from the source to the target, None if not connected
+        """
+        if source == target:
+            return [source]
+
+        adjacency = ((self.indptr, self.indices), self.get_reverse())
+        degrees = (self.get_degrees(), np.diff(adjacency[1][0]))
+        distances = (np.full(len(self), -1, dtype=np.int32), np.full(len(self), -1, dtype=np.int32))
+        parents = (np.full(len(self), -1, dtype=np.int64), np.full(len(self), -1, dtype=np.int64))
+        frontiers = [np.array([source], dtype=np.int64), np.array([target], dtype=np.int64)]
+
+        distances[0][source] = 0
+        distances[1][target] = 0
+
+        while frontiers[0].size and frontiers[1].size:
+            # the side with fewer edges to follow
+            side = int(degrees[0][frontiers[0]].sum() > degrees[1][frontiers[1]].sum())
+
+            frontiers[side] = self._step(adjacency[side], frontiers[side], distances[side],
+                                         parents[side])
+
+            met = frontiers[side][distances[1 - side][frontiers[side]] >= 0]
+
+            if met.size:
+                # all met nodes are as far from this side, take the closest to the other one
+                node = int(met[np.argmin(distances[1 - side][met])])
+                return self._get_path(node, parents)
+
+        return None
+
+    @staticmethod
+    def _get_path(node, parents):
+        """
+        :type node int the node where both searches met
+        :type parents tuple[numpy.ndarray, numpy.ndarray]
+        :rtype: list[int]
+        """
+        nodes = [node]
+
+        while parents[0][nodes[-1]] >= 0:
+            nodes.append(int(parents[0][nodes[-1]]))
+
+        nodes.reverse()
+
+        while parents[1][nodes[-1]] >= 0:
+            nodes.append(int(parents[1][nodes[-1]]))
+
+        return nodes
+
+    def get_neighbourhood(self, node_id, hops):
+        """
+        Nodes that can be reached in up to a given number of hops
+
+        :type node_id int
+        :type hops int
+        :rtype: tuple[numpy.ndarray, numpy.ndarray] node IDs (the node itself excluded)
+            and their distances, ordered by the distance
+        """
+        distances = np.full(len(self), -1, dtype=np.int32)
+        parents = np.full(len(self), -1, dtype=np.int64)
+
+        distances[node_id] = 0
+        frontier = np.array([node_id], dtype=np.int64)
+        found = []
+
+        for _ in range(hops):
+            frontier = self._step((self.indptr, self.indices), frontier, distances, parents)
+
+            if not frontier.size:
+                break
+
+            found.append(frontier)
+
+        nodes = np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+        return nodes, distances[nodes]
+
+    def get_pagerank(self, damping=DAMPING, iterations=PAGERANK_ITERATIONS,
+                     tolerance=PAGERANK_TOLERANCE):
+        """
+        :type damping float
+        :type iterations int
+        :type tolerance float stop once ranks change less than that (L1 norm)
+        :rtype: numpy.ndarray rank of each node, ranks sum up to 1
+        """
+        size = len(self)
+        degrees = self.get_degrees()
+        dangling = degrees == 0
+
+        ranks = np.full(size, 1.0 / size)
+
+        for _ in range(iterations):
+            shares = np.where(dangling, 0.0, ranks / np.maximum(degrees, 1))
+
+            # ranks of nodes with no edges are spread evenly
+            updated = damping * np.bincount(self.indices, weights=np.repeat(shares, degrees),
+                                            minlength=size) + \
+                (1.0 - damping + damping * ranks[dangling].sum()) / size
+
+            change = np.abs(updated - ranks).sum()
+            ranks = updated
+
+            if change < tolerance:
+                break
+
+        return ranks
+
+    def _rank(self, values, limit, node_type):
+        """
+        :type values numpy.ndarray
+        :type limit int
+        :type node_type str|None
+        :rtype: list[tuple[int, int|float]]
+        """
+        mask = self.get_types_mask(node_type)
+        candidates = np.flatnonzero(mask) if mask is not None else np.arange(len(self))
+
+        if candidates.size > limit:
+            candidates = candidates[np.argpartition(-values[candidates], limit - 1)[:limit]]
+
+        # the same values are ordered by node IDs
+        candidates = candidates[np.lexsort((candidates, -values[candidates]))]
+
+        return [(int(node_id), values[node_id].item()) for node_id in candidates]
+
+    def rank_by_degree(self, limit=10, node_type=None):
+        """
+        :type limit int
+        :type node_type str|None e.g. "SportsTeam"
+        :rtype: list[tuple[int, int]] node IDs and their degrees
+        """
+        return self._rank(self.get_degrees(), limit, node_type)
+
+    def rank_by_pagerank(self, limit=10, node_type=None):
+        """
+        :type limit int
+        :type node_type str|None
+        :rtype: list[tuple[int, float]] node IDs and their ranks
+        """
+        return self._rank(self.get_pagerank(), limit, node_type)
+
+    def get_components(self):
+        """
+        Connected components (weakly connected ones for directed graphs), found by
+        propagating the smallest node ID with pointer jumping
+
+        :rtype: numpy.ndarray the smallest node ID in the component of each node
+        """
+        labels = np.arange(len(self), dtype=np.int64)
+        adjacencies = [(self.indptr, self.indices)]
+
+        if self.directed:
+            adjacencies.append(self.get_reverse())
+
+        while True:
+            updated = labels.copy()
+
+            for (indptr, indices) in adjacencies:
+                # nodes with no edges have empty ranges, reduceat needs non-empty ones
+                connected = np.flatnonzero(np.diff(indptr))
+
+                if connected.size:
+                    updated[connected] = np.minimum(updated[connected], np.minimum.reduceat(
+                        labels[indices], indptr[connected]))
+
+            # follow labels until they point at themselves
+            while True:
+                jumped = updated[updated]
+
+                if np.array_equal(jumped, updated):
+                    break
+
+                updated = jumped
+
+            if np.array_equal(updated, labels):
+                return labels
+
+            labels = updated
+
+    def get_components_sizes(self, limit=10):
+        """
+        :type limit int
+        :rtype: list[tuple[int, int]] the smallest node ID in the component and its size,
+            the largest components first
+        """
+        sizes = self._rank(np.bincount(self.get_components(), minlength=len(self)), limit, None)
+        return [(node_id, size) for (node_id, size) in sizes if size]
@@ -0,0 +1,158 @@
+"""
+Asynchronous graph queries (asyncio)
+"""
+import asyncio
+import logging
+import time
+
+from .connection import create_async_pool
+from .redis import POINTER_KEY, VERSION_KEY
+from .results import ResultSet
+from ..utils import chunks
+
+# how many pipelines can wait for a response at the same time
+CONCURRENCY = 8
+
+# how many queries are sent over a single pipeline
+PIPELINE_SIZE = 20
+
+
+def run(coroutine):
+    """
+    Run a coroutine in a new event loop and return its result (asyncio.run() needs Python 3.7)
+
+    :type coroutine collections.Awaitable
+    :rtype: object
+    """
+    loop = asyncio.new_event_loop()
+
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
+class AsyncQueryClient(object):
+    """
+    Sends many read queries at once. Queries are split into pipelines (each one
+    is a single round trip), up to a given number of pipelines is in flight.
+
+    Can be used as an async context manager, connections are closed when leaving it.
+    """
+    # pylint: disable=too-many-arguments,too-many-instance-attributes
+    def __init__(self, host, port=6379, concurrency=CONCURRENCY, pipeline_size=PIPELINE_SIZE,
+                 pool_settings=None):
+        """
+        :type host str
+        :type port int
+        :type concurrency int
+        :type pipeline_size int
+        :type pool_settings dict|None connection pool settings, see POOL_SETTINGS
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.host = host
+        self.port = port
+        self.concurrency = concurrency
+        self.pipeline_size = pipeline_size
+        self.pool_settings = dict(pool_settings or {})
+
+        # a connection can not be used by more than one pipeline at a time
+        self.pool_settings.setdefault('max_connections', concurrency)
+
+        self._connection = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def get_connection(self):
+        """
+        :rtype: redis.asyncio.Redis
+        """
+        if self._connection is None:
+            from redis import asyncio as redis_asyncio
+
+            self._connection = redis_asyncio.Redis(connection_pool=create_async_pool(
+                self.host, self.port, self.pool_settings))
+
+        return self._connection
+
+    async def close(self):
+        """
+        Close all connections
+        """
+        if self._connection is not None:
+            # close() was renamed to aclose() in redis 5.0.1
+            close = getattr(self._connection, 'aclose', None) or self._connection.close
+            await close()
+            await self._connection.connection_pool.disconnect()
+            self._connection = None
+
+    async def get_current_graph_name(self, graph_name):
+        """
+        :type graph_name str
+        :rtype: str
+        """
+        current = await self.get_connection().get(POINTER_KEY.format(graph_name))
+        return current.decode('utf-8') if current else graph_name
+
+    async def get_version(self, graph_name):
+        """
+        :type graph_name str
+        :rtype: int
+        """
+        version = await self.get_connection().get(VERSION_KEY.format(graph_name))
+        return int(version) if version else 0
+
+    async def query(self, graph_name, query):
+        """
+        :type graph_name str
+        :type query str
+        :rtype: ResultSet
+        """
+        return (await self.query_many(graph_name, [query]))[0]
+
+    async def query_many(self, graph_name, queries):
+        """
+        Run queries against the currently queried version of the graph,
+        return once all results are in
+
+        :type graph_name str
+        :type queries list[str]
+        :rtype: list[ResultSet] in the order of queries
+        """
+        target = await self.get_current_graph_name(graph_name)
+
+        started = time.time()
+        results = await asyncio.gather(*[
+            self._execute(target, batch) for batch in chunks(queries, self.pipeline_size)
+        ])
+
+        self.logger.info('%d queries to %s took %.3f s', len(queries), target,
+                         time.time() - started)
+
+        return [result for batch in results for result in batch]
+
+    async def _execute(self, graph_name, queries):
+        """
+        :type graph_name str
+        :type queries list[str]
+        :rtype: list[ResultSet]
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with self._semaphore:
+            pipeline = self.get_connection().pipeline(transaction=False)
+
+            for query in queries:
+                pipeline.execute_command('GRAPH.QUERY', graph_name, query)
+
+            responses = await pipeline.execute()
+
+        return [ResultSet.from_response(response[0]) for response in responses]
@@ -3,20 +3,22 @@ Base class
 """
 import logging
 
+from ..models import ModelStore
+
 
 class BaseGraph(object):
     """
     Represents a collection of nodes (model objects) and relations (edges) between them
     """
     def __init__(self):
-        self.models = list()
+        self.models = ModelStore()
         self.logger = logging.getLogger(self.__class__.__name__)
 
     def add(self, model):
         """
         :type model grapher.models.BaseModel
         """
-        self.models.append(model)
+        self.models.add(model)
 
     def store(self, graph_name):
         """
@@ -0,0 +1,306 @@
+"""
+Binary files for RedisGraph bulk insert (GRAPH.BULK command)
+
+Nodes are grouped by label and relations by type, each group is kept in a separate file:
+
+* node file: label, number of properties and their names (null-terminated strings,
+  unsigned int for the count), then for each node a type byte and a value of each property
+* relation file: relation type and zero properties count, then for each relation
+  source and destination node IDs (unsigned long long)
+
+GRAPH.BULK of RedisGraph 1.0 does not take relations properties, they are not written.
+The files are read by CSRGraph.from_bulk, the graph itself is stored with queries.
+
+Node IDs are assigned sequentially, in the order in which node files are loaded.
+A JSON manifest lists the files in that order together with nodes and relations counts.
+"""
+import json
+import logging
+import struct
+from array import array
+from os import path
+
+from ..models import BaseModel
+
+# property value types
+TYPE_NULL = 0
+TYPE_BOOL = 1
+TYPE_NUMERIC = 2
+TYPE_STRING = 3
+
+
+def pack_string(value):
+    """
+    :type value str
+    :rtype: bytes
+    """
+    return value.encode('utf-8') + b'\0'
+
+
+def pack_header(name, keys):
+    """
+    :type name str label or relation type
+    :type keys list[str] properties names
+    :rtype: bytes
+    """
+    return pack_string(name) + struct.pack('=I', len(keys)) + b''.join(
+        pack_string(key) for key in keys)
+
+
+def pack_value(value):
+    """
+    :type value str|int|float|bool|None
+    :rtype: bytes
+    """
+    if value is None:
+        return struct.pack('=B', TYPE_NULL)
+
+    # bool is a subclass of int, check it first
+    if isinstance(value, bool):
+        return struct.pack('=B?', TYPE_BOOL, value)
+
+    if isinstance(value, (int, float)):
+        return struct.pack('=Bd', TYPE_NUMERIC, value)
+
+    return struct.pack('=B', TYPE_STRING) + pack_string(str(value))
+
+
+def pack_properties(keys, properties):
+    """
+    :type keys list[str]
+    :type properties dict
+    :rtype: bytes
+    """
+    return b''.join(pack_value(properties.get(key)) for key in keys)
+
+
+def unpack_string(blob, offset):
+    """
+    :type blob bytes
+    :type offset int
+    :rtype: tuple[str, int] the string and the offset after it
+    """
+    end = blob.index(b'\0', offset)
+    return blob[offset:end].decode('utf-8'), end + 1
+
+
+def unpack_header(blob):
+    """
+    :type blob bytes
+    :rtype: tuple[str, list[str], int] label or relation type, properties names
+        and the offset of the first record
+    """
+    (name, offset) = unpack_string(blob, 0)
+    (count,) = struct.unpack_from('=I', blob, offset)
+    offset += 4
+
+    keys = []
+
+    for _ in range(count):
+        (key, offset) = unpack_string(blob, offset)
+        keys.append(key)
+
+    return name, keys, offset
+
+
+def unpack_value(blob, offset):
+    """
+    :type blob bytes
+    :type offset int
+    :rtype: tuple[str|float|bool|None, int] the value and the offset after it
+    """
+    (value_type,) = struct.unpack_from('=B', blob, offset)
+    offset += 1
+
+    if value_type == TYPE_NULL:
+        return None, offset
+
+    if value_type == TYPE_BOOL:
+        return struct.unpack_from('=?', blob, offset)[0], offset + 1
+
+    if value_type == TYPE_NUMERIC:
+        return struct.unpack_from('=d', blob, offset)[0], offset + 8
+
+    return unpack_string(blob, offset)
+
+
+def iter_unpacked(blob, relations=False):
+    """
+    Read records of a node or a relation file
+
+    :type blob bytes
+    :type relations bool relation files start each record with source and destination IDs
+    :rtype: list[list] properties values (preceded by node IDs for relations)
+    """
+    (_, keys, offset) = unpack_header(blob)
+
+    while offset < len(blob):
+        record = []
+
+        if relations:
+            record += struct.unpack_from('=QQ', blob, offset)
+            offset += 16
+
+        for _ in keys:
+            (value, offset) = unpack_value(blob, offset)
+            record.append(value)
+
+        yield record
+
+
+class BulkExporter(object):
+    """
+    Writes models kept in a store to binary files that can be loaded with GRAPH.BULK
+    """
+    def __init__(self, directory):
+        """
+        :type directory str
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.directory = directory
+
+    @staticmethod
+    def get_label(alias):
+        """
+        :type alias str e.g. "Foo:Person"
+        :rtype: str
+        """
+        return alias.split(':')[1]
+
+    def export(self, graph_name, store):
+        """
+        :type graph_name str
+        :type store grapher.models.ModelStore
+        :rtype: dict manifest, it is also written to <graph_name>.json file
+        """
+        (labels, labels_keys) = self._group_nodes(store)
+
+        bulk_ids = array('q', [-1]) * len(BaseModel.registry)
+
+        manifest = {
+            'graph': graph_name,
+            'nodes': self._write_nodes(store, labels, labels_keys, bulk_ids),
+            'relations': self._write_relations(store, bulk_ids),
+        }
+
+        with open(path.join(self.directory, '{}.json'.format(graph_name)), 'wt') as file:
+            json.dump(manifest, file, indent=True)
+
+        self.logger.info('Exported %d nodes and %d relations to %s',
+                         sum(entry['count'] for entry in manifest['nodes']),
+                         sum(entry['count'] for entry in manifest['relations']),
+                         self.directory)
+
+        return manifest
+
+    def _group_nodes(self, store):
+        """
+        Group nodes by label and collect properties names for each label
+
+        :type store grapher.models.ModelStore
+        :rtype: tuple[dict[str, array], dict[str, list[str]]] label -> store indices
+            (or -(node ID + 1) for missing nodes), label -> properties names
+        """
+        registry = BaseModel.registry
+        labels = dict()
+        labels_keys = dict()
+        stored = set()
+
+        for (index, node_id) in enumerate(store.node_ids):
+            # keep the first model when aliases collide
+            if node_id in stored:
+                continue
+
+            stored.add(node_id)
+            label = self.get_label(registry.get_alias(node_id))
+            labels.setdefault(label, array('q')).append(index)
+
+            keys = labels_keys.setdefault(label, ['name'])
+            keys += [key for key in store.shapes[store.node_shapes[index]] if key not in keys]
+
+        # we may want to refer to a node that was not indexed
+        # e.g. English player in a Spanish club
+        for target in store.edge_targets:
+            if target not in stored:
+                stored.add(target)
+                label = self.get_label(registry.get_alias(target))
+                labels.setdefault(label, array('q')).append(-target - 1)
+                labels_keys.setdefault(label, ['name'])
+
+        return labels, labels_keys
+
+    def _write_nodes(self, store, labels, labels_keys, bulk_ids):
+        """
+        Write a file for each label and assign IDs to nodes
+
+        :type store grapher.models.ModelStore
+        :type labels dict[str, array]
+        :type labels_keys dict[str, list[str]]
+        :type bulk_ids array node ID -> its ID in the bulk insert, will be filled
+        :rtype: list[dict]
+        """
+        entries = []
+        bulk_id = 0
+
+        for (label, nodes) in sorted(labels.items()):
+            filename = 'nodes_{}.bin'.format(label)
+            keys = labels_keys[label]
+
+            with open(path.join(self.directory, filename), 'wb') as file:
+                file.write(pack_header(label, keys))
+
+                for node in nodes:
+                    (node_id, properties) = self._get_node(store, node)
+                    file.write(pack_properties(keys, properties))
+
+                    bulk_ids[node_id] = bulk_id
+                    bulk_id += 1
+
+            entries.append({'file': filename, 'label': label, 'count': len(nodes)})
+
+        return entries
+
+    @staticmethod
+    def _get_node(store, node):
+        """
+        :type store grapher.models.ModelStore
+        :type node int store index or -(node ID + 1) for missing nodes
+        :rtype: tuple[int, dict] node ID and properties
+        """
+        if node >= 0:
+            return store.node_ids[node], dict(zip(store.shapes[store.node_shapes[node]],
+                                                  store.node_values[node]))
+
+        node_id = -node - 1
+        return node_id, {'name': BaseModel.registry.get_alias(node_id).split(':')[0]}
+
+    def _write_relations(self, store, bulk_ids):
+        """
+        Write a file for each relation type
+
+        :type store grapher.models.ModelStore
+        :type bulk_ids array
+        :rtype: list[dict]
+        """
+        files = dict()
+        counts = dict()
+
+        try:
+            for (source, relation, target, _) in store.iter_edges():
+                if relation not in files:
+                    files[relation] = open(
+                        path.join(self.directory, 'relations_{}.bin'.format(relation)), 'wb')
+                    files[relation].write(pack_header(relation, []))
+                    counts[relation] = 0
+
+                files[relation].write(struct.pack('=QQ', bulk_ids[source], bulk_ids[target]))
+                counts[relation] += 1
+        finally:
+            for file in files.values():
+                file.close()
+
+        return [
+            {'file': 'relations_{}.bin'.format(relation), 'type': relation,
+             'count': counts[relation]}
+            for relation in sorted(files.keys())
+        ]
@@ -0,0 +1,91 @@
+"""
+Redis connections shared by the whole process
+"""
+import logging
+from threading import Lock
+
+import redis
+
+# used when a pool is created without given settings
+POOL_SETTINGS = {
+    # how many connections can be open at the same time
+    'max_connections': 16,
+    # how long to wait for a free connection before raising an error [sec]
+    'timeout': 10,
+    # how long to wait for a response (SAVE of a large graph may take a while) [sec]
+    'socket_timeout': 300,
+    'socket_connect_timeout': 5,
+    'socket_keepalive': True,
+    # check connections that were not used for this long with PING before using them [sec]
+    'health_check_interval': 30,
+}
+
+_POOLS = dict()
+_POOLS_LOCK = Lock()
+
+
+def get_pool(host, port=6379, settings=None):
+    """
+    Return the connection pool for a given server, it is created when needed
+
+    Pools are kept for the lifetime of the process, connections are re-opened
+    by the pool when the process was forked.
+
+    :type host str
+    :type port int
+    :type settings dict|None overrides POOL_SETTINGS entries
+    :rtype: redis.BlockingConnectionPool
+    """
+    settings = dict(POOL_SETTINGS, **(settings or {}))
+    key = (host, port, tuple(sorted(settings.items())))
+
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+
+        if pool is None:
+            logging.getLogger('get_pool').info(
+                'Creating a pool of %d connections to %s:%d', settings['max_connections'],
+                host, port)
+
+            pool = redis.BlockingConnectionPool(host=host, port=port, **settings)
+            _POOLS[key] = pool
+
+    return pool
+
+
+def get_connection(host, port=6379, settings=None):
+    """
+    :type host str
+    :type port int
+    :type settings dict|None
+    :rtype: redis.Redis client that uses the shared pool
+    """
+    return redis.Redis(connection_pool=get_pool(host, port, settings))
+
+
+def create_async_pool(host, port=6379, settings=None):
+    """
+    Return a new pool for asyncio clients, these pools can only be used by the event loop
+    that runs when the connections are made, so they are not shared by the process
+
+    :type host str
+    :type port int
+    :type settings dict|None overrides POOL_SETTINGS entries
+    :rtype: redis.asyncio.BlockingConnectionPool
+    """
+    # redis.asyncio needs redis 4.2, synchronous clients do not depend on it
+    from redis import asyncio as redis_asyncio
+
+    return redis_asyncio.BlockingConnectionPool(
+        host=host, port=port, **dict(POOL_SETTINGS, **(settings or {})))
+
+
+def close_pools():
+    """
+    Close all connections and forget the pools (e.g. before the process exits)
+    """
+    with _POOLS_LOCK:
+        for pool in _POOLS.values():
+            pool.disconnect()
+
+        _POOLS.clear()
@@ -0,0 +1,251 @@
+"""
+Changes between the graph snapshot and a new set of models
+"""
+import json
+import logging
+from collections import namedtuple, OrderedDict
+from hashlib import md5
+
+# what needs to be done with a node:
+# kind - "created", "updated" or "removed"
+# removed_keys - properties that should be removed from the node
+# removed_edges - (type, target alias) pairs of relations to remove
+# created_edges - (type, target alias, properties) of relations to create
+Change = namedtuple('Change', ['kind', 'alias', 'model', 'removed_keys',
+                               'removed_edges', 'created_edges'])
+
+# snapshot entries are written in batches of this size
+SNAPSHOT_BATCH_SIZE = 1000
+
+
+def get_hash(value):
+    """
+    :type value object JSON-serializable
+    :rtype: str
+    """
+    return md5(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def get_snapshot_entry(model):
+    """
+    :type model grapher.models.BaseModel
+    :rtype: tuple[str, str, str, str, list[tuple[str, str, str]]] alias, JSON-encoded properties,
+        properties hash, relations hash and relations
+    """
+    properties = json.dumps(model.properties)
+    edges = [
+        (relation, target, json.dumps(edge_properties, sort_keys=True))
+        for (relation, target, edge_properties) in model.get_all_relations()
+    ]
+
+    return (
+        model.get_node_name(),
+        properties,
+        get_hash(model.properties),
+        get_hash(sorted(edges)),
+        edges,
+    )
+
+
+def group_by_pair(edges):
+    """
+    :type edges list[tuple[str, str, str]]
+    :rtype: dict[tuple[str, str], list[str]] (type, target alias) -> sorted relations properties
+    """
+    pairs = dict()
+
+    for (relation, target, properties) in edges:
+        pairs.setdefault((relation, target), []).append(properties)
+
+    return {pair: sorted(values) for (pair, values) in pairs.items()}
+
+
+def get_changed_edges(old_edges, edges):
+    """
+    Relations between the same pair of nodes are replaced together
+
+    :type old_edges list[tuple[str, str, str]]
+    :type edges list[tuple[str, str, str]]
+    :rtype: tuple[list[tuple[str, str]], list[tuple[str, str, str]]] removed pairs, created edges
+    """
+    (old_pairs, new_pairs) = (group_by_pair(old_edges), group_by_pair(edges))
+
+    changed = [
+        pair for pair in sorted(set(old_pairs.keys()) | set(new_pairs.keys()))
+        if old_pairs.get(pair) != new_pairs.get(pair)
+    ]
+
+    return (
+        [pair for pair in changed if pair in old_pairs],
+        [edge for edge in edges if (edge[0], edge[1]) in changed],
+    )
+
+
+class Delta(object):
+    """
+    Compares models with the snapshot of the graph (kept in the index state) and tells
+    what has changed, nodes are compared by properties and relations hashes.
+
+    Only the changes are kept in memory, the snapshot is updated by commit().
+    """
+    # pylint: disable=too-many-instance-attributes
+    def __init__(self, state, full=True):
+        """
+        :type state grapher.state.IndexState
+        :type full bool all models are given, nodes that are not there were removed
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.state = state
+        self.full = full
+
+        self.previous = state.get_snapshot()
+        self.seen = set()
+        self.pending = []
+        self.removed = []
+
+        self.summary = OrderedDict([
+            ('created', 0), ('updated', 0), ('removed', 0), ('unchanged', 0),
+            ('edges_created', 0), ('edges_removed', 0),
+        ])
+        self.changes = []
+
+    def iter_changes(self, models):
+        """
+        :type models collections.Iterable[grapher.models.BaseModel]
+        :rtype: list[Change]
+        """
+        for model in models:
+            entry = get_snapshot_entry(model)
+            alias = entry[0]
+
+            # keep the first model when aliases collide
+            if alias in self.seen:
+                continue
+
+            self.seen.add(alias)
+            previous = self.previous.get(alias)
+
+            if previous == (entry[2], entry[3]):
+                self.summary['unchanged'] += 1
+                continue
+
+            self.pending.append(entry)
+
+            if previous is None:
+                change = Change('created', alias, model, [], [], entry[4])
+            else:
+                change = self._get_update(model, entry, previous)
+
+            self._add_to_summary(change)
+            yield change
+
+        if self.full:
+            removed = set(self.previous.keys()) - self.seen
+
+            for alias in sorted(removed):
+                self.removed.append(alias)
+
+                # the node is removed with its relations and the ones pointing to it
+                (_, old_edges) = self.state.get_snapshot_node(alias)
+                incoming = [
+                    (relation, source) for (relation, source)
+                    in self.state.get_snapshot_edges_to(alias) if source not in removed
+                ]
+
+                change = Change('removed', alias, None, [],
+                                [(relation, target) for (relation, target, _) in old_edges], [])
+                self._add_to_summary(change, incoming)
+                yield change
+
+    def _get_update(self, model, entry, previous):
+        """
+        :type model grapher.models.BaseModel
+        :type entry tuple
+        :type previous tuple[str, str]
+        :rtype: Change
+        """
+        (alias, _, properties_hash, edges_hash, edges) = entry
+        (old_properties, old_edges) = self.state.get_snapshot_node(alias)
+
+        removed_keys = []
+
+        if previous[0] != properties_hash:
+            removed_keys = [key for key in old_properties if key not in model.properties]
+
+        (removed_edges, created_edges) = get_changed_edges(old_edges, edges) \
+            if previous[1] != edges_hash else ([], [])
+
+        return Change('updated', alias, model, removed_keys, removed_edges, created_edges)
+
+    def _add_to_summary(self, change, incoming=None):
+        """
+        :type change Change
+        :type incoming list[tuple[str, str]]|None (type, source alias) of relations pointing
+            to a removed node
+        """
+        self.summary[change.kind] += 1
+        self.summary['edges_created'] += len(change.created_edges)
+        self.summary['edges_removed'] += len(change.removed_edges) + len(incoming or [])
+
+        entry = OrderedDict([
+            ('node', change.alias),
+            ('change', change.kind),
+            ('removed_properties', change.removed_keys),
+            ('edges_removed', [list(pair) for pair in change.removed_edges]),
+            ('edges_created', [list(edge[:2]) for edge in change.created_edges]),
+        ])
+
+        if incoming:
+            entry['incoming_edges_removed'] = [list(pair) for pair in incoming]
+
+        self.changes.append(entry)
+
+    def get_summary(self):
+        """
+        Return machine-readable summary of changes
+
+        :rtype: dict
+        """
+        return OrderedDict([('summary', self.summary), ('changes', self.changes)])
+
+    def commit(self):
+        """
+        Update the snapshot, call it once changes were applied to the graph
+        """
+        for offset in range(0, len(self.pending), SNAPSHOT_BATCH_SIZE):
+            self.state.set_snapshot_nodes(self.pending[offset:offset + SNAPSHOT_BATCH_SIZE])
+
+        self.state.remove_snapshot_nodes(self.removed)
+
+        self.logger.info('Snapshot updated: %s', dict(self.summary))
+
+        self.pending = []
+        self.removed = []
+
+
+def record_snapshot(state, models):
+    """
+    Yield given models and record them in the snapshot (e.g. when the graph is stored from scratch)
+
+    :type state grapher.state.IndexState
+    :type models collections.Iterable[grapher.models.BaseModel]
+    :rtype: list[grapher.models.BaseModel]
+    """
+    entries = []
+    seen = set()
+
+    for model in models:
+        yield model
+
+        # keep the first model when aliases collide
+        if model.get_node_name() not in seen:
+            seen.add(model.get_node_name())
+            entries.append(get_snapshot_entry(model))
+
+        if len(entries) >= SNAPSHOT_BATCH_SIZE:
+            state.set_snapshot_nodes(entries)
+            entries = []
+
+    if entries:
+        state.set_snapshot_nodes(entries)
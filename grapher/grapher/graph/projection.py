@@ -0,0 +1,266 @@
+"""
+Relations derived from other relations (projections), e.g. players that played together
+"""
+import logging
+import pickle
+from contextlib import ExitStack
+from datetime import datetime
+from heapq import heappop, heappush, merge
+from operator import itemgetter
+from tempfile import TemporaryFile
+
+from ..models import BaseModel
+from ..utils import chunks
+
+# how many pairs of teammates are aggregated in memory before they are spilled to a file
+CHUNK_SIZE = 1000000
+
+# how many pairs are written to (and read back from) a spilled chunk at once
+SPILL_BATCH_SIZE = 10000
+
+
+def merge_stints(stints):
+    """
+    Merge overlapping stints of the same player at a club (e.g. a loan listed next to the contract)
+
+    :type stints list[tuple[int, int, str]] since, until (inclusive) and player
+    :rtype: list[tuple[int, int, str]] sorted by since
+    """
+    merged = []
+    last = dict()  # player -> index of their last stint in merged
+
+    for (since, until, player) in sorted(stints, key=lambda stint: (stint[2], stint[0])):
+        index = last.get(player)
+
+        if index is not None and since <= merged[index][1]:
+            merged[index] = (merged[index][0], max(until, merged[index][1]), player)
+        else:
+            last[player] = len(merged)
+            merged.append((since, until, player))
+
+    merged.sort(key=lambda stint: stint[0])
+    return merged
+
+
+def sweep(stints):
+    """
+    Yield pairs of overlapping stints, stints that can no longer overlap with the next ones
+    are dropped as the sweep line moves forward, O(n log n + pairs)
+
+    :type stints list[tuple[int, int, str]] since, until (inclusive) and player, sorted by since
+    :rtype: list[tuple[str, str, int, int]] players and the years they overlapped
+    """
+    active = []  # (until, player) heap of stints the sweep line is in
+
+    for (since, until, player) in stints:
+        while active and active[0][0] < since:
+            heappop(active)
+
+        # all active stints started before this one and end in or after its first year
+        for (other_until, other) in active:
+            if other != player:
+                yield (other, player, since, min(until, other_until))
+
+        heappush(active, (until, player))
+
+
+class TeammateProjection(object):
+    """
+    Projects players careers (athlete relations with since and until years) into "teammate"
+    relations between players that were at the same club at the same time.
+
+    Each pair of players gets a single relation weighted by the number of years
+    they played together (at all of their common clubs).
+    """
+    def __init__(self, current_year=None, chunk_size=CHUNK_SIZE):
+        """
+        :type current_year int|None careers that still go on end in this year, defaults to
+            the current year
+        :type chunk_size int how many pairs are kept in memory, see iter_edges
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.current_year = current_year or datetime.utcnow().year
+        self.chunk_size = chunk_size
+        self.clubs = dict()  # club alias -> stints
+
+    @classmethod
+    def from_careers(cls, careers, current_year=None):
+        """
+        :type careers grapher.graph.temporal.TemporalIndex
+        :type current_year int|None
+        :rtype: TeammateProjection
+        """
+        projection = cls(current_year)
+
+        for (club, entries) in careers.teams.items():
+            for (since, until, player) in entries:
+                projection.add(club, player, since, until)
+
+        return projection
+
+    @classmethod
+    def from_models(cls, models, current_year=None, relation='athlete'):
+        """
+        :type models collections.Iterable[grapher.models.BaseModel]
+        :type current_year int|None
+        :type relation str
+        :rtype: TeammateProjection
+        """
+        projection = cls(current_year)
+        registry = BaseModel.registry
+
+        for model in models:
+            if model.get_type() != 'Person':
+                continue
+
+            for (relation_type, target, properties) in model.relations:
+                if relation_type == relation and properties and 'since' in properties:
+                    projection.add(registry.get_alias(target), model.get_node_name(),
+                                   properties['since'], properties.get('until'))
+
+        return projection
+
+    def add(self, club, player, since, until):
+        """
+        :type club str club alias
+        :type player str player alias
+        :type since int
+        :type until int|None None for careers that still go on
+        """
+        until = until if until is not None else self.current_year
+
+        # careers ending before they start are treated as a single year
+        self.clubs.setdefault(club, []).append((since, max(since, until), player))
+
+    def iter_overlaps(self):
+        """
+        :rtype: list[tuple[str, str, str, int, int]] club, players and years they played
+            there together
+        """
+        for (club, stints) in self.clubs.items():
+            for (player_a, player_b, since, until) in sweep(merge_stints(stints)):
+                yield (club, player_a, player_b, since, until)
+
+    def get_edges(self):
+        """
+        All pairs are kept in memory, use iter_edges() for large projections
+
+        :rtype: dict[tuple[str, str], dict] pairs of players aliases (sorted) -> relation
+            properties (see iter_edges)
+        """
+        return {(player_a, player_b): properties
+                for (player_a, player_b, properties) in self.iter_edges()}
+
+    def iter_edges(self):
+        # pylint: disable=too-many-locals
+        """
+        Common stints are aggregated per pair of players in chunks of up to chunk_size pairs.
+        Chunks are spilled to temporary files sorted by pairs and merged, so the memory used
+        does not grow with the number of pairs.
+
+        Pairs are keyed by a single number made of players ranks (in their sorted order),
+        numbers are compared much faster than pairs of aliases when chunks are sorted.
+
+        :rtype: list[tuple[str, str, dict]] source and target aliases (sorted by them) and
+            relation properties: years played together, the first and the last of them and
+            the number of common stints
+        """
+        players = sorted({player for stints in self.clubs.values() for (_, _, player) in stints})
+        ranks = {player: rank for (rank, player) in enumerate(players)}
+        size = len(players)
+
+        with ExitStack() as stack:
+            runs = []
+            edges = dict()  # rank * size + rank -> [years, since, until, stints]
+
+            for (_, player_a, player_b, since, until) in self.iter_overlaps():
+                (rank_a, rank_b) = (ranks[player_a], ranks[player_b])
+                key = rank_a * size + rank_b if rank_a < rank_b else rank_b * size + rank_a
+                edge = edges.get(key)
+
+                if edge is None:
+                    edges[key] = [until - since + 1, since, until, 1]
+                else:
+                    edge[0] += until - since + 1
+                    edge[3] += 1
+
+                    if since < edge[1]:
+                        edge[1] = since
+                    if until > edge[2]:
+                        edge[2] = until
+
+                if len(edges) >= self.chunk_size:
+                    runs.append(self._spill(edges, stack.enter_context(TemporaryFile())))
+                    edges = dict()
+
+            # the last chunk is merged with the spilled ones without being written
+            pairs = sorted(edges.items(), key=itemgetter(0))
+
+            if runs:
+                pairs = merge_chunks(runs + [pairs])
+
+            count = 0
+            stints = 0
+
+            for (key, (years, since, until, common)) in pairs:
+                count += 1
+                stints += common
+
+                yield (players[key // size], players[key % size],
+                       {'years': years, 'since': since, 'until': until, 'stints': common})
+
+        self.logger.info('Found %d teammates pairs (%d common stints) in %d clubs '
+                         '(%d chunks spilled)', count, stints, len(self.clubs), len(runs))
+
+    @staticmethod
+    def _spill(edges, file):
+        """
+        :type edges dict
+        :type file file
+        :rtype: list[tuple[int, list]] pairs read back from the file, sorted by their keys
+        """
+        for batch in chunks(sorted(edges.items(), key=itemgetter(0)), SPILL_BATCH_SIZE):
+            pickle.dump(batch, file, pickle.HIGHEST_PROTOCOL)
+
+        file.seek(0)
+
+        def iter_pairs():
+            while True:
+                try:
+                    yield from pickle.load(file)
+                except EOFError:
+                    return
+
+        return iter_pairs()
+
+
+def merge_chunks(runs):
+    """
+    Merge chunks of pairs sorted by their keys, partial aggregates of a pair of players
+    from different chunks are combined
+
+    :type runs list[list[tuple[int, list[int]]]] pair key -> years played together,
+        the first and the last of them and the number of common stints
+    :rtype: list[tuple[int, list[int]]]
+    """
+    (current, edge) = (None, None)
+
+    for (key, years) in merge(*runs):
+        if key != current:
+            if edge is not None:
+                yield (current, edge)
+
+            (current, edge) = (key, years)
+            continue
+
+        edge[0] += years[0]
+        edge[3] += years[3]
+
+        if years[1] < edge[1]:
+            edge[1] = years[1]
+        if years[2] > edge[2]:
+            edge[2] = years[2]
+
+    if edge is not None:
+        yield (current, edge)
@@ -0,0 +1,288 @@
+"""
+Named Cypher queries with parameters
+"""
+import logging
+import re
+from functools import lru_cache
+
+# $name placeholders in query templates
+PARAMETER_RE = re.compile(r'\$([A-Za-z_][A-Za-z0-9_]*)')
+
+# placeholders with what they are compared to, e.g. "t.name = $club"
+COMPARED_PARAMETER_RE = re.compile(r'([A-Za-z_][A-Za-z0-9_.]*\s*=\s*)?\$([A-Za-z_][A-Za-z0-9_]*)')
+
+# how many prepared queries are remembered
+PREPARED_CACHE_SIZE = 1024
+
+# batch queries return the key each row belongs to in this column
+BATCH_KEY = 'batch_key'
+
+# RETURN clause that the key column is added to
+RETURN_RE = re.compile(r'\bRETURN\s+(DISTINCT\s+)?', re.IGNORECASE)
+
+
+class QueryError(Exception):
+    """
+    Raised when a query template is not valid or got wrong parameters
+    """
+
+
+def encode_value(value):
+    """
+    Encode a parameter value as Cypher literal
+
+    :type value str|int|float|bool|None
+    :rtype: str
+    """
+    if value is None:
+        return 'NULL'
+
+    # bool is a subclass of int, check it first
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+
+    if isinstance(value, (int, float)):
+        return repr(value)
+
+    if isinstance(value, str):
+        return '"{}"'.format(value.replace('\\', '\\\\').replace('"', '\\"'))
+
+    raise QueryError('Unsupported parameter type: {}'.format(type(value).__name__))
+
+
+def encode_list(values):
+    """
+    Encode a list of parameter values as Cypher list literal
+
+    :type values list[str|int|float|bool|None]
+    :rtype: str
+    """
+    return '[{}]'.format(', '.join(encode_value(value) for value in values))
+
+
+class QueryTemplate(object):
+    """
+    Cypher query with $name placeholders for values
+    """
+    def __init__(self, name, query, params=()):
+        """
+        :type name str
+        :type query str
+        :type params tuple[str] names of parameters the query takes
+        """
+        self.name = name
+        self.query = ' '.join(query.split())
+        self.params = tuple(params)
+
+        if not self.query:
+            raise QueryError('Query "{}" is empty'.format(name))
+
+        used = set(PARAMETER_RE.findall(self.query))
+
+        if used != set(self.params):
+            raise QueryError('Query "{}" uses {} parameters, but declares {}'.format(
+                name, sorted(used), sorted(self.params)))
+
+        # "$name" placeholders become "{name}" fields, braces of Cypher maps are escaped
+        self.format = PARAMETER_RE.sub(
+            r'{\1}', self.query.replace('{', '{{').replace('}', '}}'))
+
+    def __repr__(self):
+        return '<QueryTemplate {}>'.format(self.name)
+
+    def check_values(self, values):
+        """
+        :type values dict
+        """
+        if set(values.keys()) != set(self.params):
+            raise QueryError('Query "{}" takes {} parameters, got {}'.format(
+                self.name, sorted(self.params), sorted(values.keys())))
+
+    def render(self, values):
+        """
+        Put the values into the query
+
+        :type values dict
+        :rtype: str
+        """
+        return self.format.format(
+            **{param: encode_value(value) for (param, value) in values.items()})
+
+    def get_batch_expression(self, param):
+        """
+        Return what the batched parameter is compared to, e.g. "t.name" for "t.name = $club"
+
+        :type param str
+        :rtype: str
+        """
+        matches = [
+            compared for (compared, name) in COMPARED_PARAMETER_RE.findall(self.query)
+            if name == param
+        ]
+
+        if len(matches) != 1 or not matches[0]:
+            raise QueryError('Query "{name}" can not be batched by "{param}", it needs to be '
+                             'compared once with "expression = ${param}"'.format(
+                                 name=self.name, param=param))
+
+        return matches[0].rstrip(' =')
+
+    def render_batch(self, param, keys, values, parameters=False):
+        """
+        Ask for many values of a single parameter in one query, each row starts with
+        the key (value of the parameter) it belongs to.
+
+        Parameters are passed as a list that is unwound (supported by RedisGraph 2.0+),
+        otherwise keys are put into the query as alternatives (RedisGraph 1.0 lacks UNWIND).
+
+        :type param str
+        :type keys list
+        :type values dict the other parameters, shared by all keys
+        :type parameters bool
+        :rtype: str
+        """
+        expression = self.get_batch_expression(param)
+
+        if not keys:
+            raise QueryError('Query "{}" got no values of "{}"'.format(self.name, param))
+
+        # the key column is added to the template text, before any value is put into it
+        query = RETURN_RE.sub(r'RETURN \g<1>{}, '.format(
+            BATCH_KEY if parameters else '{} AS {}'.format(expression, BATCH_KEY)),
+                              self.query, count=1)
+
+        if parameters:
+            return 'CYPHER {} UNWIND ${} AS {} {}'.format(
+                ' '.join('{}={}'.format(name, encode_list(keys) if name == param
+                                        else encode_value(values[name]))
+                         for name in self.params),
+                param, BATCH_KEY,
+                PARAMETER_RE.sub(
+                    lambda match: BATCH_KEY if match.group(1) == param else match.group(0),
+                    query))
+
+        alternatives = '({})'.format(' OR '.join(
+            '{} = {}'.format(expression, encode_value(key)) for key in keys))
+
+        def substitute(match):
+            if match.group(2) == param:
+                return alternatives
+
+            return (match.group(1) or '') + encode_value(values[match.group(2)])
+
+        # a single pass, values are not searched for placeholders
+        return COMPARED_PARAMETER_RE.sub(substitute, query)
+
+    def render_with_parameters(self, values):
+        """
+        Pass the values as Cypher parameters (supported by RedisGraph 2.0+), the query text
+        stays the same so the server can cache its plan
+
+        :type values dict
+        :rtype: str
+        """
+        if not self.params:
+            return self.query
+
+        return 'CYPHER {} {}'.format(
+            ' '.join('{}={}'.format(param, encode_value(values[param]))
+                     for param in self.params),
+            self.query)
+
+
+class QueryRegistry(object):
+    """
+    Keeps named query templates, they are validated when registered.
+
+    Prepared query texts are memoized, so asking the same question again does not
+    format the query again.
+    """
+    def __init__(self, parameters=False, cache_size=PREPARED_CACHE_SIZE):
+        """
+        :type parameters bool send values as Cypher parameters instead of putting them
+            into the query (RedisGraph 1.0 does not support parameters)
+        :type cache_size int
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.parameters = parameters
+        self.templates = dict()
+
+        self._prepare = lru_cache(maxsize=cache_size)(self._prepare_query)
+
+    def register(self, name, query, params=()):
+        """
+        :type name str
+        :type query str
+        :type params tuple[str]
+        :rtype: QueryTemplate
+        """
+        if name in self.templates:
+            raise QueryError('Query "{}" is already registered'.format(name))
+
+        template = QueryTemplate(name, query, params)
+        self.templates[name] = template
+
+        self.logger.debug('Registered %s: %s', name, template.query)
+        return template
+
+    def get(self, name):
+        """
+        :type name str
+        :rtype: QueryTemplate
+        """
+        try:
+            return self.templates[name]
+        except KeyError:
+            raise QueryError('Unknown query: {}'.format(name)) from None
+
+    def prepare(self, query_name, **values):
+        """
+        Return the query text to be sent to the server
+
+        :type query_name str
+        :rtype: str
+        """
+        # 1, 1.0 and True are equal, keep types in the key
+        key = (tuple(values.items()), tuple(map(type, values.values())))
+
+        try:
+            return self._prepare(query_name, key)
+        except TypeError:
+            # unhashable value, it will be rejected by encode_value()
+            return self._prepare_query(query_name, key)
+
+    def prepare_batch(self, query_name, param, keys, **values):
+        """
+        Return the query text asking for many values of a given parameter at once,
+        see QueryTemplate.render_batch
+
+        :type query_name str
+        :type param str
+        :type keys list
+        :rtype: str
+        """
+        template = self.get(query_name)
+        template.check_values(dict(values, **{param: None}))
+
+        return template.render_batch(param, keys, values, parameters=self.parameters)
+
+    def _prepare_query(self, name, key):
+        """
+        :type name str
+        :type key tuple[tuple, tuple] parameters items and types of values
+        :rtype: str
+        """
+        template = self.get(name)
+        values = dict(key[0])
+
+        template.check_values(values)
+
+        return template.render_with_parameters(values) if self.parameters \
+            else template.render(values)
+
+    def get_cache_info(self):
+        """
+        :rtype: functools._CacheInfo hits, misses, maxsize and currsize of prepared queries
+        """
+        return self._prepare.cache_info()
@@ -1,24 +1,64 @@
 """
 Redis storage
 """
+import gzip
+import json
+import time
+from collections import Counter
+from itertools import chain, islice
+from tempfile import TemporaryFile
+
 import redis
 from redisgraph import Node, Edge, Graph
 from .base import BaseGraph
+from .bulk import BulkExporter
+from .connection import get_connection
+from .queries import encode_value
+from .results import get_statistics
+from .views import RedisViews
+from ..utils import chunks
+
+# how many nodes / edges are sent to Redis at once when storing a stream of models
+BATCH_SIZE = 500
+
+# how many relations are created by a single query when replacing relations of a given type
+EDGES_PER_QUERY = 50
+
+# warn when Redis was blocked by a single batch for longer than this [sec]
+SLOW_BATCH_TIME = 1.0
+
+# keeps the name of the graph version that should be queried
+POINTER_KEY = 'graph:{}:current'
+
+# incremented each time the graph is written to, query results can be cached for each version
+VERSION_KEY = 'graph:{}:version'
+
+# graph versions used in staging mode, a new version replaces the other one
+STAGING_VERSIONS = ('blue', 'green')
+
+
+class StagingError(Exception):
+    """
+    Raised when a graph built in staging mode is not complete
+    """
 
 
 class RedisGraph(BaseGraph):
     """
     Handles storing a collection of models in RedisGraph
     """
-    def __init__(self, host, port=6379):
+    # pylint: disable=too-many-public-methods
+    def __init__(self, host, port=6379, pool_settings=None):
         """
         :type host str
         :type port int
+        :type pool_settings dict|None connection pool settings, see POOL_SETTINGS
         """
         super(RedisGraph, self).__init__()
 
         self.host = host
         self.port = port
+        self.pool_settings = pool_settings
 
         self.logger.info('Using redis: %s:%d', host, port)
 
@@ -66,6 +106,297 @@ class RedisGraph(BaseGraph):
                 properties=cls.encode_properties(properties) if properties else None
             )
 
+    @staticmethod
+    def edge_query(source, relation, target, properties):
+        """
+        Return a Cypher query that connects two already existing nodes
+
+        :type source Node
+        :type relation str
+        :type target Node
+        :type properties dict|None
+        :rtype: str
+        """
+        # MATCH (src:Person{name:"John Cleese"}),(dst:Person{name:"Graham Chapman"})
+        # CREATE (src)-[:plays_with]->(dst)
+        (_, source_label) = source.alias.split(':')
+        (_, target_label) = target.alias.split(':')
+
+        return 'MATCH {},{} CREATE {}'.format(
+            Node(alias='src:' + source_label, properties=source.properties),
+            Node(alias='dst:' + target_label, properties=target.properties),
+            Edge(
+                src_node=Node(alias='src'),
+                relation=relation,
+                dest_node=Node(alias='dst'),
+                properties=properties
+            )
+        )
+
+    @staticmethod
+    def edges_query(relation, edges):
+        """
+        Return a Cypher query that connects many pairs of already existing nodes,
+        each node is matched once. No relation is created when any of the nodes is not found.
+
+        :type relation str
+        :type edges list[tuple[Node, Node, dict|None]] source, target and relation properties
+        :rtype: str
+        """
+        # MATCH (n0:Person{name:"A"}),(n1:Person{name:"B"}),(n2:Person{name:"C"})
+        # CREATE (n0)-[:teammate{years:2}]->(n1),(n0)-[:teammate]->(n2)
+        variables = dict()  # node alias -> its variable in the query
+        matches = []
+
+        for node in chain.from_iterable((source, target) for (source, target, _) in edges):
+            if node.alias not in variables:
+                variables[node.alias] = 'n{}'.format(len(variables))
+                matches.append(str(Node(
+                    alias='{}:{}'.format(variables[node.alias], node.alias.split(':')[1]),
+                    properties=node.properties)))
+
+        return 'MATCH {} CREATE {}'.format(','.join(matches), ','.join([
+            str(Edge(
+                src_node=Node(alias=variables[source.alias]),
+                relation=relation,
+                dest_node=Node(alias=variables[target.alias]),
+                properties=properties
+            ))
+            for (source, target, properties) in edges
+        ]))
+
+    @staticmethod
+    def index_queries(aliases, indexed):
+        """
+        Return queries that index nodes names for labels that are not indexed yet,
+        otherwise each edge query scans all nodes with a given label
+
+        :type aliases collections.Iterable[str]
+        :type indexed set labels already indexed, will be updated
+        :rtype: list[str]
+        """
+        labels = {alias.split(':')[1] for alias in aliases} - indexed
+        indexed.update(labels)
+
+        # CREATE INDEX ON :Person(name)
+        return ['CREATE INDEX ON :{}(name)'.format(label) for label in sorted(labels)]
+
+    def iter_queries(self, models, batch_size=BATCH_SIZE, names=None, checkpoint=None,
+                     counts=None):
+        # pylint: disable=too-many-arguments
+        """
+        Yield batches of Cypher queries that create a graph from a stream of models.
+
+        Nodes are created as models arrive. Relations are spilled to a temporary file
+        and are created once all nodes are known, missing target nodes are added then.
+        Only nodes names are kept in memory.
+
+        Each batch is expected to be committed before the next one is requested.
+
+        :type models collections.Iterable[grapher.models.BaseModel]
+        :type batch_size int
+        :type names dict|None will be filled with node alias -> its name property
+        :type checkpoint grapher.state.Checkpoint|None keeps track of committed batches
+        :type counts collections.Counter|None will be filled with the number of relations
+            queried
+        :rtype: list[list[str]]
+        """
+        if names is None:
+            names = dict()
+
+        if counts is None:
+            counts = Counter()
+
+        if checkpoint is None:
+            with TemporaryFile('w+t') as edges_file:
+                yield from self._iter_nodes_queries(models, batch_size, names, edges_file)
+
+                edges_file.seek(0)
+                yield from self._iter_edges_queries(edges_file, batch_size, names, counts)
+
+            return
+
+        # relations are spilled to a file kept by the checkpoint
+        if not checkpoint.progress['nodes_done']:
+            yield from self._iter_nodes_queries(
+                models, batch_size, names, checkpoint.edges_file, checkpoint)
+            checkpoint.nodes_done(names)
+
+        checkpoint.edges_file.seek(0)
+        yield from self._iter_edges_queries(
+            islice(checkpoint.edges_file, checkpoint.progress['edges_done'], None),
+            batch_size, names, counts, checkpoint)
+
+    def _iter_nodes_queries(self, models, batch_size, names, edges_file, checkpoint=None):
+        """
+        :type models collections.Iterable[grapher.models.BaseModel]
+        :type batch_size int
+        :type names dict
+        :type edges_file file
+        :type checkpoint grapher.state.Checkpoint|None
+        :rtype: list[list[str]]
+        """
+        models_count = 0
+
+        for batch in chunks(models, batch_size):
+            nodes = []
+
+            for model in batch:
+                for (relation, target, properties) in model.get_all_relations():
+                    edges_file.write(json.dumps(
+                        [model.get_node_name(), relation, target, properties]) + '\n')
+
+                # keep the first model when aliases collide
+                if model.get_node_name() not in names:
+                    names[model.get_node_name()] = model.get_name()
+                    nodes.append(self.model_to_node(model))
+
+            models_count += len(batch)
+            self.logger.info('Got %d models so far', models_count)
+
+            if nodes:
+                yield ['CREATE ' + ','.join([str(node) for node in nodes])]
+
+            if checkpoint is not None:
+                checkpoint.nodes_committed(len(batch), names)
+
+    def _iter_edges_queries(self, edges_file, batch_size, names, counts, checkpoint=None):
+        # pylint: disable=too-many-arguments,too-many-locals
+        """
+        :type edges_file collections.Iterable[str] JSON-encoded edges, one per line
+        :type batch_size int
+        :type names dict
+        :type counts collections.Counter
+        :type checkpoint grapher.state.Checkpoint|None
+        :rtype: list[list[str]]
+        """
+        def node(alias):
+            return Node(alias=alias, properties=self.encode_properties({'name': names[alias]}))
+
+        indexed = set()
+
+        for batch in chunks(edges_file, batch_size):
+            edges = [json.loads(line) for line in batch]
+            missing = []
+
+            for (_, _, target, _) in edges:
+                # add target node if needed
+                # we may want to refer to a node that was not indexed above
+                # e.g. English player in a Spanish club
+                if target not in names:
+                    names[target] = target.split(':')[0]
+                    missing.append(node(target))
+                    self.logger.info('Adding missing node: %s', target)
+
+            queries = ['CREATE ' + ','.join([str(entry) for entry in missing])] if missing else []
+            queries += self.index_queries(
+                chain.from_iterable((source, target) for (source, _, target, _) in edges), indexed)
+
+            for (source, relation, target, properties) in edges:
+                queries.append(self.edge_query(
+                    source=node(source),
+                    relation=relation,
+                    target=node(target),
+                    properties=self.encode_properties(properties) if properties else None
+                ))
+
+            counts['relations'] += len(edges)
+            yield queries
+
+            if checkpoint is not None:
+                checkpoint.edges_committed(len(edges), names)
+
+    def iter_delta_queries(self, changes, names, batch_size=BATCH_SIZE, counts=None):
+        # pylint: disable=too-many-locals
+        """
+        Yield batches of Cypher queries that apply changes to an existing graph.
+
+        Changed nodes have their properties set, only changed relations are removed
+        and created again. Removed nodes are deleted together with their relations
+        (including the ones pointing to them).
+
+        :type changes collections.Iterable[grapher.graph.delta.Change]
+        :type names dict node alias -> its name property, as filled by iter_queries()
+        :type batch_size int
+        :type counts collections.Counter|None will be filled with the number of relations
+            queried
+        :rtype: list[list[str]]
+        """
+        def node(alias, name=None):
+            return Node(alias=alias, properties=self.encode_properties(
+                {'name': name or names[alias]}))
+
+        if counts is None:
+            counts = Counter()
+
+        indexed = set()
+
+        for batch in chunks(changes, batch_size):
+            queries = []
+
+            for change in batch:
+                alias = change.alias
+                (_, label) = alias.split(':')
+
+                if change.kind == 'removed':
+                    queries.append('MATCH {} DELETE n'.format(node('n:' + label, names[alias])))
+                    del names[alias]
+                    continue
+
+                # match the node using the name it was stored with
+                # (it can be a missing node added before, named after its alias)
+                model = change.model
+                properties = dict(model.properties)
+                properties.update({key: None for key in change.removed_keys})
+
+                queries.append('MERGE {} SET {}'.format(
+                    node('n:' + label, names.get(alias, model.get_name())),
+                    ', '.join([
+                        'n.{}={}'.format(key, encode_value(value))
+                        for (key, value) in properties.items()
+                    ])
+                ))
+                # the node was stored before the snapshot was taken, replace its relations
+                if change.kind == 'created' and alias in names:
+                    queries.append('MATCH {}-[r]->() DELETE r'.format(node(alias)))
+
+                names[alias] = model.get_name()
+
+                for (relation, target) in change.removed_edges:
+                    queries.append('MATCH {}-[r:{}]->{} DELETE r'.format(
+                        node('src:' + label, names[alias]), relation,
+                        node('dst:' + target.split(':')[1],
+                             names.get(target, target.split(':')[0]))))
+
+                for (relation, target, edge_properties) in change.created_edges:
+                    if target not in names:
+                        names[target] = target.split(':')[0]
+                        queries.append('CREATE {}'.format(node(target)))
+                        self.logger.info('Adding missing node: %s', target)
+
+                    # both nodes exist now
+                    queries += self.index_queries([alias, target], indexed)
+
+                    edge_properties = json.loads(edge_properties)
+                    counts['relations'] += 1
+                    queries.append(self.edge_query(
+                        source=node(alias),
+                        relation=relation,
+                        target=node(target),
+                        properties=self.encode_properties(edge_properties)
+                        if edge_properties else None
+                    ))
+
+            yield queries
+
+    def get_connection(self):
+        """
+        Connections are taken from the pool shared by all instances in this process
+
+        :rtype: redis.Redis
+        """
+        return get_connection(self.host, self.port, self.pool_settings)
+
     def get_redisgraph(self, graph_name):
         """
         :type graph_name str
@@ -73,9 +404,132 @@ class RedisGraph(BaseGraph):
         """
         return Graph(
             name=graph_name,
-            redis_con=redis.Redis(self.host, self.port)
+            redis_con=self.get_connection()
         )
 
+    def get_current_graph_name(self, graph_name):
+        """
+        Return the name of the graph version that should be queried
+
+        :type graph_name str
+        :rtype: str
+        """
+        current = self.get_connection().get(POINTER_KEY.format(graph_name))
+        return current.decode('utf-8') if current else graph_name
+
+    def get_current_redisgraph(self, graph_name):
+        """
+        :type graph_name str
+        :rtype: Graph
+        """
+        return self.get_redisgraph(self.get_current_graph_name(graph_name))
+
+    def get_views(self, graph_name):
+        """
+        :type graph_name str
+        :rtype: RedisViews
+        """
+        return RedisViews(self.get_connection(), graph_name)
+
+    def get_version(self, graph_name):
+        """
+        Return the version stamp of the graph, it changes each time the graph is written to
+
+        :type graph_name str
+        :rtype: int
+        """
+        version = self.get_connection().get(VERSION_KEY.format(graph_name))
+        return int(version) if version else 0
+
+    def _bump_version(self, graph_name):
+        """
+        :type graph_name str
+        """
+        version = self.get_connection().incr(VERSION_KEY.format(graph_name))
+        self.logger.info('%s graph is now at version %d', graph_name, version)
+
+    def _get_target_redisgraph(self, graph_name, staging, keep=False):
+        """
+        Return the graph that should be written to
+
+        In staging mode that is the graph version that is not currently queried,
+        otherwise the graph is stored directly under its name.
+
+        :type graph_name str
+        :type staging bool
+        :type keep bool do not remove the existing graph (e.g. when resuming)
+        :rtype: Graph
+        """
+        if staging:
+            current = self.get_current_graph_name(graph_name)
+            target_name = '{}:{}'.format(graph_name, STAGING_VERSIONS[0]) \
+                if current != '{}:{}'.format(graph_name, STAGING_VERSIONS[0]) \
+                else '{}:{}'.format(graph_name, STAGING_VERSIONS[1])
+        else:
+            target_name = graph_name
+
+        redis_graph = self.get_redisgraph(target_name)
+
+        if not staging:
+            # queries should now go to the graph stored under its name
+            redis_graph.redis_con.delete(POINTER_KEY.format(graph_name))
+
+        if not keep:
+            self._delete(redis_graph)
+
+        self.logger.info('Writing to %s graph', target_name)
+        return redis_graph
+
+    def _delete(self, redis_graph):
+        """
+        :type redis_graph Graph
+        """
+        try:
+            redis_graph.delete()
+        except redis.exceptions.ResponseError as ex:
+            # Graph was not found in database.
+            self.logger.info(ex)
+
+    @staticmethod
+    def _count(redis_graph, query):
+        """
+        :type redis_graph Graph
+        :type query str
+        :rtype: int
+        """
+        # the first row is the header
+        return int(float(redis_graph.query(query).result_set[1][0]))
+
+    def _publish(self, graph_name, redis_graph, nodes, edges=None):
+        """
+        Check that the graph built in staging mode is complete and make queries use it,
+        the previous version is removed.
+
+        :type graph_name str
+        :type redis_graph Graph
+        :type nodes int expected number of nodes
+        :type edges int|None expected number of edges (not checked if not provided)
+        """
+        stored_nodes = self._count(redis_graph, 'MATCH (n) RETURN count(n)')
+        stored_edges = self._count(redis_graph, 'MATCH ()-[r]->() RETURN count(r)')
+
+        self.logger.info('%s graph has %d nodes and %d edges',
+                         redis_graph.name, stored_nodes, stored_edges)
+
+        if stored_nodes != nodes or (edges is not None and stored_edges != edges):
+            raise StagingError('{} graph has {} nodes and {} edges, expected {} and {}'.format(
+                redis_graph.name, stored_nodes, stored_edges, nodes, edges))
+
+        previous = self.get_current_graph_name(graph_name)
+        redis_graph.redis_con.set(POINTER_KEY.format(graph_name), redis_graph.name)
+        self.logger.info('%s graph is now queried', redis_graph.name)
+
+        if previous != redis_graph.name:
+            self._delete(self.get_redisgraph(previous))
+
+        # do not block queries while the database is saved
+        redis_graph.redis_con.execute_command('BGSAVE')
+
     def _build_graph(self, graph_name):
         """
         :type graph_name str
@@ -126,42 +580,340 @@ class RedisGraph(BaseGraph):
 
         # https://oss.redislabs.com/redisgraph/#with-redis-cli
         # copied from redisgraph/client.py (commit function)
-        query = ''
+        entities = [str(node) for node in redis_graph.nodes.values()] + \
+            [str(edge) for edge in redis_graph.edges]
 
-        for _, node in redis_graph.nodes.items():
-            query += str(node) + ','
+        # encode "
+        query = ','.join(entities).replace('"', '\\"')
 
-        for edge in redis_graph.edges:
-            query += str(edge) + ','
+        return 'GRAPH.QUERY {name} "CREATE {graph}"'.format(name=graph_name, graph=query)
 
-        # Discard leading comma.
-        if query[-1] == ',':
-            query = query[:-1]
+    @staticmethod
+    def dump_query(graph_name, query):
+        """
+        Return a line with redis-cli command that runs a given query
 
-        # encode "
-        query = query.replace('"', '\\"')
+        :type graph_name str
+        :type query str
+        :rtype: str
+        """
+        # https://oss.redislabs.com/redisgraph/#with-redis-cli
+        return 'GRAPH.QUERY {} "{}"\n'.format(graph_name, query.replace('"', '\\"'))
 
-        return 'GRAPH.QUERY {name} "CREATE {graph}"'.format(name=graph_name, graph=query)
+    def iter_dump(self, graph_name, batch_size=BATCH_SIZE):
+        """
+        Yield batches of redis-cli commands (one per line) that create the graph,
+        nodes go first and then edges
 
-    def store(self, graph_name):
+        :type graph_name str
+        :type batch_size int
+        :rtype: list[list[str]]
         """
-        Store the graph in Redis
+        for queries in self.iter_queries(self.models, batch_size):
+            yield [self.dump_query(graph_name, query) for query in queries]
+
+    def dump_to_file(self, graph_name, output, batch_size=BATCH_SIZE):
+        """
+        Write redis-cli commands that create the graph to a file-like object,
+        commands are written as they are generated
 
         :type graph_name str
+        :type output file
+        :type batch_size int
+        :rtype: int the number of commands written
         """
-        redis_graph = self._build_graph(graph_name)
+        count = 0
+
+        for lines in self.iter_dump(graph_name, batch_size):
+            output.writelines(lines)
+            count += len(lines)
+
+        return count
+
+    def dump_to_files(self, graph_name, filename, parts=1, compress=False,
+                      batch_size=BATCH_SIZE):
+        # pylint: disable=too-many-arguments
+        """
+        Write redis-cli commands that create the graph to a given number of files
+        (<filename>.1, <filename>.2, ...), they should be loaded in that order.
 
-        # and save it
-        self.logger.info('Committing graph with %d nodes and %s edges',
-                         len(redis_graph.nodes), len(redis_graph.edges))
+        :type graph_name str
+        :type filename str
+        :type parts int
+        :type compress bool use gzip (".gz" suffix is added to file names)
+        :type batch_size int
+        :rtype: list[str] names of files written
+        """
+        filenames = [
+            (filename if parts == 1 else '{}.{}'.format(filename, part + 1)) +
+            ('.gz' if compress else '')
+            for part in range(parts)
+        ]
+
+        # nodes batches and then edges batches are split evenly between files
+        batches = max(-(-len(self.models) // batch_size) -
+                      (-self.models.get_edges_count() // batch_size), 1)
+
+        opener = gzip.open if compress else open
+        outputs = []
+
+        # the last, empty batch makes sure that all parts were created
+        batches_parts = chain(
+            (
+                (min(index * parts // batches, parts - 1), lines)
+                for (index, lines) in enumerate(self.iter_dump(graph_name, batch_size))
+            ),
+            [(parts - 1, [])]
+        )
 
         try:
-            redis_graph.delete()
-        except redis.exceptions.ResponseError as ex:
-            # Graph was not found in database.
-            self.logger.info(ex)
+            for (part, lines) in batches_parts:
+                while len(outputs) <= part:
+                    if outputs:
+                        outputs[-1].close()
+
+                    outputs.append(opener(filenames[len(outputs)], 'wt'))
+
+                outputs[-1].writelines(lines)
+        finally:
+            if outputs:
+                outputs[-1].close()
+
+        self.logger.info('Graph dumped to %s', filenames)
+        return filenames
+
+    def dump_bulk(self, graph_name, directory):
+        """
+        Write binary files (and their manifest) in the layout of GRAPH.BULK command,
+        they are read by CSRGraph.from_bulk
+
+        :type graph_name str
+        :type directory str
+        :rtype: dict manifest
+        """
+        return BulkExporter(directory).export(graph_name, self.models)
+
+    def store(self, graph_name, batch_size=BATCH_SIZE, progress=None, staging=False):
+        """
+        Store the graph in Redis
+
+        Nodes and then edges are sent in batches, each batch over a single pipeline,
+        so that Redis is never blocked by a single huge query.
+
+        In staging mode the graph is built next to the one being queried and replaces it
+        once it is complete.
+
+        :type graph_name str
+        :type batch_size int
+        :type progress callable|None called with the number of batches and queries sent so far
+        :type staging bool
+        """
+        redis_graph = self._get_target_redisgraph(graph_name, staging)
+        names = dict()
+        counts = Counter()
+
+        self.logger.info('Committing graph with %d nodes and %d edges',
+                         len(self.models), self.models.get_edges_count())
+
+        statistics = self._execute(
+            redis_graph, self.iter_queries(self.models, batch_size, names, counts=counts),
+            progress=progress, save=not staging)
+        self._check_relations(counts['relations'], statistics)
+
+        if staging:
+            self._publish(graph_name, redis_graph, len(names), self.models.get_edges_count())
+
+        self._bump_version(graph_name)
+
+    def store_stream(self, graph_name, models, batch_size=BATCH_SIZE, dump_file=None,
+                     names=None, checkpoint=None, staging=False):
+        # pylint: disable=too-many-arguments
+        """
+        Store a stream of models in Redis in batches, the first batches are sent
+        while models are still being produced.
+
+        In staging mode the graph is built next to the one being queried and replaces it
+        once all nodes are stored.
+
+        :type graph_name str
+        :type models collections.Iterable[grapher.models.BaseModel]
+        :type batch_size int
+        :type dump_file file|None if provided, all queries will be written there as well
+        :type names dict|None will be filled with node alias -> its name property
+        :type checkpoint grapher.state.Checkpoint|None when resumed, the graph is not removed
+        :type staging bool
+        """
+        if names is None:
+            names = dict()
+
+        redis_graph = self._get_target_redisgraph(
+            graph_name, staging, keep=checkpoint is not None and checkpoint.resumed)
+        counts = Counter()
+
+        statistics = self._execute(
+            redis_graph, self.iter_queries(models, batch_size, names, checkpoint, counts),
+            dump_file=dump_file, dump_name=graph_name, save=not staging)
+        self._check_relations(counts['relations'], statistics)
+
+        if staging:
+            self._publish(graph_name, redis_graph, len(names))
+
+        self._bump_version(graph_name)
+
+    def store_delta(self, graph_name, models, delta, names, batch_size=BATCH_SIZE):
+        """
+        Apply only what has changed since the graph snapshot was taken
+
+        :type graph_name str
+        :type models collections.Iterable[grapher.models.BaseModel]
+        :type delta grapher.graph.delta.Delta
+        :type names dict node alias -> its name property, will be updated
+        :type batch_size int
+        :rtype: dict summary of changes
+        """
+        redis_graph = self.get_current_redisgraph(graph_name)
+        counts = Counter()
+
+        statistics = self._execute(redis_graph, self.iter_delta_queries(
+            delta.iter_changes(models), names, batch_size, counts))
+        self._check_relations(counts['relations'], statistics)
+
+        delta.commit()
+
+        self._bump_version(graph_name)
+
+        return delta.get_summary()
+
+    def store_relations(self, graph_name, relation, edges, names, batch_size=BATCH_SIZE):
+        # pylint: disable=too-many-arguments
+        """
+        Replace all relations of a given type, e.g. the ones computed from other relations
+
+        :type graph_name str
+        :type relation str
+        :type edges collections.Iterable[tuple[str, str, dict|None]] source and target aliases
+            and relation properties
+        :type names dict node alias -> its name property
+        :type batch_size int
+        :rtype: int the number of relations stored
+        """
+        redis_graph = self.get_current_redisgraph(graph_name)
+        count = 0
+
+        def node(alias):
+            return Node(alias=alias, properties=self.encode_properties(
+                {'name': names.get(alias, alias.split(':')[0])}))
+
+        def iter_queries(batch):
+            known = []
+
+            for (source, target, properties) in batch:
+                edge = (node(source), node(target),
+                        self.encode_properties(properties) if properties else None)
+
+                # relations between stored nodes are created many at a time, a node that is
+                # not known may be missing and would take other relations of a query with it
+                if source in names and target in names:
+                    known.append(edge)
+                else:
+                    yield self.edge_query(source=edge[0], relation=relation, target=edge[1],
+                                          properties=edge[2])
+
+            for queried in chunks(known, EDGES_PER_QUERY):
+                yield self.edges_query(relation, queried)
+
+        def iter_batches():
+            nonlocal count
+            indexed = set()
+
+            yield ['MATCH ()-[r:{}]->() DELETE r'.format(relation)]
+
+            for batch in chunks(edges, batch_size):
+                count += len(batch)
+
+                yield self.index_queries(
+                    chain.from_iterable((source, target) for (source, target, _) in batch),
+                    indexed
+                ) + list(iter_queries(batch))
+
+        statistics = self._execute(redis_graph, iter_batches())
+        count = self._check_relations(count, statistics)
+
+        self._bump_version(graph_name)
+
+        self.logger.info('Stored %d %s relations', count, relation)
+        return count
+
+    def _execute(self, redis_graph, batches, dump_file=None, dump_name=None, progress=None,
+                 save=True):
+        # pylint: disable=too-many-arguments,too-many-locals
+        """
+        Send batches of queries over a pipeline and save the database
+
+        :type redis_graph Graph
+        :type batches collections.Iterable[list[str]]
+        :type dump_file file|None
+        :type dump_name str|None graph name used in the dump (if different than the stored one)
+        :type progress callable|None called with the number of batches and queries sent so far
+        :type save bool
+        :rtype: collections.Counter queries statistics summed up, e.g. "Relationships created"
+        """
+        graph_name = redis_graph.name
+        batches_count = 0
+        queries_count = 0
+        statistics = Counter()
+
+        for queries in batches:
+            pipeline = redis_graph.redis_con.pipeline(transaction=False)
+
+            for query in queries:
+                pipeline.execute_command('GRAPH.QUERY', graph_name, query)
+
+            started = time.time()
+            responses = pipeline.execute()
+            took = time.time() - started
+
+            for response in responses:
+                statistics.update(get_statistics(response))
+
+            batches_count += 1
+            queries_count += len(queries)
+
+            self.logger.debug('Batch #%d: %d queries took %.3f s (%d queries so far)',
+                              batches_count, len(queries), took, queries_count)
+
+            if took > SLOW_BATCH_TIME:
+                self.logger.warning('Batch #%d took %.3f s, consider using smaller batches',
+                                    batches_count, took)
+
+            if progress:
+                progress(batches_count, queries_count)
+
+            if dump_file:
+                dump_file.writelines(
+                    [self.dump_query(dump_name or graph_name, query) for query in queries])
+
+        self.logger.info('Committed %d queries', queries_count)
+
+        if save:
+            redis_graph.redis_con.execute_command('SAVE')
+            self.logger.info('Committed and saved')
+
+        return statistics
+
+    def _check_relations(self, expected, statistics):
+        """
+        Report relations that were not created, an edge query does nothing when
+        it does not match both nodes (e.g. a node was stored with a different name)
+
+        :type expected int the number of relations queried
+        :type statistics collections.Counter as returned by _execute()
+        :rtype: int the number of relations created
+        """
+        created = statistics['Relationships created']
 
-        redis_graph.commit()
+        if created < expected:
+            self.logger.error('%d of %d relations were not created, their nodes were not found',
+                              expected - created, expected)
 
-        redis_graph.redis_con.execute_command('SAvE')
-        self.logger.info('Committed and saved')
+        return created
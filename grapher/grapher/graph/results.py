@@ -0,0 +1,231 @@
+"""
+Typed rows of RedisGraph query results
+"""
+import re
+from collections import namedtuple
+
+# RedisGraph 1.0 returns all values as strings, numbers are formatted with "%f"
+NUMBER_RE = re.compile(rb'-?[0-9]+\.[0-9]{6}')
+NULL = b'NULL'
+
+
+def decode_value(value):
+    """
+    :type value bytes|int|float|None
+    :rtype: str|int|float|None
+    """
+    if not isinstance(value, bytes):
+        return value
+
+    if value == NULL:
+        return None
+
+    if NUMBER_RE.fullmatch(value):
+        number = float(value)
+        return int(number) if number.is_integer() else number
+
+    return value.decode('utf-8')
+
+
+def get_statistics(response):
+    """
+    Return query statistics, they are the last entry of the GRAPH.QUERY response
+
+    :type response list|bytes e.g. [[b'Nodes created: 2', b'Relationships created: 1']],
+        index queries get a status reply instead (b'Index created')
+    :rtype: dict e.g. {'Nodes created': 2, 'Relationships created': 1}
+    """
+    statistics = dict()
+
+    if not isinstance(response, list) or not response:
+        return statistics
+
+    for entry in response[-1]:
+        (name, _, value) = entry.decode('utf-8').partition(': ')
+        value = value.split(' ')[0]  # "Query internal execution time: 0.1 milliseconds"
+
+        try:
+            number = float(value)
+        except ValueError:
+            continue
+
+        statistics[name] = int(number) if number.is_integer() else number
+
+    return statistics
+
+
+def get_field_name(column):
+    """
+    :type column str e.g. "p.name" or "count(n)"
+    :rtype: str e.g. "p_name" or "count_n"
+    """
+    return re.sub(r'\W+', '_', column).strip('_') or 'column'
+
+
+def make_row_class(columns):
+    """
+    Return a namedtuple class for rows with given columns, fields are named after columns
+    ("p.name" becomes "p_name"), values can also be accessed by column names (row['p.name'])
+
+    :type columns tuple[str]
+    :rtype: type
+    """
+    fields = [get_field_name(column) for column in columns]
+
+    class Row(namedtuple('Row', fields, rename=True)):
+        """
+        A single row of query results
+        """
+        __slots__ = ()
+
+        # column name -> its index, built when a value is accessed by column name for
+        # the first time
+        header = None
+
+        def __getitem__(self, key):
+            if isinstance(key, str):
+                header = Row.header
+
+                if header is None:
+                    header = {column: index for (index, column) in enumerate(columns)}
+                    Row.header = header
+
+                key = header[key]
+
+            return tuple.__getitem__(self, key)
+
+        def get(self, column, default=None):
+            """
+            :type column str
+            :type default object
+            :rtype: object
+            """
+            try:
+                return self[column]
+            except KeyError:
+                return default
+
+        def as_dict(self):
+            """
+            :rtype: dict column -> value
+            """
+            return dict(zip(columns, self))
+
+    return Row
+
+
+class ResultSet(object):
+    """
+    Rows of query results, values are decoded while the rows are iterated over.
+
+    Equal values are decoded only once, e.g. the name of a club that is repeated in many rows.
+    """
+    def __init__(self, columns, rows, decoded=False):
+        """
+        :type columns list[str]
+        :type rows list[list]
+        :type decoded bool values are already decoded
+        """
+        self.columns = tuple(columns)
+        self.rows = rows
+        self.decoded = decoded
+
+        self._row_class = None
+
+    @classmethod
+    def from_response(cls, result_set):
+        """
+        :type result_set list[list[bytes]] the first row is the header
+        :rtype: ResultSet
+        """
+        if not result_set:
+            return cls([], [])
+
+        return cls([column.decode('utf-8') for column in result_set[0]], result_set[1:])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        row_class = self.get_row_class()
+
+        for row in self.iter_tuples():
+            yield row_class._make(row)
+
+    def __repr__(self):
+        return '<ResultSet {} ({} rows)>'.format(', '.join(self.columns), len(self))
+
+    def get_row_class(self):
+        """
+        :rtype: type
+        """
+        if self._row_class is None:
+            self._row_class = make_row_class(self.columns)
+
+        return self._row_class
+
+    def iter_tuples(self):
+        """
+        Yield rows as plain tuples of values
+
+        :rtype: list[tuple]
+        """
+        if self.decoded:
+            for row in self.rows:
+                yield tuple(row)
+            return
+
+        values = dict()
+
+        for row in self.rows:
+            for value in row:
+                if value not in values:
+                    values[value] = decode_value(value)
+
+            yield tuple(map(values.__getitem__, row))
+
+    def split(self, keys, column=0):
+        """
+        Split rows of a batch query by their key (the value of a given column),
+        the column is removed from rows
+
+        :type keys list keys that were asked for, each one gets a result
+        :type column int
+        :rtype: dict ResultSet for each key, in the order of keys
+        """
+        columns = self.columns[:column] + self.columns[column + 1:]
+        results = {key: [] for key in keys}
+
+        # values returned by the server are decoded as numbers when they look like ones
+        keys_by_text = {str(key): key for key in keys}
+
+        for row in self.iter_tuples():
+            key = row[column]
+            results.setdefault(keys_by_text.get(str(key), key), []).append(
+                row[:column] + row[column + 1:])
+
+        return {key: ResultSet(columns, rows, decoded=True) for (key, rows) in results.items()}
+
+    def iter_column(self, column):
+        """
+        Yield values of a single column
+
+        :type column str
+        :rtype: list
+        """
+        index = self.columns.index(column)
+
+        if self.decoded:
+            for row in self.rows:
+                yield row[index]
+            return
+
+        values = dict()
+
+        for row in self.rows:
+            value = row[index]
+
+            if value not in values:
+                values[value] = decode_value(value)
+
+            yield values[value]
@@ -0,0 +1,248 @@
+"""
+Index of time intervals of relations (e.g. years a player spent at a club)
+"""
+import json
+import logging
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from os import path, replace
+from tempfile import NamedTemporaryFile
+
+from ..models import SportsTeamModel
+
+# relations that are still valid have no end
+OPEN_END = float('inf')
+
+# a single interval, until is None for relations that are still valid
+Interval = namedtuple('Interval', ['since', 'until', 'value'])
+
+
+class IntervalTree(object):
+    """
+    Static centered interval tree, returns intervals containing a given point
+    or overlapping a given range in O(log n + k) time.
+
+    Intervals are closed (both ends are included), the end can be None (still valid).
+    """
+    def __init__(self, intervals):
+        """
+        :type intervals list[Interval]
+        """
+        self.size = len(intervals)
+
+        # intervals ending before they start are treated as a single point
+        self.root = self._build([
+            (interval.since,
+             max(interval.since, interval.until) if interval.until is not None else OPEN_END,
+             interval)
+            for interval in intervals
+        ])
+
+    def __len__(self):
+        return self.size
+
+    @classmethod
+    def _build(cls, intervals):
+        """
+        Each node keeps intervals containing its center, sorted by start and by end,
+        the rest is passed to the left (ending before the center) or to the right subtree
+
+        :type intervals list[tuple[int, int|float, Interval]]
+        :rtype: tuple|None center, starts, intervals by start, ends, intervals by end,
+            left and right subtrees
+        """
+        if not intervals:
+            return None
+
+        points = sorted(point for (start, end, _) in intervals for point in (start, end)
+                        if point != OPEN_END)
+        center = points[len(points) // 2]
+
+        left = [entry for entry in intervals if entry[1] < center]
+        right = [entry for entry in intervals if entry[0] > center]
+        here = [entry for entry in intervals if entry[0] <= center <= entry[1]]
+
+        by_start = sorted(here, key=lambda entry: entry[0])
+        by_end = sorted(here, key=lambda entry: entry[1])
+
+        return (
+            center,
+            [entry[0] for entry in by_start], [entry[2] for entry in by_start],
+            [entry[1] for entry in by_end], [entry[2] for entry in by_end],
+            cls._build(left), cls._build(right),
+        )
+
+    def at(self, point):
+        """
+        :type point int
+        :rtype: list[Interval] intervals containing the point
+        """
+        return self.overlapping(point, point)
+
+    def overlapping(self, start, end):
+        """
+        :type start int
+        :type end int
+        :rtype: list[Interval] intervals that have at least one point in [start, end] range
+        """
+        found = []
+        nodes = [self.root]
+
+        while nodes:
+            node = nodes.pop()
+
+            if node is None:
+                continue
+
+            (center, starts, by_start, ends, by_end, left, right) = node
+
+            if end < center:
+                # intervals of this node end at the center or later, check where they start
+                found.extend(by_start[:bisect_right(starts, end)])
+                nodes.append(left)
+            elif start > center:
+                # intervals of this node start at the center or earlier
+                found.extend(by_end[bisect_left(ends, start):])
+                nodes.append(right)
+            else:
+                found.extend(by_start)
+                nodes.append(left)
+                nodes.append(right)
+
+        return found
+
+
+class TemporalIndex(object):
+    """
+    Keeps players careers (years they played for clubs) in an interval tree for each club
+
+    Built from the graph snapshot (kept in the index state) once the graph is stored
+    and saved to a JSON file, query helpers load it from there.
+    """
+    def __init__(self, teams, players):
+        """
+        :type teams dict[str, list[list]] club alias -> [since, until, player alias] entries
+        :type players dict[str, list] player alias -> [name, position in the current squad]
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.teams = teams
+        self.players = players
+
+        # trees are built when a club is asked for
+        self.trees = dict()
+
+    @classmethod
+    def from_snapshot(cls, state, relation='athlete'):
+        """
+        :type state grapher.state.IndexState
+        :type relation str
+        :rtype: TemporalIndex
+        """
+        teams = dict()
+        positions = dict()
+        players = set()
+
+        for (source, target, properties) in state.get_snapshot_edges(relation):
+            properties = json.loads(properties)
+
+            if target.endswith(':SportsTeam') and properties.get('since') is not None:
+                # a player's career
+                players.add(source)
+                teams.setdefault(target, []).append(
+                    [properties['since'], properties.get('until'), source])
+            elif 'position' in properties:
+                # club's current squad
+                positions[target] = properties['position']
+
+        names = state.get_snapshot_names(players)
+
+        return cls(teams, {
+            alias: [names.get(alias), positions.get(alias)] for alias in players
+        })
+
+    @classmethod
+    def load(cls, filename):
+        """
+        :type filename str
+        :rtype: TemporalIndex
+        """
+        with open(filename, 'rt') as file:
+            data = json.load(file)
+
+        return cls(data['teams'], data['players'])
+
+    def save(self, filename):
+        """
+        :type filename str
+        """
+        # the file is atomically replaced, queries never read a partially written one
+        with NamedTemporaryFile('wt', dir=path.dirname(path.abspath(filename)), suffix='.tmp',
+                                delete=False) as file:
+            json.dump({'teams': self.teams, 'players': self.players}, file)
+
+        replace(file.name, filename)
+
+        self.logger.info('Saved careers in %d clubs of %d players to %s',
+                         len(self.teams), len(self.players), filename)
+
+    @staticmethod
+    def get_team_alias(club):
+        """
+        Clubs names are not registered, they come from users queries
+
+        :type club str
+        :rtype: str e.g. "Liverpool_F_C:SportsTeam"
+        """
+        return SportsTeamModel.registry.encode_alias(SportsTeamModel.model_type, club)
+
+    def get_tree(self, club):
+        """
+        :type club str
+        :rtype: IntervalTree
+        """
+        alias = self.get_team_alias(club)
+
+        if alias not in self.trees:
+            self.trees[alias] = IntervalTree([
+                Interval(since, until, player)
+                for (since, until, player) in self.teams.get(alias, [])
+            ])
+
+        return self.trees[alias]
+
+    def get_players(self, intervals):
+        """
+        :type intervals list[Interval]
+        :rtype: list[tuple[str, str|None, int, int|None]] name, position, since and until,
+            sorted by the name and the start of the interval
+        """
+        return sorted(
+            [
+                (self.players[interval.value][0], self.players[interval.value][1],
+                 interval.since, interval.until)
+                for interval in intervals
+            ],
+            key=lambda player: (player[0] or '', player[2])
+        )
+
+    def get_players_at(self, club, year):
+        """
+        Who was at a given club in a given year
+
+        :type club str
+        :type year int
+        :rtype: list[tuple[str, str|None, int, int|None]]
+        """
+        return self.get_players(self.get_tree(club).at(year))
+
+    def get_players_between(self, club, since, until):
+        """
+        Who was at a given club at some point between given years
+
+        :type club str
+        :type since int
+        :type until int
+        :rtype: list[tuple[str, str|None, int, int|None]]
+        """
+        return self.get_players(self.get_tree(club).overlapping(since, until))
@@ -0,0 +1,409 @@
+"""
+Query results computed when the graph is stored (materialized views)
+"""
+import json
+import logging
+from collections import Counter
+from datetime import datetime
+
+from .temporal import Interval, IntervalTree, TemporalIndex
+from ..models import BaseModel
+from ..utils import chunks
+
+# keeps the generation of views that should be read
+VIEWS_KEY = 'graph:{}:views'
+
+# incremented each time views are stored
+VIEWS_GENERATION_KEY = 'graph:{}:views:generation'
+
+# e.g. graph:football:views:12:squad:Liverpool_F_C:SportsTeam
+VIEW_KEY = 'graph:{graph}:views:{generation}:{view}'
+
+# how many commands are sent over a single pipeline when storing views
+VIEWS_BATCH_SIZE = 500
+
+
+def get_name(alias, names):
+    """
+    Nodes that were not indexed (e.g. a club with no article) are named as they were referred to,
+    or after their alias, the same way their placeholders are stored in the graph
+
+    :type alias str
+    :type names dict[str, str]
+    :rtype: str
+    """
+    return names.get(alias) or BaseModel.registry.get_name(alias) or alias.split(':')[0]
+
+
+def build_views(state, careers, current_year=None):
+    """
+    Compute views from the graph snapshot (kept in the index state) and the careers index
+
+    :type state grapher.state.IndexState
+    :type careers grapher.graph.temporal.TemporalIndex
+    :type current_year int|None defaults to the current year, ends careers that still go on
+    :rtype: dict[str, dict] view -> its entries, clubs are keyed by their aliases
+    """
+    squad_edges = [
+        (source, target, json.loads(properties))
+        for (source, target, properties) in state.get_snapshot_edges('athlete')
+        if source.endswith(':SportsTeam')
+    ]
+
+    # clubs and players of current squads
+    nodes = state.get_snapshot_properties(set(careers.teams.keys()) | {
+        alias for (source, target, _) in squad_edges for alias in (source, target)
+    })
+
+    names = {alias: properties.get('name') for (alias, properties) in nodes.items()}
+    names.update({alias: player[0] for (alias, player) in careers.players.items() if player[0]})
+
+    squads = dict()
+
+    for (club, player, properties) in squad_edges:
+        squads.setdefault(club, []).append(
+            (get_name(player, names), properties.get('position'), properties.get('number')))
+
+    return {
+        'names': {
+            club: get_name(club, names) for club in set(squads) | set(careers.teams)
+        },
+        'squad': squads,
+        'seasons': build_seasons(careers, current_year or datetime.utcnow().year),
+        'transfers': build_transfers(careers, names),
+        'league': build_leagues(careers, names, nodes),
+    }
+
+
+def build_seasons(careers, current_year):
+    """
+    :type careers grapher.graph.temporal.TemporalIndex
+    :type current_year int
+    :rtype: dict[str, dict[int, list[tuple]]] club alias -> year -> players (name, position,
+        since and until)
+    """
+    seasons = dict()
+
+    for (club, entries) in careers.teams.items():
+        first = min(since for (since, _, _) in entries)
+        last = max(until if until is not None else current_year for (_, until, _) in entries)
+
+        tree = IntervalTree([
+            Interval(since, until, player) for (since, until, player) in entries
+        ])
+
+        # keep only the years with players
+        seasons[club] = {
+            year: players for (year, players) in (
+                (year, careers.get_players(tree.at(year)))
+                for year in range(first, max(first, last) + 1)
+            )
+            if players
+        }
+
+    return seasons
+
+
+def build_leagues(careers, names, clubs):
+    """
+    Players in current squads (the ones with a position) that played for clubs of a league
+
+    :type careers grapher.graph.temporal.TemporalIndex
+    :type names dict[str, str]
+    :type clubs dict[str, dict] club alias -> its properties
+    :rtype: dict[str, dict[str, list[tuple]]] league -> position -> club, player, since and until
+    """
+    leagues = dict()
+
+    for (alias, entries) in careers.teams.items():
+        league = clubs.get(alias, {}).get('memberOf')
+
+        if not league:
+            continue
+
+        for (since, until, player) in entries:
+            (name, position) = careers.players[player]
+
+            if position is not None:
+                leagues.setdefault(league, dict()).setdefault(position, []).append(
+                    (get_name(alias, names), name or get_name(player, names), since, until))
+
+    return {
+        league: {position: sorted(players, key=lambda player: (player[0], player[1], player[2]))
+                 for (position, players) in positions.items()}
+        for (league, positions) in leagues.items()
+    }
+
+
+def build_transfers(careers, names):
+    """
+    Count players that moved from one club straight to another
+
+    :type careers grapher.graph.temporal.TemporalIndex
+    :type names dict[str, str]
+    :rtype: Counter (from club alias, to club name) -> players count
+    """
+    players = dict()
+
+    for (club, entries) in careers.teams.items():
+        for (since, until, player) in entries:
+            players.setdefault(player, []).append((since, until if until is not None else since,
+                                                   club))
+
+    transfers = Counter()
+
+    for clubs in players.values():
+        clubs = [club for (_, _, club) in sorted(clubs)]
+
+        for (source, target) in zip(clubs, clubs[1:]):
+            if source != target:
+                transfers[(source, get_name(target, names))] += 1
+
+    return transfers
+
+
+class RedisViews(object):
+    """
+    Stores views in Redis and reads them.
+
+    Views are kept in hashes and sorted sets that belong to a generation. Readers use
+    the generation that was fully written most recently, older generations are removed.
+    """
+    def __init__(self, connection, graph_name):
+        """
+        :type connection redis.Redis
+        :type graph_name str
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.connection = connection
+        self.graph_name = graph_name
+
+    def get_key(self, generation, view, name=None):
+        """
+        :type generation int|str
+        :type view str
+        :type name str|int|None
+        :rtype: str
+        """
+        key = VIEW_KEY.format(graph=self.graph_name, generation=generation, view=view)
+        return key if name is None else '{}:{}'.format(key, name)
+
+    def get_club_key(self, generation, view, club):
+        """
+        :type generation int|str
+        :type view str
+        :type club str club name
+        :rtype: str
+        """
+        return self.get_key(generation, view, TemporalIndex.get_team_alias(club))
+
+    def get_generation(self):
+        """
+        :rtype: str|None None when views were not stored yet
+        """
+        generation = self.connection.get(VIEWS_KEY.format(self.graph_name))
+        return generation.decode('utf-8') if generation else None
+
+    @staticmethod
+    def iter_commands(views, get_key):
+        """
+        Clubs are keyed by their aliases, the way careers index is
+
+        :type views dict[str, dict]
+        :type get_key callable
+        :rtype: list[tuple] Redis commands
+        """
+        for (club, players) in views['squad'].items():
+            # players sorted by their numbers
+            yield ('ZADD', get_key('squad', club)) + tuple(
+                value
+                for (name, position, number) in players
+                for value in (number or 0, json.dumps([name, position, number]))
+            )
+
+        for (club, years) in views['seasons'].items():
+            yield ('HSET', get_key('seasons', club)) + tuple(
+                value for (year, players) in years.items()
+                for value in (year, json.dumps(players))
+            )
+
+        for ((source, target), count) in views['transfers'].items():
+            yield ('ZADD', get_key('transfers', source), count, target)
+            yield ('ZADD', get_key('transfers'), count,
+                   json.dumps([views['names'].get(source), target]))
+
+        for (league, positions) in views['league'].items():
+            yield ('HSET', get_key('league', league)) + tuple(
+                value for (position, players) in positions.items()
+                for value in (position, json.dumps(players))
+            )
+
+    def store(self, views):
+        """
+        Write views as a new generation, make it the one being read and remove the previous one
+
+        :type views dict[str, dict]
+        :rtype: int the generation of stored views
+        """
+        generation = self.connection.incr(VIEWS_GENERATION_KEY.format(self.graph_name))
+        keys_key = self.get_key(generation, 'keys')
+        count = 0
+
+        for batch in chunks(self.iter_commands(
+                views, lambda view, name=None: self.get_key(generation, view, name)),
+                            VIEWS_BATCH_SIZE):
+            pipeline = self.connection.pipeline(transaction=False)
+
+            for command in batch:
+                pipeline.execute_command(*command)
+                pipeline.execute_command('SADD', keys_key, command[1])
+
+            pipeline.execute()
+            count += len(batch)
+
+        previous = self.get_generation()
+        self.connection.set(VIEWS_KEY.format(self.graph_name), generation)
+
+        self.logger.info('Stored views generation #%d (%d commands)', generation, count)
+
+        if previous is not None:
+            self._delete(previous)
+
+        return generation
+
+    def _delete(self, generation):
+        """
+        :type generation int|str
+        """
+        keys_key = self.get_key(generation, 'keys')
+        keys = [key.decode('utf-8') for key in self.connection.smembers(keys_key)]
+
+        for batch in chunks(keys + [keys_key], VIEWS_BATCH_SIZE):
+            self.connection.delete(*batch)
+
+        self.logger.info('Removed views generation #%s (%d keys)', generation, len(keys))
+
+    def get_squad(self, club):
+        """
+        :type club str
+        :rtype: list[tuple[str, str, int|None]]|None name, position and number
+            sorted by numbers, None when views were not stored yet
+        """
+        generation = self.get_generation()
+
+        if generation is None:
+            return None
+
+        return [
+            tuple(json.loads(member)) for member in self.connection.zrange(
+                self.get_club_key(generation, 'squad', club), 0, -1)
+        ]
+
+    def get_squads(self, clubs):
+        """
+        Get squads of many clubs in a single round trip
+
+        :type clubs list[str]
+        :rtype: dict[str, list[tuple[str, str, int|None]]]|None club -> its squad (see
+            get_squad), None when views were not stored yet
+        """
+        generation = self.get_generation()
+
+        if generation is None:
+            return None
+
+        pipeline = self.connection.pipeline(transaction=False)
+
+        for club in clubs:
+            pipeline.zrange(self.get_club_key(generation, 'squad', club), 0, -1)
+
+        return {
+            club: [tuple(json.loads(member)) for member in members]
+            for (club, members) in zip(clubs, pipeline.execute())
+        }
+
+    def get_season(self, club, year):
+        """
+        :type club str
+        :type year int
+        :rtype: list[tuple[str, str|None, int, int|None]]|None name, position, since and until
+        """
+        generation = self.get_generation()
+
+        if generation is None:
+            return None
+
+        players = self.connection.hget(self.get_club_key(generation, 'seasons', club), year)
+        return [tuple(player) for player in json.loads(players)] if players else []
+
+    def get_seasons(self, clubs, year):
+        """
+        Get players of many clubs in a given year in a single round trip
+
+        :type clubs list[str]
+        :type year int
+        :rtype: dict[str, list[tuple[str, str|None, int, int|None]]]|None club -> its players
+            (see get_season), None when views were not stored yet
+        """
+        generation = self.get_generation()
+
+        if generation is None:
+            return None
+
+        pipeline = self.connection.pipeline(transaction=False)
+
+        for club in clubs:
+            pipeline.hget(self.get_club_key(generation, 'seasons', club), year)
+
+        return {
+            club: [tuple(player) for player in json.loads(players)] if players else []
+            for (club, players) in zip(clubs, pipeline.execute())
+        }
+
+    def get_transfers(self, club, limit=10):
+        """
+        :type club str
+        :type limit int
+        :rtype: list[tuple[str, int]]|None clubs that players moved to and how many of them
+        """
+        generation = self.get_generation()
+
+        if generation is None:
+            return None
+
+        return [
+            (target.decode('utf-8'), int(count))
+            for (target, count) in self.connection.zrevrange(
+                self.get_club_key(generation, 'transfers', club), 0, limit - 1, withscores=True)
+        ]
+
+    def get_top_transfers(self, limit=10):
+        """
+        :type limit int
+        :rtype: list[tuple[str, str, int]]|None the most common moves between clubs
+        """
+        generation = self.get_generation()
+
+        if generation is None:
+            return None
+
+        return [
+            tuple(json.loads(pair)) + (int(count),)
+            for (pair, count) in self.connection.zrevrange(
+                self.get_key(generation, 'transfers'), 0, limit - 1, withscores=True)
+        ]
+
+    def get_league_players(self, league, position):
+        """
+        :type league str
+        :type position str
+        :rtype: list[tuple[str, str, int, int|None]]|None club, player, since and until
+        """
+        generation = self.get_generation()
+
+        if generation is None:
+            return None
+
+        players = self.connection.hget(self.get_key(generation, 'league', league), position)
+        return [tuple(player) for player in json.loads(players)] if players else []
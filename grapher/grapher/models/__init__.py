@@ -3,3 +3,5 @@ Schema.org representations
 """
 from .base import BaseModel
 from .football import PersonModel, SportsTeamModel
+from .registry import NodeRegistry
+from .store import ModelStore
@@ -5,11 +5,23 @@ import json
 import re
 from collections import OrderedDict
 
+from .registry import NodeRegistry
+
 
 class BaseModel(object):
     """
     Base schema.org model for keeping metadata
+
+    Nodes are identified by integer IDs given by the registry shared by all models,
+    relations keep IDs of their targets.
     """
+    __slots__ = ('type', 'name', 'properties', 'relations', 'node_id')
+
+    # https://schema.org/ type, set by subclasses
+    model_type = None
+
+    registry = None  # type: NodeRegistry
+
     def __init__(self, model_type, name):
         assert name is not None, 'name of a model cannot be None'
 
@@ -18,6 +30,8 @@ class BaseModel(object):
         self.properties = OrderedDict(name=name)
         self.relations = list()
 
+        self.node_id = self.registry.get_id(model_type, name)
+
     def get_type(self):
         """
         :rtype: str
@@ -47,19 +61,29 @@ class BaseModel(object):
         name = re.sub(r'^\d+', '', name)  # remove digits from the beginning of the string
         return re.sub(r'[^a-z0-9]+', '_', name, flags=re.IGNORECASE).strip('_')
 
+    @classmethod
+    def get_node_id_by_name(cls, name):
+        """
+        Return ID of a node of this model type with a given name (without creating a model)
+
+        :type name str
+        :rtype: int
+        """
+        return cls.registry.get_id(cls.model_type, name)
+
+    def get_node_id(self):
+        """
+        :rtype: int
+        """
+        return self.node_id
+
     def get_node_name(self):
         """
         Return node name for using in Cypher queries, e.g. "Foo:Type"
 
-        :rtype: str|None
+        :rtype: str
         """
-        if self.get_name() is None:
-            return None
-
-        return '{}:{}'.format(
-            self.encode_name(self.get_name()),
-            self.encode_name(self.get_type())
-        )
+        return self.registry.get_alias(self.node_id)
 
     def add_property(self, key, value):
         """
@@ -79,9 +103,12 @@ class BaseModel(object):
     def add_relation(self, relation, target, properties=None):
         """
         :type relation str
-        :type target str
+        :type target int|str node ID or node name, e.g. "Foo:Type"
         :type properties dict
         """
+        if not isinstance(target, int):
+            target = self.registry.get_alias_id(target)
+
         # remove None values from properties
         if properties:
             properties = {k: v for k, v in properties.items() if v is not None}
@@ -95,16 +122,67 @@ class BaseModel(object):
         """
         found = [
             (target, properties) if properties is not None else target
-            for (relation, target, properties) in self.relations if relation_type == relation
+            for (relation, target, properties) in self.get_all_relations()
+            if relation_type == relation
         ]
 
         return found if found else None
 
     def get_all_relations(self):
         """
-        :rtype: list[tuple]
+        :rtype: list[tuple] relation, target node name and properties
         """
-        return self.relations
+        return [
+            (relation, self.registry.get_alias(target), properties)
+            for (relation, target, properties) in self.relations
+        ]
+
+    def to_record(self):
+        """
+        Return a compact, picklable representation of the model
+
+        Node IDs are valid in the current process only, so relation targets
+        are identified by their type and name (or by node name if that is all we know).
+
+        :rtype: tuple
+        """
+        return (
+            self.__class__,
+            self.type,
+            self.name,
+            tuple(self.properties.items()),
+            tuple(
+                (relation, self.registry.get_key(target) or self.registry.get_alias(target),
+                 properties)
+                for (relation, target, properties) in self.relations
+            ),
+        )
+
+    @staticmethod
+    def from_record(record):
+        """
+        Create a model from its record
+
+        :type record tuple
+        :rtype: BaseModel
+        """
+        (model_class, model_type, name, properties, relations) = record
+
+        model = model_class.__new__(model_class)
+        BaseModel.__init__(model, model_type=model_type, name=name)
+
+        model.properties = OrderedDict(properties)
+        model.relations = [
+            (
+                relation,
+                model.registry.get_id(*target) if isinstance(target, tuple)
+                else model.registry.get_alias_id(target),
+                target_properties
+            )
+            for (relation, target, target_properties) in relations
+        ]
+
+        return model
 
     def __repr__(self):
         ret = '<{} https://schema.org/{} ({}) '.\
@@ -121,8 +199,11 @@ class BaseModel(object):
 
         # dump relations
         # -[rel:IS_FRIENDS_WITH {since: 2018}]->
-        for (relation, target, properties) in self.relations:
+        for (relation, target, properties) in self.get_all_relations():
             ret += '\n\t--[:{} {}]->({})'.format(
                 relation, json.dumps(properties or '').strip('" '), target)
 
         return ret
+
+
+BaseModel.registry = NodeRegistry(BaseModel.encode_name)
@@ -8,15 +8,23 @@ class PersonModel(BaseModel):
     """
     Person model
     """
+    __slots__ = ()
+
+    # https://schema.org/Person
+    model_type = 'Person'
+
     def __init__(self, name):
-        # https://schema.org/Person
-        super(PersonModel, self).__init__(model_type='Person', name=name)
+        super(PersonModel, self).__init__(model_type=self.model_type, name=name)
 
 
 class SportsTeamModel(BaseModel):
     """
     F.C. Model
     """
+    __slots__ = ()
+
+    # https://schema.org/SportsTeam
+    model_type = 'SportsTeam'
+
     def __init__(self, name):
-        # https://schema.org/SportsTeam
-        super(SportsTeamModel, self).__init__(model_type='SportsTeam', name=name)
+        super(SportsTeamModel, self).__init__(model_type=self.model_type, name=name)
@@ -0,0 +1,112 @@
+"""
+Registry of graph nodes
+"""
+import logging
+
+
+class NodeRegistry(object):
+    """
+    Interns nodes keys (model type and name) and gives them dense integer IDs.
+
+    Node aliases (e.g. "Foo:Person") are encoded once per key. Different names can be
+    encoded to the same alias (non-ASCII characters are dropped), such nodes share an ID
+    and are reported as collisions.
+    """
+    def __init__(self, encode_name):
+        """
+        :type encode_name callable encodes names and types to be used in Cypher queries
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.encode_name = encode_name
+
+        self.ids = dict()  # (type, name) -> node ID
+        self.alias_ids = dict()  # alias -> node ID
+        self.aliases = list()  # node ID -> alias
+        self.keys = list()  # node ID -> (type, name) it was registered with first
+        self.collisions = dict()  # alias -> names
+
+    def __len__(self):
+        return len(self.aliases)
+
+    def get_id(self, model_type, name):
+        """
+        :type model_type str
+        :type name str
+        :rtype: int
+        """
+        key = (model_type, name)
+        node_id = self.ids.get(key)
+
+        if node_id is not None:
+            return node_id
+
+        alias = self.encode_alias(model_type, name)
+        node_id = self.get_alias_id(alias)
+
+        first = self.keys[node_id]
+
+        if first is None:
+            # the node was referred to by its alias only
+            self.keys[node_id] = key
+        else:
+            self.logger.warning('%s and %s are both encoded as %s', first, key, alias)
+            self.collisions.setdefault(alias, {first[1]}).add(name)
+
+        self.ids[key] = node_id
+        return node_id
+
+    def encode_alias(self, model_type, name):
+        """
+        Return the alias of a node without registering it
+
+        :type model_type str
+        :type name str
+        :rtype: str e.g. "Foo:Person"
+        """
+        return '{}:{}'.format(self.encode_name(name), self.encode_name(model_type))
+
+    def get_alias_id(self, alias):
+        """
+        :type alias str e.g. "Foo:Person"
+        :rtype: int
+        """
+        node_id = self.alias_ids.get(alias)
+
+        if node_id is None:
+            node_id = len(self.aliases)
+
+            self.alias_ids[alias] = node_id
+            self.aliases.append(alias)
+            self.keys.append(None)
+
+        return node_id
+
+    def get_alias(self, node_id):
+        """
+        :type node_id int
+        :rtype: str
+        """
+        return self.aliases[node_id]
+
+    def get_key(self, node_id):
+        """
+        :type node_id int
+        :rtype: tuple[str, str]|None type and name or None if only the alias is known
+        """
+        return self.keys[node_id]
+
+    def get_name(self, alias):
+        """
+        :type alias str e.g. "Foo:Person"
+        :rtype: str|None the name the node was registered with, None if only the alias is known
+        """
+        node_id = self.alias_ids.get(alias)
+        key = self.keys[node_id] if node_id is not None else None
+
+        return key[1] if key else None
+
+    def get_collisions(self):
+        """
+        :rtype: dict[str, list[str]] alias -> names encoded as it
+        """
+        return {alias: sorted(names) for (alias, names) in self.collisions.items()}
@@ -0,0 +1,145 @@
+"""
+Compact storage of models
+"""
+from array import array
+from collections import OrderedDict
+
+
+class ModelStore(object):
+    """
+    Keeps models in columns instead of separate objects.
+
+    Nodes are kept as their registry IDs, model classes and property values. Property keys
+    are shared by nodes with the same set of properties. Relations are kept in arrays
+    (relation type, target node ID and properties), relations of the n-th node start at
+    the n-th offset. Edge properties are interned, they are usually the same for many edges.
+
+    Models are re-created when iterating over the store.
+    """
+    # pylint: disable=too-many-instance-attributes
+    def __init__(self):
+        # shared tables
+        self.classes = list()  # (model class, type)
+        self.class_ids = dict()
+        self.shapes = list()  # properties keys
+        self.shape_ids = dict()
+        self.relation_types = list()
+        self.relation_type_ids = dict()
+        self.edge_properties = [None]  # properties items, 0 - no properties
+        self.edge_properties_ids = {None: 0}
+
+        # nodes
+        self.node_ids = array('I')
+        self.node_classes = array('H')
+        self.node_shapes = array('I')
+        self.node_names = list()
+        self.node_values = list()
+        self.edges_offsets = array('I', [0])
+
+        # edges
+        self.edge_relations = array('H')
+        self.edge_targets = array('I')
+        self.edge_properties_refs = array('I')
+
+    @staticmethod
+    def _intern(table, ids, value):
+        """
+        :type table list
+        :type ids dict
+        :type value object
+        :rtype: int
+        """
+        value_id = ids.get(value)
+
+        if value_id is None:
+            value_id = len(table)
+            ids[value] = value_id
+            table.append(value)
+
+        return value_id
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def add(self, model):
+        """
+        :type model grapher.models.BaseModel
+        """
+        properties = model.properties
+
+        self.node_ids.append(model.get_node_id())
+        self.node_classes.append(
+            self._intern(self.classes, self.class_ids, (model.__class__, model.get_type())))
+        self.node_shapes.append(
+            self._intern(self.shapes, self.shape_ids, tuple(properties.keys())))
+        self.node_names.append(model.get_name())
+        self.node_values.append(tuple(properties.values()))
+
+        for (relation, target, edge_properties) in model.relations:
+            self.edge_relations.append(
+                self._intern(self.relation_types, self.relation_type_ids, relation))
+            self.edge_targets.append(target)
+            self.edge_properties_refs.append(self._intern(
+                self.edge_properties, self.edge_properties_ids,
+                tuple(edge_properties.items()) if edge_properties is not None else None))
+
+        self.edges_offsets.append(len(self.edge_targets))
+
+    def get_edges_count(self):
+        """
+        :rtype: int
+        """
+        return len(self.edge_targets)
+
+    def get(self, index):
+        """
+        Re-create the n-th model
+
+        :type index int
+        :rtype: grapher.models.BaseModel
+        """
+        (model_class, model_type) = self.classes[self.node_classes[index]]
+
+        model = model_class.__new__(model_class)
+        model.type = model_type
+        model.name = self.node_names[index]
+        model.node_id = self.node_ids[index]
+        model.properties = OrderedDict(
+            zip(self.shapes[self.node_shapes[index]], self.node_values[index]))
+        model.relations = [
+            (
+                self.relation_types[self.edge_relations[edge]],
+                self.edge_targets[edge],
+                self._get_edge_properties(edge)
+            )
+            for edge in range(self.edges_offsets[index], self.edges_offsets[index + 1])
+        ]
+
+        return model
+
+    def _get_edge_properties(self, edge):
+        """
+        :type edge int
+        :rtype: dict|None
+        """
+        items = self.edge_properties[self.edge_properties_refs[edge]]
+        return dict(items) if items is not None else None
+
+    def iter_edges(self):
+        """
+        Yield all edges without re-creating models
+
+        :rtype: list[tuple[int, str, int, dict|None]] source and target node IDs
+        """
+        for (index, source) in enumerate(self.node_ids):
+            for edge in range(self.edges_offsets[index], self.edges_offsets[index + 1]):
+                yield (
+                    source,
+                    self.relation_types[self.edge_relations[edge]],
+                    self.edge_targets[edge],
+                    self._get_edge_properties(edge)
+                )
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.get(index)
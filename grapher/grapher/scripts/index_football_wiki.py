@@ -1,19 +1,43 @@
 """
 This script takes data from football.wikia.com and loads into RedisGraph database
 """
+import json
 import logging
-from hashlib import md5
+import time
+from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
 from os import path
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from mwclient.client import Site
+from grapher.cache import CacheEntry, DirectoryCache, SqliteCache, migrate_directory_cache
 from grapher.sources.wiki import WikiArticleSource, FootballWikiSource
 from grapher.graph import RedisGraph
+from grapher.graph.delta import Delta, record_snapshot
+from grapher.graph.projection import TeammateProjection
+from grapher.graph.temporal import TemporalIndex
+from grapher.graph.views import build_views
+from grapher.models import BaseModel
+from grapher.state import Checkpoint, IndexState
+from grapher.utils import chunks
 
 # where graphs will be stored
 OUTPUT_DIRECTORY = path.join(path.dirname(__file__), '../../output/')
 
+# where API responses are cached
+CACHE_DIRECTORY = path.join(path.dirname(__file__), '.cache')
+CACHE_DATABASE = path.join(CACHE_DIRECTORY, 'cache.sqlite')
+
+# cached responses older than a week are revalidated with conditional requests
+CACHE_TTL = 7 * 86400
+
+# pages revisions and graph nodes recorded by the last run
+STATE_DATABASE = path.join(CACHE_DIRECTORY, 'state.sqlite')
+
 # http://football.sandbox-s6.wikia.com/api/v1/Templates/Metadata?title=Zlatan_Ibrahimovi%C4%87
 WIKI_DOMAIN = 'football.wikia.com'
 
@@ -28,36 +52,71 @@ CATEGORIES = [
     'Italian_Coaches',
 ]
 
+TEMPLATES_API_URL = 'http://football.sandbox-s6.wikia.com/api/v1/Templates/Metadata'
+
+# how many API requests can be made at the same time
+CONCURRENCY = 8
+
+# how many processes parse pages metadata
+WORKERS = 1
+
+# how many pages are sent to a worker process at once
+WORKER_BATCH_SIZE = 50
+
+# a failed API request is retried after 0.5s, 1s, 2s, ...
+RETRIES = 3
+RETRY_BACKOFF = 0.5
+REQUEST_TIMEOUT = 30
+
 
 class Wiki(object):
     """
     A simple wrapper for mwclient library
     """
-    def __init__(self, wiki):
+    # pylint: disable=too-many-instance-attributes
+
+    # how many titles are looked up in the cache at once
+    batch_size = 100
+
+    def __init__(self, wiki, cache=None, concurrency=CONCURRENCY, retries=RETRIES,
+                 backoff=RETRY_BACKOFF):
+        """
+        :type wiki str
+        :type cache grapher.cache.BaseCache
+        :type concurrency int
+        :type retries int
+        :type backoff float
+        """
         self.logger = logging.getLogger(self.__class__.__name__)
-        self.logger.info('Using %s wiki', wiki)
+        self.logger.info('Using %s wiki (concurrency: %d)', wiki, concurrency)
 
+        self.wiki = wiki
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.backoff = backoff
+
+        # requests.Session is shared by all workers, make its connections pool
+        # large enough to keep a connection per worker alive
         self.pool = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max(self.concurrency, 10))
+        self.pool.mount('http://', adapter)
+        self.pool.mount('https://', adapter)
         # self.pool.proxies = {'http': 'border-http-s3:80'}
-        self.site = Site(host=('http', wiki), path='/', pool=self.pool)
+        self._site = None
 
-        self.cache_dir = path.join(path.dirname(__file__), '.cache')
-        self.logger.info("Using cache directory: %s", self.cache_dir)
+        self.cache = cache if cache is not None else SqliteCache(CACHE_DATABASE)
 
-    def _get_cache_filename(self, entry_type, name):
+    @property
+    def site(self):
         """
-        Return a hashed filename of cache entry for a given URL
-        :type entry_type str
-        :type name str
-        :rtype: str
+        mwclient connects to the wiki when created, do it only when we need it
+
+        :rtype: Site
         """
-        _hash = md5()
-        _hash.update(name.encode('utf-8'))
+        if self._site is None:
+            self._site = Site(host=('http', self.wiki), path='/', pool=self.pool)
 
-        return path.join(
-            self.cache_dir,
-            '{}_{}.json'.format(entry_type, _hash.hexdigest())
-        )
+        return self._site
 
     def pages_in_category(self, category_name):
         """
@@ -76,80 +135,507 @@ class Wiki(object):
 
         self.logger.info('Returned %d pages', count)
 
+    def pages_in_categories(self, categories):
+        """
+        Yield unique pages from given categories
+        (we may have the same page in players and manager category)
+
+        :type categories list[str]
+        :rtype: list[str]
+        """
+        seen = set()
+
+        for category in categories:
+            for page in self.pages_in_category(category):
+                if page not in seen:
+                    seen.add(page)
+                    yield page
+
+    def get_pages_revisions(self, titles):
+        """
+        Yield the latest revision ID and its timestamp for given pages
+
+        :type titles collections.Iterable[str]
+        :rtype: list[tuple[str, int, str]]
+        """
+        # MediaWiki API accepts up to 50 titles at once
+        for batch in chunks(titles, 50):
+            res = self.site.api('query', prop='info', titles='|'.join(batch))
+
+            for page in res['query']['pages'].values():
+                if 'lastrevid' in page:
+                    yield (page['title'], page['lastrevid'], page['touched'])
+
+    def record_revisions(self, titles, state):
+        """
+        Yield given pages while recording their latest revisions in the state
+
+        :type titles collections.Iterable[str]
+        :type state IndexState
+        :rtype: list[str]
+        """
+        for batch in chunks(titles, 50):
+            state.set_revisions(self.get_pages_revisions(batch))
+            yield from batch
+
+    def get_changed_pages(self, since, categories, known_titles):
+        """
+        Return pages that were edited or created since a given time.
+
+        Only pages that were indexed before or are in given categories are returned.
+
+        :type since str ISO 8601 timestamp
+        :type categories list[str]
+        :type known_titles set[str]
+        :rtype: list[tuple[str, int, str]] title, revision ID, timestamp
+        """
+        self.logger.info('Getting pages changed since %s', since)
+
+        changes = dict()
+
+        # the newest changes come first
+        for change in self.site.recentchanges(end=since, namespace=0,
+                                              prop='title|ids|timestamp', type='edit|new'):
+            if change['title'] not in changes:
+                changes[change['title']] = (change['title'], change['revid'], change['timestamp'])
+
+        new_titles = [title for title in changes if title not in known_titles]
+        categorized = set()
+
+        for batch in chunks(new_titles, 50):
+            res = self.site.api(
+                'query', prop='categories', titles='|'.join(batch),
+                clcategories='|'.join(['Category:' + category for category in categories]))
+
+            for page in res['query']['pages'].values():
+                if page.get('categories'):
+                    categorized.add(page['title'])
+
+        changed = [
+            change for (title, change) in sorted(changes.items())
+            if title in known_titles or title in categorized
+        ]
+
+        self.logger.info('%d pages were changed (%d new)', len(changed), len(categorized))
+        return changed
+
+    def _fetch_templates(self, title, entry=None):
+        """
+        Make an API request, retry it with an exponential backoff on network errors
+        and server-side failures.
+
+        When a cached entry is given, make a conditional request and return
+        the entry if it was not modified.
+
+        :type title str
+        :type entry CacheEntry|None
+        :rtype: tuple[CacheEntry, bool] an entry and whether it was modified
+        """
+        # https://nfs.sandbox-s6.fandom.com/wikia.php?controller=TemplatesApiController&method=getMetadata&title=Ferrari_355_F1
+        # http://football.sandbox-s6.wikia.com/api/v1/Templates/Metadata?title=Zlatan_Ibrahimovi%C4%87
+        self.logger.info('Getting metadata for "%s"', title)
+
+        headers = dict()
+
+        if entry is not None and entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+
+        attempt = 0
+
+        while True:
+            try:
+                res = self.pool.get(TEMPLATES_API_URL, params={'title': title},
+                                    headers=headers, timeout=REQUEST_TIMEOUT)
+            except (requests.ConnectionError, requests.Timeout) as ex:
+                if attempt == self.retries:
+                    raise
+                reason = str(ex)
+            else:
+                # retry only on server-side errors and throttling
+                if (res.status_code < 500 and res.status_code != 429) or attempt == self.retries:
+                    break
+                reason = 'HTTP {}'.format(res.status_code)
+
+            delay = self.backoff * 2 ** attempt
+            attempt += 1
+
+            self.logger.warning('Request for "%s" failed (%s), retry #%d in %.1fs',
+                                title, reason, attempt, delay)
+            time.sleep(delay)
+
+        if res.status_code == 304 and entry is not None:
+            return entry, False
+
+        res.raise_for_status()
+
+        return CacheEntry(
+            value=res.text,
+            etag=res.headers.get('ETag'),
+            last_modified=res.headers.get('Last-Modified'),
+            fetched_at=time.time()
+        ), True
+
+    def get_page_content(self, title):
+        """
+        Return templates metadata for a given page, use the cache when possible
+
+        :type title str
+        :rtype: str
+        """
+        (_, content) = next(self.iter_pages_content([title]))
+        return content
+
     def get_models_from_page(self, title, source=WikiArticleSource()):
         """
         :type title str
         :type source WikiArticleSource
         :rtype: list[grapher.models.base.BaseModel]
         """
-        self.logger.info('Getting metadata for "%s"', title)
+        source.set_content(self.get_page_content(title))
 
-        # https://nfs.sandbox-s6.fandom.com/wikia.php?controller=TemplatesApiController&method=getMetadata&title=Ferrari_355_F1
-        # http://football.sandbox-s6.wikia.com/api/v1/Templates/Metadata?title=Zlatan_Ibrahimovi%C4%87
-        # http://football.sandbox-s6.wikia.com/api/v1/Templates/Metadata?title=Zlatan_Ibrahimovi%C4%87
-        cache_file = self._get_cache_filename('templates', title)
+        return source.get_models()
 
-        if not path.isfile(cache_file):
-            res = self.pool.get(
-                'http://football.sandbox-s6.wikia.com/api/v1/Templates/Metadata',
-                params={'title': title}
-            )
-            res.raise_for_status()
+    def iter_pages_content(self, titles, refresh=False):
+        """
+        Fetch metadata for given pages using a pool of worker threads and yield it
+        in the order of provided titles.
 
-            res_raw = res.text
+        Titles are taken in batches, each batch is looked up in the cache at once.
+        Cache misses are fetched, stale entries are revalidated. Hence titles can be
+        a lazily evaluated stream.
 
-            # set the cache
-            with open(cache_file, 'wt') as file:
-                file.write(res_raw)
-        else:
-            # cache hit
-            with open(cache_file, 'rt') as file:
-                res_raw = file.read()
+        :type titles collections.Iterable[str]
+        :type refresh bool revalidate all pages, even if they are fresh in the cache
+        :rtype: list[tuple[str, str]] title and its metadata
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for batch in chunks(titles, self.batch_size):
+                entries = self.cache.get_entries('templates', batch)
+
+                contents = {
+                    title: entry.value for (title, entry) in entries.items()
+                    if not refresh and self.cache.is_fresh(entry)
+                }
+
+                fetches = {
+                    title: executor.submit(self._fetch_templates, title, entries.get(title))
+                    for title in batch if title not in contents
+                }
+
+                if fetches:
+                    fetched = {title: fetch.result() for (title, fetch) in fetches.items()}
+
+                    self.cache.set_many('templates', {
+                        title: entry for (title, (entry, modified)) in fetched.items() if modified
+                    })
+                    self.cache.touch_many('templates', [
+                        title for (title, (_, modified)) in fetched.items() if not modified
+                    ])
+
+                    contents.update({
+                        title: entry.value for (title, (entry, _)) in fetched.items()
+                    })
+
+                for title in batch:
+                    yield title, contents[title]
+
+    def iter_pages_models(self, titles, source_class=FootballWikiSource, refresh=False,
+                          workers=WORKERS):
+        """
+        Yield models from given pages, in the order of titles
+        (i.e. the same as for a sequential run)
+
+        :type titles collections.Iterable[str]
+        :type source_class type
+        :type refresh bool fetch all pages, even if they are cached
+        :type workers int parse pages in that many processes
+        :rtype: list[tuple[str, list[grapher.models.base.BaseModel]]] title and its models
+        """
+        pages = self.iter_pages_content(titles, refresh)
 
-        source.set_content(res_raw)
+        if workers <= 1:
+            for (title, content) in pages:
+                yield title, self._get_models_from_content(content, source_class)
+            return
 
-        return source.get_models()
+        def get_results(pending_batch):
+            (batch_titles, future) = pending_batch
+
+            for (title, records) in zip(batch_titles, future.result()):
+                yield title, [BaseModel.from_record(record) for record in records]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+
+            for batch in chunks(pages, WORKER_BATCH_SIZE):
+                pending.append((
+                    [title for (title, _) in batch],
+                    executor.submit(get_model_records,
+                                    [content for (_, content) in batch], source_class)
+                ))
+
+                # keep all workers busy, but do not queue too many pages
+                if len(pending) >= 2 * workers:
+                    yield from get_results(pending.popleft())
+
+            while pending:
+                yield from get_results(pending.popleft())
+
+    def iter_models_from_pages(self, titles, source_class=FootballWikiSource, refresh=False,
+                               workers=WORKERS):
+        """
+        Yield models from given pages, in the order of titles
+
+        :type titles collections.Iterable[str]
+        :type source_class type
+        :type refresh bool fetch all pages, even if they are cached
+        :type workers int parse pages in that many processes
+        :rtype: list[grapher.models.base.BaseModel]
+        """
+        for (_, models) in self.iter_pages_models(titles, source_class, refresh, workers):
+            yield from models
+
+    def get_models_from_pages(self, titles, source_class=FootballWikiSource):
+        """
+        :type titles list[str]
+        :type source_class type
+        :rtype: list[grapher.models.base.BaseModel]
+        """
+        return list(self.iter_models_from_pages(titles, source_class))
+
+    @staticmethod
+    def _get_models_from_content(content, source_class):
+        """
+        :type content str
+        :type source_class type
+        :rtype: list[grapher.models.base.BaseModel]
+        """
+        source = source_class()
+        source.set_content(content)
+
+        return list(source.get_models())
+
+
+def get_model_records(contents, source_class):
+    """
+    Return records of models from given pages metadata (runs in a worker process)
+
+    :type contents list[str]
+    :type source_class type
+    :rtype: list[list[tuple]] records of models for each page
+    """
+    records = []
+
+    for content in contents:
+        source = source_class()
+        source.set_content(content)
+
+        records.append([model.to_record() for model in source.get_models()])
+
+    return records
 
 
 def index():
     """
     Index football.wikia.com
     """
+    parser = ArgumentParser(description='Index football.wikia.com into RedisGraph')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY,
+                        help='how many pages metadata to fetch at the same time')
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help='how many processes to use to parse pages metadata')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only re-index pages changed since the last run')
+    parser.add_argument('--delta', action='store_true',
+                        help='re-index all pages, but write only changes to the graph')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue the interrupted full indexing')
+    parser.add_argument('--staging', action='store_true',
+                        help='build the graph next to the one being queried and swap them '
+                             'once it is complete')
+    parser.add_argument('--teammates', action='store_true',
+                        help='store "teammate" relations between players that were '
+                             'at the same club at the same time')
+    parser.add_argument('--cache-ttl', type=int, default=CACHE_TTL,
+                        help='revalidate cached responses older than given number of seconds '
+                             '(0 - never)')
+    args = parser.parse_args()
+
     logger = logging.getLogger('index')
     logger.info('Script: %s', __file__)
     logger.info('Output: %s', OUTPUT_DIRECTORY)
 
-    wiki = Wiki(WIKI_DOMAIN)
+    cache = SqliteCache(CACHE_DATABASE, ttl=args.cache_ttl or None)
+    wiki = Wiki(WIKI_DOMAIN, cache=cache, concurrency=args.concurrency)
+    graph = RedisGraph(host='localhost', port=56379)
+    state = IndexState(STATE_DATABASE)
 
-    # get pages in categories we're interested in
-    pages = []
-    for category in CATEGORIES:
-        pages += wiki.pages_in_category(category)
+    # changes made while we're indexing will be picked up by the next run
+    started = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
 
-    # make the list unique (we may have the same page in players and manager category)
-    # and sort it
-    pages = sorted(list(set(pages)))
+    if args.incremental and state.get_last_run():
+        index_changes(wiki, graph, state, workers=args.workers)
+    elif args.delta and state.get_last_run():
+        index_delta(wiki, graph, state, workers=args.workers)
+    else:
+        if args.incremental or args.delta:
+            logger.info('There was no previous run, indexing all pages')
 
-    # get and parse templates
-    logger.info("Will create models from %d pages", len(pages))
+        started = index_all(wiki, graph, state, workers=args.workers, resume=args.resume,
+                            staging=args.staging)
 
-    models = []
-    for page in pages:
-        models += wiki.get_models_from_page(page, source=FootballWikiSource())
+    state.set_last_run(started)
 
-    logger.info("%d models were created from pages", len(models))
-    # print([model.get_node_name() for model in models])
+    # players careers for "who was at club X in year Y" queries
+    careers = TemporalIndex.from_snapshot(state)
+    careers.save(OUTPUT_DIRECTORY + '/football.careers.json')
 
-    # store graph in RedisGraph
-    graph = RedisGraph(host='localhost', port=56379)
-    for model in models:
-        graph.add(model)
+    # squads, transfers and league players read by queries without touching the graph
+    graph.get_views('football').store(build_views(state, careers))
 
-    # store the graph in a file
-    with open(OUTPUT_DIRECTORY + '/football.graph', 'wt') as graph_file:
-        graph_file.write(graph.dump(graph_name='football'))
+    if args.teammates:
+        graph.store_relations('football', 'teammate',
+                              TeammateProjection.from_careers(careers).iter_edges(),
+                              names=state.get_nodes())
 
-    # save it in a storage
-    graph.store(graph_name='football')
+    # different names encoded as the same node name are stored as a single node
+    collisions = BaseModel.registry.get_collisions()
 
+    if collisions:
+        logger.warning('%d node names are shared by different names: %s',
+                       len(collisions), collisions)
+
+    logger.info('Nodes registered: %d', len(BaseModel.registry))
+    logger.info('Cache: %s', wiki.cache.get_stats())
     logger.info('Done')
+
+
+def index_all(wiki, graph, state, workers=WORKERS, resume=False, staging=False):
+    # pylint: disable=too-many-arguments
+    """
+    Index all pages and replace the graph
+
+    The progress is saved periodically, an interrupted run can be resumed.
+
+    :type wiki Wiki
+    :type graph RedisGraph
+    :type state IndexState
+    :type workers int
+    :type resume bool continue from the last checkpoint (if there is one)
+    :type staging bool queries use the previous graph until the new one is complete
+    :rtype: str when the indexing was started (ISO 8601 timestamp)
+    """
+    logger = logging.getLogger('index_all')
+
+    # the dump is truncated to the size it had when the checkpoint was saved
+    with open(OUTPUT_DIRECTORY + '/football.graph', 'a+t') as graph_file:
+        checkpoint = Checkpoint(state, path.join(CACHE_DIRECTORY, 'edges.jsonl'),
+                                dump_file=graph_file, resume=resume)
+
+        if checkpoint.resumed:
+            names = state.get_nodes()
+            processed = state.get_processed_titles()
+            logger.info('Skipping %d pages processed before', len(processed))
+        else:
+            state.clear()
+            names = dict()
+            processed = set()
+
+        # categories -> unique titles -> templates metadata -> models -> batches of queries
+        # everything is lazily evaluated, so the first batches are stored in Redis
+        # while we're still getting pages in categories
+        pages = wiki.record_revisions(
+            (title for title in wiki.pages_in_categories(CATEGORIES) if title not in processed),
+            state)
+        models = record_snapshot(state, checkpoint.iter_models(
+            wiki.iter_pages_models(pages, source_class=FootballWikiSource, workers=workers)))
+
+        # store graph in RedisGraph and in a file
+        graph.store_stream(graph_name='football', models=models, dump_file=graph_file,
+                           names=names, checkpoint=checkpoint, staging=staging)
+
+    state.set_nodes(names)
+    checkpoint.finish()
+
+    return checkpoint.progress['started']
+
+
+def index_changes(wiki, graph, state, workers=WORKERS):
+    """
+    Re-index pages changed since the last run and apply them to the existing graph
+
+    :type wiki Wiki
+    :type graph RedisGraph
+    :type state IndexState
+    :type workers int
+    """
+    changed = wiki.get_changed_pages(
+        since=state.get_last_run(),
+        categories=CATEGORIES,
+        known_titles=set(state.get_revisions().keys())
+    )
+
+    models = wiki.iter_models_from_pages(
+        [title for (title, _, _) in changed], source_class=FootballWikiSource, refresh=True,
+        workers=workers)
+
+    names = state.get_nodes()
+    summary = graph.store_delta(graph_name='football', models=models,
+                                delta=Delta(state, full=False), names=names)
+
+    state.set_revisions(changed)
+    state.set_nodes(names)
+
+    write_changes(summary)
+
+
+def index_delta(wiki, graph, state, workers=WORKERS):
+    """
+    Re-index all pages, but apply only what has changed to the existing graph
+
+    Nodes of pages that are no longer in the categories are removed.
+
+    :type wiki Wiki
+    :type graph RedisGraph
+    :type state IndexState
+    :type workers int
+    """
+    pages = wiki.record_revisions(wiki.pages_in_categories(CATEGORIES), state)
+    models = wiki.iter_models_from_pages(pages, source_class=FootballWikiSource, workers=workers)
+
+    names = state.get_nodes()
+    summary = graph.store_delta(graph_name='football', models=models,
+                                delta=Delta(state, full=True), names=names)
+
+    state.set_nodes(names)
+
+    write_changes(summary)
+
+
+def write_changes(summary):
+    """
+    Log the summary of changes applied to the graph and write them to a JSON file
+
+    :type summary dict
+    """
+    logging.getLogger('index').info('Changes: %s', dict(summary['summary']))
+
+    with open(OUTPUT_DIRECTORY + '/football.changes.json', 'wt') as changes_file:
+        json.dump(summary, changes_file, indent=True)
+
+
+def migrate_cache():
+    """
+    Move API responses cached in JSON files to a database
+    """
+    logger = logging.getLogger('migrate_cache')
+
+    source = DirectoryCache(CACHE_DIRECTORY)
+    target = SqliteCache(CACHE_DATABASE)
+
+    (migrated, skipped) = migrate_directory_cache(source, target, 'templates')
+
+    logger.info('Migrated %d entries (%d skipped)', migrated, skipped)
+    logger.info('Cache: %s', target.get_stats())
@@ -2,51 +2,258 @@
 Ask a question for a football graph
 """
 # https://wikia-inc.atlassian.net/browse/CORE-28
+import asyncio
 from collections import defaultdict
+from functools import lru_cache
 import json
 import logging
+from os import path
 
+from grapher.cache import MemoryCache
 from grapher.graph import RedisGraph
+from grapher.graph.async_client import AsyncQueryClient, run
+from grapher.graph.queries import QueryRegistry
+from grapher.graph.results import ResultSet
+from grapher.graph.temporal import TemporalIndex
+from grapher.utils import chunks
 
+QUERIES = QueryRegistry()
 
-def query_redis(graph_name, query, **params):
+# players careers, written by the indexer
+CAREERS_FILE = path.join(path.dirname(__file__), '../../output/football.careers.json')
+
+# columns of rows taken from views and the careers index, as returned by queries
+CURRENT_SQUAD_COLUMNS = ('name', 'position', 'number')
+HISTORICAL_SQUAD_COLUMNS = ('name', 'position', 'hist.since', 'hist.until')
+LEAGUE_PLAYERS_COLUMNS = ('t.name', 'p.name', 'a.since', 'a.until')
+
+# how many keys are asked for by a single batch query
+BATCH_QUERY_SIZE = 100
+
+# query results are cached for each version of the graph, the version changes when
+# the graph is stored again, TTL limits how long a result is kept for a graph updated
+# by a different process that does not bump the version
+RESULTS = MemoryCache(max_entries=1000, ttl=3600)
+
+QUERIES.register('nationalities_in_league', """
+    MATCH (t:SportsTeam)<-[a:athlete]-(p:Person)
+    WHERE t.memberOf = $league
+    AND p.nationality = $nationality RETURN t.name,p.name,a.since,a.until
+    """, params=('league', 'nationality'))
+
+QUERIES.register('all_players_and_teams', """
+    MATCH (t:SportsTeam)<-[a]-(p:Person)
+    RETURN t.name,p.name
+    """)
+
+QUERIES.register('players_in_two_clubs', """
+    MATCH (t1:SportsTeam)<-[a1:athlete]-(p:Person)-[a2:athlete]->(t2:SportsTeam)
+    WHERE t1.name = $club_a and t2.name = $club_b
+    RETURN p.name,
+        t1.name,t2.name,
+        a1.since,a1.until,
+        a2.since,a2.until
+    """, params=('club_a', 'club_b'))
+
+QUERIES.register('league_players_by_position', """
+    MATCH (t1:SportsTeam)-[a1:athlete]->(p:Person)-[a:athlete]->(t:SportsTeam)
+    WHERE t.memberOf = $league AND a1.position = $position
+    RETURN t.name,p.name,a.since,a.until
+    """, params=('league', 'position'))
+
+QUERIES.register('current_squad', """
+    MATCH (t:SportsTeam)-[a:athlete]->(p:Person)
+    WHERE t.name = $club
+    RETURN p.name AS name, a.position AS position ,a.number AS number
+    """, params=('club',))
+
+# https://neo4j.com/docs/cypher-manual/current/syntax/operators/#query-operators-comparison
+QUERIES.register('historical_squad', """
+    MATCH (:SportsTeam)-[a:athlete]->(p:Person)-[hist:athlete]->(t:SportsTeam)
+    WHERE t.name = $club AND hist.since <= $year
+    RETURN p.name AS name, a.position AS position, hist.since, hist.until
+    """, params=('club', 'year'))
+
+QUERIES.register('players_between', """
+    MATCH (p:Person)-[hist:athlete]->(t:SportsTeam)
+    WHERE t.name = $club AND hist.since <= $until
+    RETURN p.name AS name, hist.since, hist.until
+    """, params=('club', 'until'))
+
+
+@lru_cache(maxsize=None)
+def get_graph():
+    """
+    Queries share a single client (and its connection pool)
+
+    :rtype: RedisGraph
+    """
+    return RedisGraph(host='localhost', port=56379)
+
+
+def get_views():
+    """
+    Squads, transfers and league players computed by the indexer
+
+    :rtype: grapher.graph.views.RedisViews
+    """
+    return get_graph().get_views('football')
+
+
+def get_temporal_index():
+    """
+    Return the index of players careers, it is loaded again once the indexer replaces it
+
+    :rtype: TemporalIndex|None None when the index was not built yet
+    """
+    try:
+        return load_temporal_index(path.getmtime(CAREERS_FILE))
+    except OSError:
+        return None
+
+
+@lru_cache(maxsize=1)
+def load_temporal_index(mtime):
+    """
+    :type mtime float the index file modification time
+    :rtype: TemporalIndex
+    """
+    logging.info('Loading careers index (modified at %d)', mtime)
+    return TemporalIndex.load(CAREERS_FILE)
+
+
+def get_async_client():
+    """
+    Connections of asyncio clients can only be used by a single event loop,
+    create a client for each batch of queries
+
+    :rtype: AsyncQueryClient
+    """
+    return AsyncQueryClient(host='localhost', port=56379)
+
+
+def query_redis(graph_name, query_name, **params):
     """
     :type graph_name str
-    :type query str
-    :rtype: list[dict]
+    :type query_name str registered in QUERIES
+    :rtype: ResultSet rows with typed values (int, float, str or None)
+    """
+    return run_query(graph_name, QUERIES.prepare(query_name, **params))
+
+
+def query_redis_batch(graph_name, query_name, param, keys, **params):
+    """
+    Ask a query for many values of a single parameter, with one round trip per
+    BATCH_QUERY_SIZE values instead of one per value
+
+    :type graph_name str
+    :type query_name str registered in QUERIES
+    :type param str the parameter that takes values from keys
+    :type keys list
+    :rtype: dict[str, ResultSet] results for each key
+    """
+    results = dict()
+
+    # keep the order, skip repeated keys
+    for batch in chunks(list(dict.fromkeys(keys)), BATCH_QUERY_SIZE):
+        matches = run_query(graph_name, QUERIES.prepare_batch(query_name, param, batch, **params))
+        results.update(matches.split(batch))
+
+    return results
+
+
+def run_query(graph_name, cypher_query):
     """
-    cypher_query = query.format(**params).rstrip()
+    :type graph_name str
+    :type cypher_query str
+    :rtype: ResultSet
+    """
+    # e.g. football@12
+    version = '{}@{}'.format(graph_name, get_graph().get_version(graph_name))
+    cached = get_cached_result(version, cypher_query)
 
-    logging.info('Querying "%s" graph: %s', graph_name, cypher_query)
-    graph = RedisGraph(host='localhost', port=56379).get_redisgraph(graph_name)
+    if cached is not None:
+        logging.info('Cached result for "%s" graph: %s', version, cypher_query)
+        return cached
+
+    logging.info('Querying "%s" graph: %s', version, cypher_query)
+    graph = get_graph().get_current_redisgraph(graph_name)
     res = graph.query(cypher_query)
 
     # res.pretty_print()  # DEBUG
 
-    results = res.result_set
-    header = [str(entry.decode("utf-8")) for entry in results[0]]
+    matches = ResultSet.from_response(res.result_set)
 
-    for row in results[1:]:
-        yield dict(
-            zip(header, [str(entry.decode("utf-8")) for entry in row])
-        )
+    cache_result(version, cypher_query, matches)
+    return matches
+
+
+def cache_result(version, cypher_query, matches):
+    """
+    :type version str
+    :type cypher_query str
+    :type matches ResultSet
+    """
+    RESULTS.set(version, cypher_query, json.dumps({
+        'columns': matches.columns,
+        'rows': list(matches.iter_tuples()),
+    }))
+
+
+def get_cached_result(version, cypher_query):
+    """
+    :type version str
+    :type cypher_query str
+    :rtype: ResultSet|None
+    """
+    cached = RESULTS.get(version, cypher_query)
+
+    if cached is None:
+        return None
+
+    cached = json.loads(cached)
+    return ResultSet(cached['columns'], cached['rows'], decoded=True)
+
+
+async def query_redis_many(client, graph_name, requests):
+    """
+    Run many queries at once, return when all results are in
+
+    :type client AsyncQueryClient
+    :type graph_name str
+    :type requests list[tuple[str, dict]] query names (registered in QUERIES) and parameters
+    :rtype: list[ResultSet] in the order of requests
+    """
+    cypher_queries = [QUERIES.prepare(query_name, **params) for (query_name, params) in requests]
+
+    version = '{}@{}'.format(graph_name, await client.get_version(graph_name))
+    results = [get_cached_result(version, cypher_query) for cypher_query in cypher_queries]
+
+    missing = [offset for (offset, result) in enumerate(results) if result is None]
+    logging.info('Querying "%s" graph: %d queries (%d cached)',
+                 version, len(missing), len(results) - len(missing))
+
+    if missing:
+        queried = await client.query_many(
+            graph_name, [cypher_queries[offset] for offset in missing])
+
+        for (offset, matches) in zip(missing, queried):
+            cache_result(version, cypher_queries[offset], matches)
+            results[offset] = matches
+
+    return results
 
 
 def nationalities_in_league(nationality, league):
     """
     :type nationality str
     :type league str
-    :rtype: list[dict]
+    :rtype: list[grapher.graph.results.Row]
     """
     logging.info('Looking for players from %s in %s', nationality, league)
 
-    query = """
-    MATCH (t:SportsTeam)<-[a:athlete]-(p:Person)
-    WHERE t.memberOf = '{league}'
-    AND p.nationality = '{nationality}' RETURN t.name,p.name,a.since,a.until
-    """
-
-    matches = query_redis('football', query, nationality=nationality, league=league)
+    matches = query_redis('football', 'nationalities_in_league',
+                          nationality=nationality, league=league)
     matches = list(matches)
 
     print("\n".join([str(match) for match in matches]))
@@ -54,16 +261,27 @@ def nationalities_in_league(nationality, league):
     return matches
 
 
-def all_players_and_teams():
-    """
-    :rtype: list[dict]
+def nationalities_in_league_many(nationalities, league):
     """
-    query = """
-    MATCH (t:SportsTeam)<-[a]-(p:Person)
-    RETURN t.name,p.name
+    :type nationalities list[str]
+    :type league str
+    :rtype: dict[str, list[grapher.graph.results.Row]] nationality -> players
     """
+    logging.info('Looking for players from %d countries in %s', len(nationalities), league)
+
+    return {
+        nationality: list(matches)
+        for (nationality, matches) in query_redis_batch(
+            'football', 'nationalities_in_league', 'nationality', nationalities,
+            league=league).items()
+    }
+
 
-    matches = query_redis('football', query)
+def all_players_and_teams():
+    """
+    :rtype: list[grapher.graph.results.Row]
+    """
+    matches = query_redis('football', 'all_players_and_teams')
     matches = list(matches)
 
     print("\n".join([str(match) for match in matches]))
@@ -75,20 +293,11 @@ def players_in_two_clubs(club_a, club_b):
     """
     :type club_a str
     :type club_b str
-    :rtype: list[dict]
+    :rtype: list[grapher.graph.results.Row]
     """
     logging.info('Looking for players who played in both %s in %s', club_a, club_b)
 
-    query = """
-    MATCH (t1:SportsTeam)<-[a1:athlete]-(p:Person)-[a2:athlete]->(t2:SportsTeam)
-    WHERE t1.name = '{club_a}' and t2.name = '{club_b}'
-    RETURN p.name,
-        t1.name,t2.name,
-        a1.since,a1.until,
-        a2.since,a2.until
-    """
-
-    matches = query_redis('football', query, club_a=club_a, club_b=club_b)
+    matches = query_redis('football', 'players_in_two_clubs', club_a=club_a, club_b=club_b)
     matches = list(matches)
 
     print("\n".join([str(match) for match in matches]))
@@ -100,18 +309,17 @@ def league_players_by_position(league, position):
     """
     :type league str
     :type position str
-    :rtype: list[dict]
+    :rtype: list[grapher.graph.results.Row]
     """
     logging.info('Looking for players from %s playing as %s', league, position)
 
-    query = """
-    MATCH (t1:SportsTeam)-[a1:athlete]->(p:Person)-[a:athlete]->(t:SportsTeam)
-    WHERE t.memberOf = '{league}' AND a1.position = '{position}'
-    RETURN t.name,p.name,a.since,a.until
-    """
+    players = get_views().get_league_players(league, position)
 
-    matches = query_redis('football', query, league=league, position=position)
-    matches = list(matches)
+    if players is not None:
+        matches = list(ResultSet(LEAGUE_PLAYERS_COLUMNS, players, decoded=True))
+    else:
+        matches = list(query_redis('football', 'league_players_by_position',
+                                   league=league, position=position))
 
     print("\n".join([str(match) for match in matches]))
 
@@ -121,24 +329,79 @@ def league_players_by_position(league, position):
 def current_squad(club):
     """
     :type club str
-    :rtype: list[dict]
+    :rtype: dict
     """
     logging.info('Looking for %s squad', club)
 
-    query = """
-    MATCH (t:SportsTeam)-[a:athlete]->(p:Person)
-    WHERE t.name = '{club}'
-    RETURN p.name AS name, a.position AS position ,a.number AS number
+    matches = get_current_matches(club)
+
+    if matches is None:
+        matches = query_redis('football', 'current_squad', club=club)
+
+    return get_current_squad(club, matches)
+
+
+def current_squad_many(clubs):
     """
-    formations = defaultdict(list)
+    :type clubs list[str]
+    :rtype: dict[str, dict] club -> its squad
+    """
+    logging.info('Looking for squads of %d clubs', len(clubs))
+
+    results = get_current_matches_many(clubs)
+
+    if results is None:
+        results = query_redis_batch('football', 'current_squad', 'club', clubs)
+
+    return {club: get_current_squad(club, matches) for (club, matches) in results.items()}
+
+
+def get_current_matches(club):
+    """
+    Take the current squad of a club from views
+
+    :type club str
+    :rtype: ResultSet|None None when views were not stored yet
+    """
+    players = get_views().get_squad(club)
+
+    if players is None:
+        return None
+
+    return ResultSet(CURRENT_SQUAD_COLUMNS, players, decoded=True)
+
+
+def get_current_matches_many(clubs):
+    """
+    Take current squads of many clubs from views in a single round trip
+
+    :type clubs list[str]
+    :rtype: dict[str, ResultSet]|None club -> its squad, None when views were not stored yet
+    """
+    players = get_views().get_squads(clubs)
+
+    if players is None:
+        return None
 
-    matches = query_redis('football', query, club=club)
+    return {
+        club: ResultSet(CURRENT_SQUAD_COLUMNS, squad, decoded=True)
+        for (club, squad) in players.items()
+    }
+
+
+def get_current_squad(club, matches):
+    """
+    :type club str
+    :type matches ResultSet
+    :rtype: dict
+    """
+    formations = defaultdict(list)
 
     for match in matches:
-        # {'name': 'Nemanja Matić', 'position': 'MF', 'number': '31.000000'}
-        formations[match['position']].append({
-            'name': match['name'],
-            'number': int(float(match['number']))
+        # Row(name='Nemanja Matić', position='MF', number=31)
+        formations[match.position].append({
+            'name': match.name,
+            'number': match.number
         })
 
     # sort each formation by number
@@ -156,34 +419,159 @@ def historical_squad(club, year):
     """
     :type club str
     :type year int
-    :rtype: list[dict]
+    :rtype: dict
     """
     logging.info('Looking for %s squad in year %d', club, year)
 
-    # https://neo4j.com/docs/cypher-manual/current/syntax/operators/#query-operators-comparison
-    query = """
-    MATCH (:SportsTeam)-[a:athlete]->(p:Person)-[hist:athlete]->(t:SportsTeam)
-    WHERE t.name = '{club}' AND hist.since <= {year}
-    RETURN p.name AS name, a.position AS position, hist.since, hist.until
+    matches = get_historical_matches(club, year)
+
+    if matches is None:
+        matches = query_redis('football', 'historical_squad', club=club, year=year)
+
+    return get_historical_squad(club, year, matches)
+
+
+def get_historical_matches(club, year):
     """
-    formations = defaultdict(list)
+    Take players of a club in a given year from the careers index or from views
+
+    :type club str
+    :type year int
+    :rtype: ResultSet|None None when neither the index nor views were built yet
+    """
+    careers = get_temporal_index()
+
+    if careers is not None:
+        players = careers.get_players_at(club, year)
+    else:
+        players = get_views().get_season(club, year)
+
+    if players is None:
+        return None
+
+    return get_historical_result(players)
+
+
+def get_historical_matches_many(clubs, year):
+    """
+    Take players of many clubs in a given year from the careers index or from views
+    (in a single round trip)
+
+    :type clubs list[str]
+    :type year int
+    :rtype: dict[str, ResultSet]|None club -> its players, None when neither the index
+        nor views were built yet
+    """
+    careers = get_temporal_index()
+
+    if careers is not None:
+        players = {club: careers.get_players_at(club, year) for club in clubs}
+    else:
+        players = get_views().get_seasons(clubs, year)
+
+    if players is None:
+        return None
+
+    return {club: get_historical_result(squad) for (club, squad) in players.items()}
+
+
+def get_historical_result(players):
+    """
+    :type players list[tuple[str, str|None, int, int|None]] name, position, since and until
+    :rtype: ResultSet
+    """
+    # only players in one of the current squads have a position,
+    # as in the historical_squad query
+    return ResultSet(HISTORICAL_SQUAD_COLUMNS, [
+        player for player in players if player[1] is not None
+    ], decoded=True)
+
+
+def players_between(club, since, until):
+    """
+    Who played for a club at some point between given years
+
+    :type club str
+    :type since int
+    :type until int
+    :rtype: list[dict]
+    """
+    logging.info('Looking for players of %s between %d and %d', club, since, until)
+
+    careers = get_temporal_index()
+
+    if careers is not None:
+        players = careers.get_players_between(club, since, until)
+    else:
+        players = [
+            (match.name, None, match.hist_since, match.hist_until)
+            for match in query_redis('football', 'players_between', club=club, until=until)
+            if match.hist_until is None or match.hist_until >= since
+        ]
+
+    return [
+        {'name': name, 'since': player_since, 'until': player_until}
+        for (name, _, player_since, player_until) in players
+    ]
+
+
+def transfers_from(club, limit=10):
+    """
+    Clubs that players of a given club moved to next
+
+    :type club str
+    :type limit int
+    :rtype: list[dict]|None None when views were not stored yet
+    """
+    logging.info('Looking for transfers from %s', club)
+
+    transfers = get_views().get_transfers(club, limit)
+
+    if transfers is None:
+        return None
+
+    return [{'club': target, 'players': count} for (target, count) in transfers]
 
-    matches = query_redis('football', query, club=club, year=year)
 
-    # print(list(matches))
+def top_transfers(limit=10):
+    """
+    The most common moves of players between clubs
+
+    :type limit int
+    :rtype: list[dict]|None None when views were not stored yet
+    """
+    transfers = get_views().get_top_transfers(limit)
+
+    if transfers is None:
+        return None
+
+    return [
+        {'from': source, 'to': target, 'players': count}
+        for (source, target, count) in transfers
+    ]
+
+
+def get_historical_squad(club, year, matches):
+    """
+    :type club str
+    :type year int
+    :type matches ResultSet
+    :rtype: dict
+    """
+    formations = defaultdict(list)
 
     for match in matches:
-        # {'name': 'Nemanja Matić', 'position': 'MF', 'number': '31.000000'}
+        # Row(name='Nemanja Matić', position='MF', hist_since=2017, hist_until=None)
 
         # redisgraph does not seem to support "IS NULL" operator
         # check this in the code
-        until = int(float(match['hist.until'])) if match['hist.until'] != 'NULL' else False
+        until = match.hist_until
 
-        logging.info('%s - until %d', match['name'], until)
+        logging.debug('%s - until %s', match.name, until)
 
-        if not until or until >= year:
-            formations[match['position']].append({
-                'name': match['name']
+        if until is None or until >= year:
+            formations[match.position].append({
+                'name': match.name
             })
 
     # sort each formation by number
@@ -197,9 +585,53 @@ def historical_squad(club, year):
     }
 
 
+async def fetch_squads(clubs, year=None):
+    """
+    :type clubs list[str]
+    :type year int|None current squads are returned if not set
+    :rtype: list[dict]
+    """
+    # squads are taken from views or the careers index when they were built, all clubs
+    # at once, the blocking client is used outside of the event loop
+    loop = asyncio.get_event_loop()
+
+    if year is None:
+        matches = await loop.run_in_executor(None, get_current_matches_many, clubs)
+    else:
+        matches = await loop.run_in_executor(None, get_historical_matches_many, clubs, year)
+
+    if matches is None:
+        if year is None:
+            requests = [('current_squad', {'club': club}) for club in clubs]
+        else:
+            requests = [('historical_squad', {'club': club, 'year': year}) for club in clubs]
+
+        async with get_async_client() as client:
+            matches = dict(zip(clubs, await query_redis_many(client, 'football', requests)))
+
+    return [
+        get_current_squad(club, matches[club]) if year is None
+        else get_historical_squad(club, year, matches[club])
+        for club in clubs
+    ]
+
+
+def squads_for_clubs(clubs, year=None):
+    """
+    Return squads of all given clubs (in a given year), queries are sent concurrently
+
+    :type clubs list[str]
+    :type year int|None current squads are returned if not set
+    :rtype: list[dict]
+    """
+    logging.info('Looking for squads of %d clubs (year: %s)', len(clubs), year)
+
+    return run(fetch_squads(clubs, year))
+
+
 def matches_to_graph_json(matches, nodes_fields, edge_fields):
     """
-    :type matches list[dict]
+    :type matches list[grapher.graph.results.Row]
     :type nodes_fields dict
     :type edge_fields list
     :rtype: dict
@@ -272,8 +704,8 @@ def index():
         :rtype: lambda
         """
         return lambda x: '{}-{}'.format(
-            int(float(x[field + '.since'])),
-            int(float(x[field + '.until'])) if x[field + '.until'] != 'NULL' else 'now'
+            x[field + '.since'],
+            x[field + '.until'] if x[field + '.until'] is not None else 'now'
         )
 
     """
@@ -330,6 +762,7 @@ def index():
     )
     """
     print('\tvar graph = {};'.format(json.dumps(graph)))
+    logging.info('Results cache: %s', RESULTS.get_stats())
 
 
 def squads():
@@ -341,3 +774,4 @@ def squads():
     squad = historical_squad('Liverpool F.C.', year=2017)
 
     print('\tvar squad = {};'.format(json.dumps(squad, sort_keys=True)))
+    logging.info('Results cache: %s', RESULTS.get_stats())
@@ -84,12 +84,19 @@ class WikiArticleSource(BaseSource):
         super(WikiArticleSource, self).__init__()
         self.content = None
 
+        # content is decoded once, templates are indexed by their name
+        self.templates = None
+        self.templates_by_name = None
+
     def set_content(self, content):
         """
         :type content str
         """
         self.content = content
 
+        self.templates = None
+        self.templates_by_name = None
+
     def get_content(self):
         """
         :rtype: str
@@ -106,9 +113,9 @@ class WikiArticleSource(BaseSource):
         """
         return json.loads(self.get_content())
 
-    def get_templates(self):
+    def _parse_templates(self):
         """
-        :rtype: list[Template]
+        Decode the content and index templates by their name
         """
         try:
             data = self.get_content_json()
@@ -119,22 +126,37 @@ class WikiArticleSource(BaseSource):
 
         page_title = data['title']
 
+        self.templates = []
+        self.templates_by_name = dict()
+
         for template in data.get('templates'):
-            yield Template(
+            template = Template(
                 page_title=page_title,
                 name=template['name'],
                 parameters=template['parameters']
             )
 
+            self.templates.append(template)
+            self.templates_by_name.setdefault(template.get_name(), []).append(template)
+
+    def get_templates(self):
+        """
+        :rtype: list[Template]
+        """
+        if self.templates is None:
+            self._parse_templates()
+
+        return self.templates
+
     def get_templates_of_type(self, template_type):
         """
         :type template_type str
         :rtype: list[Template]
         """
-        return [
-            template
-            for template in self.get_templates() if template.get_name() == template_type
-        ]
+        if self.templates_by_name is None:
+            self._parse_templates()
+
+        return self.templates_by_name.get(template_type, [])
 
     def get_models(self):
         super(WikiArticleSource, self).get_models()
@@ -198,7 +220,7 @@ class FootballWikiSource(WikiArticleSource):
                         template, 'clubs', 'years'):
                     model.add_relation(
                         'athlete',
-                        SportsTeamModel(club_name).get_node_name(),
+                        SportsTeamModel.get_node_id_by_name(club_name),
                         properties={
                             'since': since,
                             'until': until
@@ -209,7 +231,7 @@ class FootballWikiSource(WikiArticleSource):
                         template, 'managerclubs', 'manageryears'):
                     model.add_relation(
                         'coach',
-                        SportsTeamModel(club_name).get_node_name(),
+                        SportsTeamModel.get_node_id_by_name(club_name),
                         properties={
                             'since': since,
                             'until': until
@@ -233,7 +255,7 @@ class FootballWikiSource(WikiArticleSource):
 
                 coach = template.get_link('manager') or template.get_link('coach')
                 if coach:
-                    model.add_relation('coach', PersonModel(name=coach).get_node_name())
+                    model.add_relation('coach', PersonModel.get_node_id_by_name(coach))
 
                 # now, let's try to extract all players in the current squad
                 for player in self.get_templates_of_type(template_type='Fs player'):
@@ -247,7 +269,7 @@ class FootballWikiSource(WikiArticleSource):
                         if number and position:
                             model.add_relation(
                                 'athlete',
-                                PersonModel(player_name).get_node_name(),
+                                PersonModel.get_node_id_by_name(player_name),
                                 {'position': position, 'number': number}
                             )
                     else:
@@ -0,0 +1,429 @@
+"""
+Keeps the state of indexing between runs
+"""
+import json
+import logging
+import sqlite3
+import time
+from collections import deque
+from os import remove
+from threading import Lock
+
+# save the progress at most every 30 seconds
+CHECKPOINT_INTERVAL = 30
+
+
+class IndexState(object):
+    """
+    Stores pages revisions, names of nodes stored in the graph and when indexing was last run
+    """
+    # pylint: disable=too-many-public-methods
+    def __init__(self, filename):
+        """
+        :type filename str
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info('Using %s', filename)
+
+        self.lock = Lock()
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS revisions (
+                title TEXT PRIMARY KEY, revision INTEGER NOT NULL, timestamp TEXT NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS nodes (
+                alias TEXT PRIMARY KEY, name TEXT NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY, value TEXT NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS processed (
+                title TEXT PRIMARY KEY
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS snapshot_nodes (
+                alias TEXT PRIMARY KEY, properties TEXT NOT NULL,
+                properties_hash TEXT NOT NULL, edges_hash TEXT NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS snapshot_edges (
+                source TEXT NOT NULL, relation TEXT NOT NULL, target TEXT NOT NULL,
+                properties TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS snapshot_edges_source ON snapshot_edges (source);
+            CREATE INDEX IF NOT EXISTS snapshot_edges_target ON snapshot_edges (target);
+        """)
+
+    def _query(self, query, params=()):
+        """
+        :type query str
+        :type params tuple|list
+        :rtype: list[tuple]
+        """
+        with self.lock:
+            return self.connection.execute(query, params).fetchall()
+
+    def _write(self, query, rows):
+        """
+        :type query str
+        :type rows collections.Iterable[tuple]
+        """
+        with self.lock:
+            with self.connection:
+                self.connection.executemany(query, rows)
+
+    def get_meta(self, key):
+        """
+        :type key str
+        :rtype: str|None
+        """
+        rows = self._query('SELECT value FROM meta WHERE key = ?', (key,))
+        return rows[0][0] if rows else None
+
+    def set_meta(self, key, value):
+        """
+        :type key str
+        :type value str
+        """
+        self._write('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', [(key, value)])
+
+    def get_last_run(self):
+        """
+        Return when the last successful indexing was started (ISO 8601 timestamp)
+
+        :rtype: str|None
+        """
+        return self.get_meta('last_run')
+
+    def set_last_run(self, timestamp):
+        """
+        :type timestamp str
+        """
+        self.set_meta('last_run', timestamp)
+
+    def get_revisions(self):
+        """
+        :rtype: dict[str, tuple[int, str]]
+        """
+        return {
+            title: (revision, timestamp)
+            for (title, revision, timestamp)
+            in self._query('SELECT title, revision, timestamp FROM revisions')
+        }
+
+    def set_revisions(self, revisions):
+        """
+        :type revisions collections.Iterable[tuple[str, int, str]] title, revision ID, timestamp
+        """
+        self._write('INSERT OR REPLACE INTO revisions (title, revision, timestamp) '
+                    'VALUES (?, ?, ?)', revisions)
+
+    def get_nodes(self):
+        """
+        Return names of nodes stored in the graph
+
+        :rtype: dict[str, str] node alias -> name
+        """
+        return dict(self._query('SELECT alias, name FROM nodes'))
+
+    def set_nodes(self, names):
+        """
+        :type names dict[str, str] node alias -> name
+        """
+        self._write('INSERT OR REPLACE INTO nodes (alias, name) VALUES (?, ?)', names.items())
+
+    def get_checkpoint(self):
+        """
+        Return the progress of an interrupted full indexing
+
+        :rtype: dict|None
+        """
+        checkpoint = self.get_meta('checkpoint')
+        return json.loads(checkpoint) if checkpoint else None
+
+    def set_checkpoint(self, progress, titles, names):
+        """
+        Atomically save the progress of a full indexing
+
+        :type progress dict
+        :type titles list[str] pages processed since the last checkpoint
+        :type names dict[str, str] node alias -> name
+        """
+        with self.lock:
+            with self.connection:
+                self.connection.executemany(
+                    'INSERT OR REPLACE INTO processed (title) VALUES (?)',
+                    [(title,) for title in titles])
+                self.connection.executemany(
+                    'INSERT OR REPLACE INTO nodes (alias, name) VALUES (?, ?)', names.items())
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                    ('checkpoint', json.dumps(progress)))
+
+    def get_processed_titles(self):
+        """
+        :rtype: set[str]
+        """
+        return {title for (title,) in self._query('SELECT title FROM processed')}
+
+    def get_snapshot(self):
+        """
+        Return hashes of nodes properties and relations that were last stored in the graph
+
+        :rtype: dict[str, tuple[str, str]] node alias -> properties hash, relations hash
+        """
+        return {
+            alias: (properties_hash, edges_hash)
+            for (alias, properties_hash, edges_hash)
+            in self._query('SELECT alias, properties_hash, edges_hash FROM snapshot_nodes')
+        }
+
+    def get_snapshot_node(self, alias):
+        """
+        :type alias str
+        :rtype: tuple[dict, list[tuple[str, str, str]]]|None properties and relations
+            (type, target alias, JSON-encoded properties)
+        """
+        rows = self._query('SELECT properties FROM snapshot_nodes WHERE alias = ?', (alias,))
+
+        if not rows:
+            return None
+
+        edges = self._query('SELECT relation, target, properties FROM snapshot_edges '
+                            'WHERE source = ? ORDER BY rowid', (alias,))
+
+        return json.loads(rows[0][0]), [tuple(edge) for edge in edges]
+
+    def get_snapshot_edges(self, relation):
+        """
+        :type relation str
+        :rtype: list[tuple[str, str, str]] source alias, target alias and JSON-encoded
+            properties of relations of a given type
+        """
+        return self._query('SELECT source, target, properties FROM snapshot_edges '
+                           'WHERE relation = ?', (relation,))
+
+    def get_snapshot_edges_to(self, alias):
+        """
+        :type alias str
+        :rtype: list[tuple[str, str]] relation type and source alias of relations pointing
+            to a given node
+        """
+        return [tuple(edge) for edge in self._query(
+            'SELECT relation, source FROM snapshot_edges WHERE target = ? ORDER BY rowid',
+            (alias,))]
+
+    def get_snapshot_names(self, aliases):
+        """
+        :type aliases set[str]
+        :rtype: dict[str, str] node alias -> its name property
+        """
+        return {
+            alias: properties.get('name')
+            for (alias, properties) in self.get_snapshot_properties(aliases).items()
+        }
+
+    def get_snapshot_properties(self, aliases):
+        """
+        :type aliases set[str]
+        :rtype: dict[str, dict] node alias -> its properties
+        """
+        return {
+            alias: json.loads(properties)
+            for (alias, properties) in self._query('SELECT alias, properties FROM snapshot_nodes')
+            if alias in aliases
+        }
+
+    def set_snapshot_nodes(self, nodes):
+        """
+        :type nodes list[tuple[str, str, str, str, list[tuple[str, str, str]]]] alias,
+            JSON-encoded properties, properties hash, relations hash and relations
+        """
+        with self.lock:
+            with self.connection:
+                self.connection.executemany(
+                    'DELETE FROM snapshot_edges WHERE source = ?',
+                    [(alias,) for (alias, _, _, _, _) in nodes])
+                self.connection.executemany(
+                    'INSERT OR REPLACE INTO snapshot_nodes '
+                    '(alias, properties, properties_hash, edges_hash) VALUES (?, ?, ?, ?)',
+                    [node[:4] for node in nodes])
+                self.connection.executemany(
+                    'INSERT INTO snapshot_edges (source, relation, target, properties) '
+                    'VALUES (?, ?, ?, ?)',
+                    [(node[0],) + edge for node in nodes for edge in node[4]])
+
+    def remove_snapshot_nodes(self, aliases):
+        """
+        Remove nodes together with their relations and the relations pointing to them
+        (the graph removes them as well). Relations of nodes that pointed to removed ones
+        are compared again the next time (their hash is reset).
+
+        :type aliases list[str]
+        """
+        params = [(alias,) for alias in aliases]
+
+        with self.lock:
+            with self.connection:
+                self.connection.executemany(
+                    "UPDATE snapshot_nodes SET edges_hash = '' WHERE alias IN "
+                    "(SELECT source FROM snapshot_edges WHERE target = ?)", params)
+
+                for table, column in (('snapshot_nodes', 'alias'), ('snapshot_edges', 'source'),
+                                      ('snapshot_edges', 'target')):
+                    self.connection.executemany(
+                        'DELETE FROM {} WHERE {} = ?'.format(table, column), params)
+
+    def clear_checkpoint(self):
+        """
+        Forget the progress of a full indexing (once it is completed)
+        """
+        with self.lock:
+            with self.connection:
+                self.connection.execute('DELETE FROM processed')
+                self.connection.execute("DELETE FROM meta WHERE key = 'checkpoint'")
+
+    def clear(self):
+        """
+        Forget everything (before a full indexing)
+        """
+        with self.lock:
+            with self.connection:
+                for table in ('revisions', 'nodes', 'meta', 'processed',
+                              'snapshot_nodes', 'snapshot_edges'):
+                    self.connection.execute('DELETE FROM {}'.format(table))
+
+
+class Checkpoint(object):
+    """
+    Tracks the progress of a full indexing, so that it can be resumed after a failure.
+
+    Relations of stored nodes are spilled to a file that is kept between runs. The progress
+    (processed pages, stored nodes, spilled and stored relations, graph dump size) is saved
+    after a batch is committed, but only when all models of processed pages were stored.
+    """
+    # pylint: disable=too-many-instance-attributes
+    def __init__(self, state, edges_filename, dump_file=None, interval=CHECKPOINT_INTERVAL,
+                 resume=False):
+        """
+        :type state IndexState
+        :type edges_filename str
+        :type dump_file file|None
+        :type interval int
+        :type resume bool continue from the last saved checkpoint (if there is one)
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.state = state
+        self.edges_filename = edges_filename
+        self.dump_file = dump_file
+        self.interval = interval
+
+        self.progress = state.get_checkpoint() if resume else None
+        self.resumed = self.progress is not None
+
+        if self.resumed:
+            self.logger.info('Resuming from %s', self.progress)
+        else:
+            self.progress = {
+                'started': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'nodes_done': False,
+                'edges_offset': 0,
+                'edges_done': 0,
+                'dump_offset': 0,
+            }
+
+        # pages (and the number of their models) passed to the graph, but not yet committed
+        self.pages = deque()
+        self.committed = 0
+        self.titles = []
+        self.saved_at = time.time()
+
+        # discard whatever was written after the last checkpoint
+        self.edges_file = open(edges_filename, 'r+t' if self.resumed else 'w+t')
+        self.edges_file.seek(self.progress['edges_offset'])
+        self.edges_file.truncate()
+
+        if self.dump_file is not None:
+            self.dump_file.seek(self.progress['dump_offset'])
+            self.dump_file.truncate()
+
+    def iter_models(self, pages):
+        """
+        Yield models of given pages and keep track of them
+
+        :type pages collections.Iterable[tuple[str, list[grapher.models.BaseModel]]]
+        :rtype: list[grapher.models.BaseModel]
+        """
+        for (title, models) in pages:
+            self.pages.append((title, len(models)))
+            yield from models
+
+    def nodes_committed(self, models_count, names):
+        """
+        Called when a batch of nodes was stored
+
+        :type models_count int
+        :type names dict[str, str]
+        """
+        self.committed += models_count
+
+        while self.pages and self.pages[0][1] <= self.committed:
+            (title, count) = self.pages.popleft()
+            self.committed -= count
+            self.titles.append(title)
+
+        # do not save when only some models of a page were stored
+        if self.committed == 0:
+            self.progress['edges_offset'] = self.edges_file.tell()
+            self._save(names)
+
+    def nodes_done(self, names):
+        """
+        Called when all nodes were stored
+
+        :type names dict[str, str]
+        """
+        self.titles += [title for (title, _) in self.pages]
+        self.pages.clear()
+
+        self.progress['nodes_done'] = True
+        self.progress['edges_offset'] = self.edges_file.tell()
+        self._save(names, force=True)
+
+    def edges_committed(self, edges_count, names):
+        """
+        Called when a batch of edges (spilled to the file) was stored
+
+        :type edges_count int
+        :type names dict[str, str]
+        """
+        self.progress['edges_done'] += edges_count
+        self._save(names)
+
+    def _save(self, names, force=False):
+        """
+        :type names dict[str, str]
+        :type force bool
+        """
+        if not force and time.time() - self.saved_at < self.interval:
+            return
+
+        self.edges_file.flush()
+
+        if self.dump_file is not None:
+            self.dump_file.flush()
+            self.progress['dump_offset'] = self.dump_file.tell()
+
+        self.state.set_checkpoint(self.progress, self.titles, names)
+        self.logger.info('Checkpoint saved (%d pages): %s', len(self.titles), self.progress)
+
+        self.titles = []
+        self.saved_at = time.time()
+
+    def finish(self):
+        """
+        Called when the indexing was completed
+        """
+        self.edges_file.close()
+        remove(self.edges_filename)
+
+        self.state.clear_checkpoint()
@@ -2,6 +2,7 @@
 Utility functions
 """
 import re
+from itertools import islice
 
 
 def extract_link(text):
@@ -51,3 +52,22 @@ def extract_number(text):
         return int(value)
 
     return None
+
+
+def chunks(iterable, size):
+    """
+    Split a given iterable into lists of up to size items, consumes the iterable lazily
+
+    :type iterable collections.Iterable
+    :type size int
+    :rtype: list[list]
+    """
+    iterator = iter(iterable)
+
+    while True:
+        chunk = list(islice(iterator, size))
+
+        if not chunk:
+            return
+
+        yield chunk
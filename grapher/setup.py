@@ -20,12 +20,15 @@ setup(
     install_requires=[
         'data-flow-graph==0.4',  # for generating dot files (graphviz) that are visualized as a graph
         'mwclient==0.9.3',
+        'numpy>=1.16.0',  # for in-process graph analytics
+        'redis>=4.2.0',  # redis.asyncio (and health_check_interval of connection pools)
         'redisgraph==1.5',
         'requests==2.21.0',
     ],
     entry_points={
         'console_scripts': [
             'index_football_wiki=grapher.scripts.index_football_wiki:index',
+            'migrate_football_wiki_cache=grapher.scripts.index_football_wiki:migrate_cache',
             'query_football_graph=grapher.scripts.query_football_graph:index',
             'query_football_squad=grapher.scripts.query_football_graph:squads',
         ],
@@ -0,0 +1,187 @@
+"""
+Set of unit tests for in-process graph analytics
+"""
+import random
+from collections import deque
+
+from grapher.graph import RedisGraph
+from grapher.graph.analytics import CSRGraph
+from grapher.models import PersonModel, SportsTeamModel
+
+
+def get_nodes(count):
+    return [('Person', 'Player #{}'.format(node)) for node in range(count)]
+
+
+def get_distances(edges, size, source):
+    """
+    Plain breadth-first search
+    """
+    neighbours = [[] for _ in range(size)]
+
+    for (node_a, node_b) in edges:
+        neighbours[node_a].append(node_b)
+        neighbours[node_b].append(node_a)
+
+    distances = {source: 0}
+    queue = deque([source])
+
+    while queue:
+        node = queue.popleft()
+
+        for neighbour in neighbours[node]:
+            if neighbour not in distances:
+                distances[neighbour] = distances[node] + 1
+                queue.append(neighbour)
+
+    return distances
+
+
+def test_csr_graph():
+    # 0 - 1 - 2 - 3   4 - 5   6
+    #      \_____/
+    graph = CSRGraph(get_nodes(7), [0, 1, 2, 1, 4, 1], [1, 2, 3, 3, 5, 0])
+
+    assert len(graph) == 7
+    assert graph.get_edges_count() == 10  # repeated edge is kept once, both directions
+
+    assert graph.get_neighbours(1).tolist() == [0, 2, 3]
+    assert graph.get_degrees().tolist() == [1, 3, 2, 2, 1, 1, 0]
+    assert graph.get_node_id('Person', 'Player #3') == 3
+    assert graph.get_node_id('Person', 'Foo') is None
+
+    assert graph.shortest_path(0, 3) == [0, 1, 3]
+    assert graph.shortest_path(3, 0) == [3, 1, 0]
+    assert graph.shortest_path(2, 2) == [2]
+    assert graph.shortest_path(0, 5) is None
+    assert graph.shortest_path(0, 6) is None
+
+    (nodes, distances) = graph.get_neighbourhood(0, hops=1)
+    assert (nodes.tolist(), distances.tolist()) == ([1], [1])
+
+    (nodes, distances) = graph.get_neighbourhood(0, hops=5)
+    assert (nodes.tolist(), distances.tolist()) == ([1, 2, 3], [1, 2, 2])
+
+    assert graph.get_components().tolist() == [0, 0, 0, 0, 4, 4, 6]
+    assert graph.get_components_sizes(limit=2) == [(0, 4), (4, 2)]
+
+    assert graph.rank_by_degree(limit=2) == [(1, 3), (2, 2)]
+
+    ranks = graph.get_pagerank()
+    assert abs(ranks.sum() - 1) < 1e-6
+    assert [node_id for (node_id, _) in graph.rank_by_pagerank(limit=1)] == [1]
+
+
+def test_csr_graph_directed():
+    # 0 -> 1 -> 2, 3 -> 2
+    graph = CSRGraph(get_nodes(4), [0, 1, 3], [1, 2, 2], directed=True)
+
+    assert graph.shortest_path(0, 2) == [0, 1, 2]
+    assert graph.shortest_path(2, 0) is None
+    assert graph.shortest_path(0, 3) is None
+
+    # weakly connected
+    assert graph.get_components().tolist() == [0, 0, 0, 0]
+
+    (nodes, _) = graph.get_neighbourhood(3, hops=2)
+    assert nodes.tolist() == [2]
+
+
+def test_csr_graph_random():
+    generator = random.Random(42)
+    size = 500
+
+    edges = [(generator.randrange(size), generator.randrange(size)) for _ in range(600)]
+    graph = CSRGraph(get_nodes(size), [edge[0] for edge in edges], [edge[1] for edge in edges])
+
+    for _ in range(50):
+        (source, target) = (generator.randrange(size), generator.randrange(size))
+        distances = get_distances(edges, size, source)
+
+        path = graph.shortest_path(source, target)
+
+        if target not in distances:
+            assert path is None
+            continue
+
+        assert len(path) == distances[target] + 1
+        assert (path[0], path[-1]) == (source, target)
+
+        # each step follows an edge
+        for (node_a, node_b) in zip(path, path[1:]):
+            assert node_b in graph.get_neighbours(node_a)
+
+    # nodes are in the same component when there is a path between them
+    components = graph.get_components()
+    distances = get_distances(edges, size, 0)
+
+    assert sorted(int(node) for node in (components == components[0]).nonzero()[0]) == \
+        sorted(distances.keys())
+
+    (nodes, hops) = graph.get_neighbourhood(0, hops=3)
+    assert dict(zip(nodes.tolist(), hops.tolist())) == {
+        node: distance for (node, distance) in distances.items() if 0 < distance <= 3
+    }
+
+
+def get_graph():
+    graph = RedisGraph(host='foo')
+
+    for (name, clubs) in (
+            ('Analytics Player A', ['Analytics Club X']),
+            ('Analytics Player B', ['Analytics Club X', 'Analytics Club Y']),
+            ('Analytics Player C', ['Analytics Club Y']),
+    ):
+        player = PersonModel(name=name)
+
+        for club in clubs:
+            player.add_relation('athlete', SportsTeamModel.get_node_id_by_name(club),
+                                {'since': 2000})
+
+        player.add_relation('nationality', 'Iceland:Country')
+        graph.add(player)
+
+    return graph
+
+
+def test_from_models():
+    graph = get_graph()
+
+    for models in (graph.models, list(graph.models)):
+        analytics = CSRGraph.from_models(models, relations=['athlete'])
+
+        source = analytics.get_node_id('Person', 'Analytics Player A')
+        target = analytics.get_node_id('Person', 'Analytics Player C')
+
+        # A and B played for X, B and C played for Y
+        assert [analytics.get_node(node)[1] for node in analytics.shortest_path(source, target)] \
+            == ['Analytics Player A', 'Analytics Club X', 'Analytics Player B',
+                'Analytics Club Y', 'Analytics Player C']
+
+        assert [analytics.get_node(node_id) for (node_id, _) in
+                analytics.rank_by_degree(limit=2, node_type='SportsTeam')] == \
+            [('SportsTeam', 'Analytics Club X'), ('SportsTeam', 'Analytics Club Y')]
+
+    # all relations, players are connected via their nationality
+    analytics = CSRGraph.from_models(graph.models)
+
+    assert len(analytics.shortest_path(
+        analytics.get_node_id('Person', 'Analytics Player A'),
+        analytics.get_node_id('Person', 'Analytics Player C'))) == 3
+
+
+def test_from_bulk(tmpdir):
+    get_graph().dump_bulk('football', str(tmpdir))
+
+    analytics = CSRGraph.from_bulk(str(tmpdir), 'football', relations=['athlete'])
+
+    assert len(analytics) == 6  # three players, two clubs and a country
+    assert analytics.get_node(0) == ('Country', 'Iceland')
+
+    path = analytics.shortest_path(analytics.get_node_id('Person', 'Analytics Player A'),
+                                   analytics.get_node_id('Person', 'Analytics Player C'))
+    assert len(path) == 5
+
+    # relations with no properties
+    analytics = CSRGraph.from_bulk(str(tmpdir), 'football', relations=['nationality'])
+    assert analytics.rank_by_degree(limit=1) == [(0, 3)]
@@ -0,0 +1,155 @@
+"""
+Set of unit tests for asynchronous graph queries
+"""
+import asyncio
+
+from grapher.graph.async_client import AsyncQueryClient, run
+from grapher.graph.views import RedisViews
+from grapher.scripts import query_football_graph
+from grapher.scripts.query_football_graph import RESULTS, query_redis_many, squads_for_clubs
+
+from test_views import FakePipeline as FakeViewsPipeline, FakeRedis, get_views
+
+
+class FakeAsyncRedis(object):
+    """
+    Answers each query with its text, records pipelines
+    """
+    def __init__(self, keys=None):
+        self.keys = keys or {}
+        self.pipelines = []
+
+        self.running = 0
+        self.max_running = 0
+
+    async def get(self, key):
+        return self.keys.get(key)
+
+    def pipeline(self, transaction=True):
+        assert transaction is False
+        return FakePipeline(self)
+
+
+class FakePipeline(object):
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def execute_command(self, *args):
+        self.commands.append(args)
+
+    async def execute(self):
+        self.redis.pipelines.append(self.commands)
+        self.redis.running += 1
+        self.redis.max_running = max(self.redis.max_running, self.redis.running)
+
+        # let other pipelines run
+        await asyncio.sleep(0.01)
+        self.redis.running -= 1
+
+        return [
+            [[[b'graph', b'query', b'number'], [graph.encode(), query.encode(), b'1.000000']], []]
+            for (_, graph, query) in self.commands
+        ]
+
+
+def get_client(redis, **kwargs):
+    client = AsyncQueryClient(host='foo', **kwargs)
+    client.get_connection = lambda: redis
+
+    return client
+
+
+def test_query_many():
+    redis = FakeAsyncRedis(keys={'graph:football:current': b'football:blue'})
+    client = get_client(redis, concurrency=2, pipeline_size=3)
+
+    queries = ['RETURN {}'.format(index) for index in range(10)]
+    results = run(client.query_many('football', queries))
+
+    assert [list(result.iter_tuples()) for result in results] == [
+        [('football:blue', query, 1)] for query in queries
+    ]
+
+    # four pipelines, two of them at a time
+    assert [len(commands) for commands in redis.pipelines] == [3, 3, 3, 1]
+    assert redis.max_running == 2
+
+    assert list(run(client.query('football', 'RETURN 1')))[0].query == 'RETURN 1'
+
+
+def test_query_redis_many():
+    redis = FakeAsyncRedis(keys={'graph:football:version': b'3'})
+    client = get_client(redis)
+
+    requests = [('current_squad', {'club': club}) for club in ('Foo', 'Bar')]
+
+    results = run(query_redis_many(client, 'football', requests))
+    assert [list(result)[0].query for result in results] == [
+        'MATCH (t:SportsTeam)-[a:athlete]->(p:Person) WHERE t.name = "Foo" '
+        'RETURN p.name AS name, a.position AS position ,a.number AS number',
+        'MATCH (t:SportsTeam)-[a:athlete]->(p:Person) WHERE t.name = "Bar" '
+        'RETURN p.name AS name, a.position AS position ,a.number AS number',
+    ]
+
+    # only the query that was not asked before is sent
+    requests.append(('current_squad', {'club': 'Baz'}))
+
+    cached = run(query_redis_many(client, 'football', requests))
+    assert [list(result) for result in cached[:2]] == [list(result) for result in results]
+    assert list(cached[2])[0].graph == 'football'
+
+    assert [len(commands) for commands in redis.pipelines] == [2, 1]
+
+    RESULTS.entries.clear()
+
+
+class CountingRedis(FakeRedis):
+    """
+    Counts round trips, a pipeline is a single one
+    """
+    def __init__(self):
+        super().__init__()
+        self.round_trips = 0
+
+    def get(self, key):
+        self.round_trips += 1
+        return super().get(key)
+
+    def pipeline(self, transaction=True):
+        assert transaction is False
+        return CountingPipeline(self)
+
+
+class CountingPipeline(FakeViewsPipeline):
+    def execute(self):
+        self.redis.round_trips += 1
+        return super().execute()
+
+
+def test_squads_for_clubs(tmpdir, monkeypatch):
+    redis = CountingRedis()
+    views = RedisViews(redis, 'football')
+    views.store(get_views(tmpdir))
+
+    monkeypatch.setattr(query_football_graph, 'get_views', lambda: views)
+    monkeypatch.setattr(query_football_graph, 'get_temporal_index', lambda: None)
+
+    clubs = ['Liverpool F.C.', 'Chelsea F.C.', 'Everton F.C.']
+
+    # the generation and a single pipeline, regardless of the number of clubs
+    redis.round_trips = 0
+    squads = squads_for_clubs(clubs)
+
+    assert redis.round_trips == 2
+    assert [squad['name'] for squad in squads] == [
+        '{} squad (2019)'.format(club) for club in clubs]
+    assert [player['name'] for player in squads[0]['formations']['FW']] == ['Mohamed Salah']
+    assert squads[2]['formations'] == {}
+
+    redis.round_trips = 0
+    squads = squads_for_clubs(clubs, year=2015)
+
+    assert redis.round_trips == 2
+    assert squads[1]['formations'] == {'FW': [{'name': 'Mohamed Salah'}]}
+    assert squads[0]['formations'] == {'MF': [{'name': 'Jordan Henderson'}]}
@@ -0,0 +1,112 @@
+"""
+Bulk insert files test suite
+"""
+import json
+import struct
+
+from grapher.graph import RedisGraph
+from grapher.graph.bulk import pack_value
+from grapher.models import PersonModel, SportsTeamModel
+
+
+def read_string(data, offset):
+    end = data.index(b'\0', offset)
+    return data[offset:end].decode('utf-8'), end + 1
+
+
+def read_header(data):
+    (name, offset) = read_string(data, 0)
+    (count,) = struct.unpack_from('=I', data, offset)
+    offset += 4
+
+    keys = []
+    for _ in range(count):
+        (key, offset) = read_string(data, offset)
+        keys.append(key)
+
+    return name, keys, offset
+
+
+def read_value(data, offset):
+    (value_type,) = struct.unpack_from('=B', data, offset)
+    offset += 1
+
+    if value_type == 0:
+        return None, offset
+    if value_type == 1:
+        return struct.unpack_from('=?', data, offset)[0], offset + 1
+    if value_type == 2:
+        return struct.unpack_from('=d', data, offset)[0], offset + 8
+
+    return read_string(data, offset)
+
+
+def read_file(filename, relations=False):
+    with open(filename, 'rb') as file:
+        data = file.read()
+
+    (name, keys, offset) = read_header(data)
+    rows = []
+
+    while offset < len(data):
+        row = []
+
+        if relations:
+            row += struct.unpack_from('=QQ', data, offset)
+            offset += 16
+
+        for _ in keys:
+            (value, offset) = read_value(data, offset)
+            row.append(value)
+
+        rows.append(tuple(row))
+
+    return name, keys, rows
+
+
+def test_pack_value():
+    assert pack_value(None) == b'\x00'
+    assert pack_value(True) == b'\x01\x01'
+    assert pack_value(2) == b'\x02' + struct.pack('=d', 2.0)
+    assert pack_value('Malmö') == b'\x03Malm\xc3\xb6\x00'
+
+
+def test_dump_bulk(tmpdir):
+    graph = RedisGraph(host='foo')
+
+    zlatan = PersonModel(name='Zlatan Ibrahimović')
+    zlatan.add_property('height', 1.95)
+    zlatan.add_relation('athlete', 'Malm_FF:SportsTeam', {'since': 1999, 'until': 2001})
+    zlatan.add_relation('athlete', 'Ajax:SportsTeam', {'since': 2001})
+
+    malmo = SportsTeamModel(name='Malmö FF')
+    malmo.add_property('sport', 'Football')
+    malmo.add_relation('coach', 'Magnus_Pehrsson:Person')
+
+    graph.add(zlatan)
+    graph.add(malmo)
+
+    manifest = graph.dump_bulk('football', str(tmpdir))
+
+    assert manifest == json.loads(tmpdir.join('football.json').read())
+    assert manifest['nodes'] == [
+        {'file': 'nodes_Person.bin', 'label': 'Person', 'count': 2},
+        {'file': 'nodes_SportsTeam.bin', 'label': 'SportsTeam', 'count': 2},
+    ]
+    assert manifest['relations'] == [
+        {'file': 'relations_athlete.bin', 'type': 'athlete', 'count': 2},
+        {'file': 'relations_coach.bin', 'type': 'coach', 'count': 1},
+    ]
+
+    # missing nodes are added
+    assert read_file(str(tmpdir.join('nodes_Person.bin'))) == (
+        'Person', ['name', 'height'], [('Zlatan Ibrahimović', 1.95), ('Magnus_Pehrsson', None)])
+    assert read_file(str(tmpdir.join('nodes_SportsTeam.bin'))) == (
+        'SportsTeam', ['name', 'sport'], [('Malmö FF', 'Football'), ('Ajax', None)])
+
+    # node IDs follow the order of files, GRAPH.BULK does not take relations properties
+    assert read_file(str(tmpdir.join('relations_athlete.bin')), relations=True) == (
+        'athlete', [], [(0, 2), (0, 3)])
+    assert read_file(str(tmpdir.join('relations_coach.bin')), relations=True) == (
+        'coach', [], [(2, 1)])
+
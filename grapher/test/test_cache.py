@@ -0,0 +1,107 @@
+import json
+import time
+
+from grapher.cache import CacheEntry, DirectoryCache, MemoryCache, SqliteCache, \
+    migrate_directory_cache
+
+
+def test_directory_cache(tmpdir):
+    cache = DirectoryCache(str(tmpdir))
+
+    cache.set('templates', 'Foo', '{"title": "Foo"}')
+
+    assert cache.get_filename('templates', 'Foo').endswith('/templates_1356c67d7ad1638d816bfb822dd2c25d.json')
+    assert tmpdir.join('templates_1356c67d7ad1638d816bfb822dd2c25d.json').read() == '{"title": "Foo"}'
+
+    assert cache.get('templates', 'Foo') == '{"title": "Foo"}'
+    assert cache.get('templates', 'Bar') is None
+    assert cache.get_many('templates', ['Foo', 'Bar']) == {'Foo': '{"title": "Foo"}'}
+
+    stats = cache.get_stats()
+    assert stats['entries'] == 1
+    assert stats['size'] == 16
+    assert stats['hits'] == 2
+    assert stats['misses'] == 2
+    assert stats['hit_ratio'] == 0.5
+
+
+def test_sqlite_cache(tmpdir):
+    cache = SqliteCache(str(tmpdir.join('cache.sqlite')))
+    value = json.dumps({'title': 'Zlatan Ibrahimović', 'templates': ['foo'] * 1000})
+
+    cache.set_many('templates', {'Zlatan Ibrahimović': value, 'Foo': '{}'})
+    cache.set('templates', 'Foo', '{"foo": 1}')
+
+    assert cache.get('templates', 'Zlatan Ibrahimović') == value
+    assert cache.get('templates', 'Foo') == '{"foo": 1}', 'Entries can be replaced'
+    assert cache.get('other', 'Foo') is None, 'Entries of different types are kept separately'
+
+    names = ['Page {}'.format(i) for i in range(1200)]
+    assert cache.get_many('templates', names + ['Foo']) == {'Foo': '{"foo": 1}'}
+
+    stats = cache.get_stats()
+
+    assert stats['entries'] == 2
+    assert stats['size'] < len(value), 'Values should be compressed'
+    assert stats['hits'] == 3
+    assert stats['misses'] == 1201
+
+    # the database is persistent
+    cache.close()
+    assert SqliteCache(str(tmpdir.join('cache.sqlite'))).get('templates', 'Foo') == '{"foo": 1}'
+
+
+def test_migrate_directory_cache(tmpdir):
+    source = DirectoryCache(str(tmpdir.mkdir('json')))
+    source.set('templates', 'Foo', '{"title": "Foo"}')
+    source.set('templates', 'Bar', '{"title": "Bar"}')
+    source.set('templates', 'Baz', '{"title": "Not Baz"}')
+    source.set('templates', 'Broken', '{"ti')
+
+    target = SqliteCache(str(tmpdir.join('cache.sqlite')))
+
+    assert migrate_directory_cache(source, target, 'templates', batch_size=1) == (2, 2)
+
+    assert target.get_many('templates', ['Foo', 'Bar', 'Baz']) == \
+        {'Foo': '{"title": "Foo"}', 'Bar': '{"title": "Bar"}'}
+
+
+def test_memory_cache():
+    cache = MemoryCache(max_entries=2)
+
+    cache.set('football@1', 'foo', '[]')
+    cache.set('football@1', 'bar', '[{"name": "Bar"}]')
+
+    assert cache.get('football@1', 'foo') == '[]'
+    assert cache.get('football@2', 'foo') is None
+
+    # "bar" was used least recently
+    cache.set('football@2', 'foo', '[{"name": "Foo"}]')
+
+    assert cache.get_many('football@1', ['foo', 'bar']) == {'foo': '[]'}
+    assert cache.get('football@2', 'foo') == '[{"name": "Foo"}]'
+
+    stats = cache.get_stats()
+    assert stats['entries'] == 2
+    assert stats['size'] == 19
+    assert stats['hits'] == 3
+    assert stats['misses'] == 2
+    assert stats['evicted'] == 1
+
+
+def test_cache_ttl(tmpdir):
+    for cache in (DirectoryCache(str(tmpdir), ttl=60), SqliteCache(str(tmpdir.join('cache.sqlite')), ttl=60),
+                  MemoryCache(ttl=60)):
+        cache.set('templates', 'Foo', CacheEntry('foo', '"v1"', None, time.time() - 120))
+        cache.set('templates', 'Bar', 'bar')
+
+        assert cache.get_many('templates', ['Foo', 'Bar']) == {'Bar': 'bar'}, 'Stale entries are skipped'
+        assert cache.get_entries('templates', ['Foo'])['Foo'].value == 'foo'
+
+        cache.touch_many('templates', ['Foo'])
+        assert cache.get('templates', 'Foo') == 'foo'
+
+        stats = cache.get_stats()
+        assert stats['stale'] == 2
+        assert stats['hits'] == 2
+        assert stats['revalidated'] == 1
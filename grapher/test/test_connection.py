@@ -0,0 +1,42 @@
+"""
+Set of unit tests for shared Redis connections
+"""
+from grapher.graph import RedisGraph
+from grapher.graph.connection import POOL_SETTINGS, get_pool, close_pools
+
+
+def test_pool_is_shared():
+    first = RedisGraph(host='foo', port=1234)
+    second = RedisGraph(host='foo', port=1234)
+
+    pool = first.get_connection().connection_pool
+
+    assert second.get_connection().connection_pool is pool
+    assert first.get_redisgraph('football').redis_con.connection_pool is pool
+
+    assert pool.max_connections == POOL_SETTINGS['max_connections']
+    assert pool.connection_kwargs['host'] == 'foo'
+    assert pool.connection_kwargs['port'] == 1234
+    assert pool.connection_kwargs['health_check_interval'] == \
+        POOL_SETTINGS['health_check_interval']
+
+    # other server
+    assert RedisGraph(host='bar', port=1234).get_connection().connection_pool is not pool
+
+    close_pools()
+    assert get_pool('foo', 1234) is not pool
+
+
+def test_pool_settings():
+    pool = RedisGraph(host='foo', pool_settings={'max_connections': 2, 'socket_timeout': 1}).\
+        get_connection().connection_pool
+
+    assert pool.max_connections == 2
+    assert pool.connection_kwargs['socket_timeout'] == 1
+    assert pool.connection_kwargs['socket_connect_timeout'] == \
+        POOL_SETTINGS['socket_connect_timeout']
+
+    assert get_pool('foo', 6379, {'max_connections': 2, 'socket_timeout': 1}) is pool
+    assert get_pool('foo', 6379) is not pool
+
+    close_pools()
@@ -0,0 +1,162 @@
+"""
+Snapshot diffing test suite
+"""
+import json
+
+from grapher.graph import RedisGraph
+from grapher.graph.delta import Delta, record_snapshot
+from grapher.models import PersonModel
+from grapher.state import IndexState
+
+
+def get_models(version):
+    graham = PersonModel(name='Graham Chapman')
+    graham.add_property('birthDate', 1941)
+
+    john = PersonModel(name='John Cleese')
+    john.add_relation('plays_with', graham.get_node_name())
+    john.add_relation('plays_with', 'Michael_Palin:Person', {'since': 1969})
+
+    eric = PersonModel(name='Eric Idle')
+    eric.add_property('height', 1.8)
+
+    if version == 1:
+        return [graham, john, eric]
+
+    # Graham gets a new property, John has a relation changed
+    graham.add_property('height', 1.88)
+    john.relations[1] = (john.relations[1][0], john.relations[1][1], {'since': 1970})
+
+    terry = PersonModel(name='Terry Jones')
+    terry.add_relation('plays_with', john.get_node_name())
+
+    return [graham, john, terry]
+
+
+def test_delta(tmpdir):
+    state = IndexState(str(tmpdir.join('state.sqlite')))
+    graph = RedisGraph(host='foo')
+
+    # the graph was stored from scratch
+    names = dict()
+    list(graph.iter_queries(record_snapshot(state, get_models(1)), names=names))
+
+    assert len(state.get_snapshot()) == 3
+
+    # nothing has changed
+    delta = Delta(state)
+    assert list(graph.iter_delta_queries(delta.iter_changes(get_models(1)), names)) == []
+    assert delta.summary['unchanged'] == 3
+
+    delta = Delta(state)
+    batches = list(graph.iter_delta_queries(delta.iter_changes(get_models(2)), names))
+
+    assert batches == [[
+        'MERGE (n:Person{name:"Graham Chapman"}) SET n.name="Graham Chapman", n.birthDate=1941, '
+        'n.height=1.88',
+        'MERGE (n:Person{name:"John Cleese"}) SET n.name="John Cleese"',
+        'MATCH (src:Person{name:"John Cleese"})-[r:plays_with]->(dst:Person{name:"Michael_Palin"}) '
+        'DELETE r',
+        'CREATE INDEX ON :Person(name)',
+        'MATCH (src:Person{name:"John Cleese"}),(dst:Person{name:"Michael_Palin"}) '
+        'CREATE (src)-[:plays_with{since:1970}]->(dst)',
+        'MERGE (n:Person{name:"Terry Jones"}) SET n.name="Terry Jones"',
+        'MATCH (src:Person{name:"Terry Jones"}),(dst:Person{name:"John Cleese"}) '
+        'CREATE (src)-[:plays_with]->(dst)',
+        'MATCH (n:Person{name:"Eric Idle"}) DELETE n',
+    ]]
+
+    summary = json.loads(json.dumps(delta.get_summary()))
+
+    assert summary['summary'] == {
+        'created': 1, 'updated': 2, 'removed': 1, 'unchanged': 0,
+        'edges_created': 2, 'edges_removed': 1,
+    }
+    assert summary['changes'][1] == {
+        'node': 'John_Cleese:Person',
+        'change': 'updated',
+        'removed_properties': [],
+        'edges_removed': [['plays_with', 'Michael_Palin:Person']],
+        'edges_created': [['plays_with', 'Michael_Palin:Person']],
+    }
+
+    assert 'Eric_Idle:Person' not in names
+    assert names['Terry_Jones:Person'] == 'Terry Jones'
+
+    # the snapshot is up to date once changes are committed
+    delta.commit()
+    assert sorted(state.get_snapshot().keys()) == \
+        ['Graham_Chapman:Person', 'John_Cleese:Person', 'Terry_Jones:Person']
+
+    delta = Delta(state)
+    assert list(graph.iter_delta_queries(delta.iter_changes(get_models(2)), names)) == []
+
+    # a property was removed, only changed pages are given
+    graham = PersonModel(name='Graham Chapman')
+    delta = Delta(state, full=False)
+    batches = list(graph.iter_delta_queries(delta.iter_changes([graham]), names))
+
+    assert batches == [[
+        'MERGE (n:Person{name:"Graham Chapman"}) SET n.name="Graham Chapman", n.birthDate=NULL, '
+        'n.height=NULL',
+    ]]
+
+
+def test_delta_removed_node(tmpdir):
+    state = IndexState(str(tmpdir.join('state.sqlite')))
+    graph = RedisGraph(host='foo')
+
+    names = dict()
+    list(graph.iter_queries(record_snapshot(state, get_models(1)), names=names))
+
+    # Graham is removed, John's relation to him is removed from the graph as well
+    (_, john, eric) = get_models(1)
+    delta = Delta(state)
+    list(graph.iter_delta_queries(delta.iter_changes([john, eric]), names))
+
+    summary = delta.get_summary()
+    assert dict(summary['summary']) == {
+        'created': 0, 'updated': 0, 'removed': 1, 'unchanged': 2,
+        'edges_created': 0, 'edges_removed': 1,
+    }
+    assert summary['changes'][0]['incoming_edges_removed'] == [
+        ['plays_with', 'John_Cleese:Person']]
+
+    delta.commit()
+    assert state.get_snapshot_node('John_Cleese:Person')[1] == [
+        ('plays_with', 'Michael_Palin:Person', '{"since": 1969}')]
+
+    # the relation is created again (with a missing node) the next time John is compared
+    delta = Delta(state)
+    batches = list(graph.iter_delta_queries(delta.iter_changes([john, eric]), names))
+
+    assert batches == [[
+        'MERGE (n:Person{name:"John Cleese"}) SET n.name="John Cleese"',
+        'CREATE (Graham_Chapman:Person{name:"Graham_Chapman"})',
+        'CREATE INDEX ON :Person(name)',
+        'MATCH (src:Person{name:"John Cleese"}),(dst:Person{name:"Graham_Chapman"}) '
+        'CREATE (src)-[:plays_with]->(dst)',
+    ]]
+
+
+def test_delta_escaped_values(tmpdir):
+    state = IndexState(str(tmpdir.join('state.sqlite')))
+    graph = RedisGraph(host='foo')
+
+    names = dict()
+    list(graph.iter_queries(record_snapshot(state, get_models(1)), names=names))
+
+    # an empty string and a value with quotes and a backslash
+    (graham, john, eric) = get_models(1)
+    graham.add_property('birthPlace', '')
+    eric.add_property('nickname', 'The "Idle" \\ One')
+
+    delta = Delta(state)
+    batches = list(graph.iter_delta_queries(delta.iter_changes([graham, john, eric]), names))
+
+    assert batches == [[
+        'MERGE (n:Person{name:"Graham Chapman"}) SET n.name="Graham Chapman", n.birthDate=1941, '
+        'n.birthPlace=""',
+        'MERGE (n:Person{name:"Eric Idle"}) SET n.name="Eric Idle", n.height=1.8, '
+        'n.nickname="The \\"Idle\\" \\\\ One"',
+    ]]
@@ -183,3 +183,23 @@ def test_burnley():
     assert team.get_relation_targets('coach') == ['Sean_Dyche:Person']
 
     assert len(team.get_relation_targets('athlete')) == 37
+
+
+def test_templates_are_parsed_once():
+    source = FootballWikiSource()
+    source.set_content(read_fixture('manchester_united.json'))
+
+    decoded = []
+    get_content_json = source.get_content_json
+    source.get_content_json = lambda: decoded.append(True) or get_content_json()
+
+    assert len(list(source.get_models())) == 1
+    assert len(source.get_templates_of_type('Fs player')) == 29
+    assert source.get_templates_of_type('Infobox Club')[0].get_page_title() == 'Manchester United F.C.'
+    assert source.get_templates_of_type('Foo') == []
+    assert len(decoded) == 1, 'Content should be decoded only once'
+
+    # new content is parsed again
+    source.set_content(read_fixture('zlatan.json'))
+    assert source.get_templates_of_type('Fs player') == []
+    assert len(decoded) == 2
@@ -1,5 +1,11 @@
+import gzip
+import io
+
+import pytest
+
 from grapher.models import PersonModel
 from grapher.graph import RedisGraph
+from grapher.graph.redis import StagingError
 
 
 def test_dump():
@@ -24,3 +30,247 @@ def test_dump():
     assert '(Graham_Chapman:Person{name:\\"Graham Chapman\\"})' in dump
     assert '(John_Cleese:Person{name:\\"John Cleese\\"})' in dump
     assert '(John_Cleese:Person)-[:plays_with]->(Graham_Chapman:Person)' in dump
+
+
+def test_dump_to_files(tmpdir):
+    graph = RedisGraph(host='foo')
+
+    for index in range(5):
+        model = PersonModel(name='Member #{}'.format(index))
+        model.add_relation('plays_with', 'Member_{}:Person'.format((index + 1) % 5))
+        graph.add(model)
+
+    output = io.StringIO()
+    assert graph.dump_to_file('circus', output, batch_size=2) == 9
+
+    lines = output.getvalue().splitlines()
+    assert lines[0] == 'GRAPH.QUERY circus "CREATE (Member_0:Person{name:\\"Member #0\\"}),' \
+                       '(Member_1:Person{name:\\"Member #1\\"})"'
+    assert lines[3] == 'GRAPH.QUERY circus "CREATE INDEX ON :Person(name)"'
+    assert lines[4].startswith('GRAPH.QUERY circus "MATCH')
+
+    # split into parts and compressed
+    filenames = graph.dump_to_files('circus', str(tmpdir.join('circus.graph')), parts=3,
+                                    compress=True, batch_size=2)
+
+    assert filenames == [str(tmpdir.join('circus.graph.{}.gz'.format(part))) for part in (1, 2, 3)]
+
+    parts = []
+    for filename in filenames:
+        with gzip.open(filename, 'rt') as file:
+            parts.append(file.read().splitlines())
+
+    assert [len(part) for part in parts] == [2, 4, 3]
+    assert sum(parts, []) == lines
+
+    # parts are created even when there is not much to dump
+    filenames = graph.dump_to_files('circus', str(tmpdir.join('circus.graph')), parts=10,
+                                    batch_size=2)
+    assert sum([open(filename).read().splitlines() for filename in filenames], []) == lines
+
+
+def test_iter_queries():
+    graph = RedisGraph(host='foo')
+
+    graham = PersonModel(name='Graham Chapman')
+
+    john = PersonModel(name='John "Faxe" Cleese')
+    john.add_relation('plays_with', graham.get_node_name())
+    john.add_relation('plays_with', 'Michael_Palin:Person', properties={'since': 1969})
+
+    eric = PersonModel(name='Eric Idle')
+
+    batches = list(graph.iter_queries(iter([john, graham, eric]), batch_size=2))
+
+    # two batches of nodes, then a batch of edges
+    assert len(batches) == 3
+
+    assert batches[0] == ['CREATE (John_Faxe_Cleese:Person{name:"John \\"Faxe\\" Cleese"}),'
+                          '(Graham_Chapman:Person{name:"Graham Chapman"})']
+    assert batches[1] == ['CREATE (Eric_Idle:Person{name:"Eric Idle"})']
+
+    assert batches[2] == [
+        # missing node is added
+        'CREATE (Michael_Palin:Person{name:"Michael_Palin"})',
+        # nodes are matched by name using the index
+        'CREATE INDEX ON :Person(name)',
+        'MATCH (src:Person{name:"John \\"Faxe\\" Cleese"}),(dst:Person{name:"Graham Chapman"}) '
+        'CREATE (src)-[:plays_with]->(dst)',
+        'MATCH (src:Person{name:"John \\"Faxe\\" Cleese"}),(dst:Person{name:"Michael_Palin"}) '
+        'CREATE (src)-[:plays_with{since:1969}]->(dst)',
+    ]
+
+
+class FakeRedis(object):
+    """
+    Records commands sent to Redis (directly or over a pipeline)
+    """
+    def __init__(self, counts=None, missing=None):
+        self.commands = []
+        self.responses = []
+        self.keys = {}
+        self.counts = counts or {}
+        self.missing = missing or set()  # names of nodes that edge queries do not match
+
+    def execute_command(self, *args):
+        self.commands.append(args)
+        response = None
+
+        # MATCH (n) RETURN count(n)
+        if args[0] == 'GRAPH.QUERY' and 'count(' in args[2]:
+            response = [[[b'count'], [str(self.counts[args[1]][args[2]]).encode()]], []]
+
+        # MATCH (src:Person{name:"..."}),(dst:Person{name:"..."}) CREATE (src)-[...]->(dst)
+        elif args[0] == 'GRAPH.QUERY' and args[2].startswith('MATCH (') and ' CREATE (' in args[2]:
+            matched = not any('name:"{}"'.format(name) in args[2] for name in self.missing)
+            created = args[2].count(']->(') if matched else 0
+            response = [['Relationships created: {}'.format(created).encode(),
+                         b'Query internal execution time: 0.1 milliseconds']]
+
+        self.responses.append(response)
+        return response
+
+    def get(self, key):
+        return self.keys.get(key)
+
+    def set(self, key, value):
+        self.keys[key] = value.encode()
+
+    def delete(self, key):
+        self.keys.pop(key, None)
+
+    def incr(self, key):
+        self.keys[key] = str(int(self.keys.get(key, 0)) + 1).encode()
+        return int(self.keys[key])
+
+    def pipeline(self, transaction=True):
+        assert transaction is False
+        self.responses = []
+        return self
+
+    def execute(self):
+        return self.responses
+
+
+def test_store_in_batches():
+    redis = FakeRedis()
+
+    graph = RedisGraph(host='foo')
+    graph.get_connection = lambda: redis
+
+    for index in range(5):
+        model = PersonModel(name='Member #{}'.format(index))
+        model.add_relation('plays_with', 'Member_{}:Person'.format((index + 1) % 5))
+        graph.add(model)
+
+    progress = []
+    graph.store('circus', batch_size=2, progress=lambda *args: progress.append(args))
+
+    assert redis.commands[0] == ('GRAPH.DELETE', 'circus')
+    assert redis.commands[-1] == ('SAVE',)
+
+    queries = [args[2] for args in redis.commands if args[0] == 'GRAPH.QUERY']
+
+    # three batches of nodes, three batches of edges
+    assert progress == [(1, 1), (2, 2), (3, 3), (4, 6), (5, 8), (6, 9)]
+    assert len(queries) == 9
+
+    assert queries[0] == 'CREATE (Member_0:Person{name:"Member #0"}),(Member_1:Person{name:"Member #1"})'
+    assert queries[3] == 'CREATE INDEX ON :Person(name)'
+    assert queries[4] == 'MATCH (src:Person{name:"Member #0"}),(dst:Person{name:"Member #1"}) ' \
+                         'CREATE (src)-[:plays_with]->(dst)'
+
+    # cached query results are no longer valid
+    assert graph.get_version('circus') == 1
+    graph.store('circus', batch_size=2)
+    assert graph.get_version('circus') == 2
+
+
+def test_store_relations():
+    redis = FakeRedis()
+
+    graph = RedisGraph(host='foo')
+    graph.get_connection = lambda: redis
+
+    edges = [
+        ('Foo:Person', 'Bar:Person', {'years': 2, 'since': 2001, 'until': 2002}),
+        ('Bar:Person', 'Baz:Person', None),
+        ('Foo:Person', 'Baz:Person', {'years': 1}),
+        ('Foo:Person', 'Qux:Person', None),
+    ]
+    names = {'Foo:Person': 'John Foo', 'Bar:Person': 'Bar', 'Baz:Person': 'Baz'}
+
+    assert graph.store_relations('football', 'teammate', iter(edges), names=names,
+                                 batch_size=4) == 4
+
+    queries = [args[2] for args in redis.commands if args[0] == 'GRAPH.QUERY']
+
+    # relations of this type are replaced, relations between stored nodes in a single query
+    assert queries == [
+        'MATCH ()-[r:teammate]->() DELETE r',
+        'CREATE INDEX ON :Person(name)',
+        'MATCH (src:Person{name:"John Foo"}),(dst:Person{name:"Qux"}) '
+        'CREATE (src)-[:teammate]->(dst)',
+        'MATCH (n0:Person{name:"John Foo"}),(n1:Person{name:"Bar"}),(n2:Person{name:"Baz"}) '
+        'CREATE (n0)-[:teammate{years:2,since:2001,until:2002}]->(n1),(n1)-[:teammate]->(n2),'
+        '(n0)-[:teammate{years:1}]->(n2)',
+    ]
+
+    assert graph.get_version('football') == 1
+
+    # relations between nodes that are not found are not created
+    redis.missing = {'Qux'}
+
+    assert graph.store_relations('football', 'teammate', iter(edges), names=names) == 3
+
+
+def test_store_staging():
+    nodes_query = 'MATCH (n) RETURN count(n)'
+    edges_query = 'MATCH ()-[r]->() RETURN count(r)'
+
+    redis = FakeRedis(counts={
+        'circus:blue': {nodes_query: 2, edges_query: 1},
+        'circus:green': {nodes_query: 2, edges_query: 1},
+    })
+
+    graph = RedisGraph(host='foo')
+    graph.get_connection = lambda: redis
+
+    graham = PersonModel(name='Graham Chapman')
+    john = PersonModel(name='John Cleese')
+    john.add_relation('plays_with', graham.get_node_name())
+
+    graph.add(graham)
+    graph.add(john)
+
+    # the graph stored under its name is queried until a staged version is ready
+    assert graph.get_current_graph_name('circus') == 'circus'
+
+    graph.store('circus', staging=True)
+
+    assert graph.get_current_graph_name('circus') == 'circus:blue'
+    assert ('GRAPH.DELETE', 'circus') in redis.commands, 'The previous version is removed'
+    assert ('BGSAVE',) in redis.commands
+    assert ('SAVE',) not in redis.commands
+    assert all(args[1] == 'circus:blue' for args in redis.commands if args[0] == 'GRAPH.QUERY')
+
+    # the next version is built next to the current one
+    redis.commands = []
+    graph.store('circus', staging=True)
+
+    assert graph.get_current_graph_name('circus') == 'circus:green'
+    assert redis.commands[0] == ('GRAPH.DELETE', 'circus:green')
+    assert redis.commands[-2] == ('GRAPH.DELETE', 'circus:blue')
+
+    # incomplete graph is not used
+    redis.counts['circus:blue'][edges_query] = 0
+
+    with pytest.raises(StagingError):
+        graph.store('circus', staging=True)
+
+    assert graph.get_current_graph_name('circus') == 'circus:green'
+    assert graph.get_version('circus') == 2, 'Queried graph has not changed'
+
+    # the pointer is removed when the graph is stored under its name
+    graph.store('circus')
+    assert graph.get_current_graph_name('circus') == 'circus'
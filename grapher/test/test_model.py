@@ -1,9 +1,11 @@
 """
 Models test suite
 """
+import pickle
+
 import pytest
 
-from grapher.models import BaseModel
+from grapher.models import BaseModel, PersonModel
 
 
 def test_model_assert():
@@ -22,3 +24,20 @@ def test_encode():
     assert BaseModel.encode_name('Manchester United') == 'Manchester_United', 'Spaces are replaced'
     assert BaseModel.encode_name('Alt\xc4\xb1nordu_S_K') == 'Altnordu_S_K', 'UTF characters are properly encoded'
     assert BaseModel.encode_name('Altınordu S.K.') == 'Altnordu_S_K', 'UTF characters are properly encoded'
+
+
+def test_record():
+    model = PersonModel(name='Zlatan Ibrahimović')
+    model.add_property('height', 1.95)
+    model.add_relation('athlete', 'Malm_FF:SportsTeam', {'since': 1999, 'until': 2001})
+
+    record = model.to_record()
+    assert pickle.loads(pickle.dumps(record)) == record
+
+    copy = BaseModel.from_record(record)
+
+    assert isinstance(copy, PersonModel)
+    assert copy.get_node_name() == 'Zlatan_Ibrahimovi:Person'
+    assert copy.get_property('height') == 1.95
+    assert copy.get_relation_targets('athlete') == [('Malm_FF:SportsTeam', {'since': 1999, 'until': 2001})]
+    assert repr(copy) == repr(model)
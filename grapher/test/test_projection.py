@@ -0,0 +1,116 @@
+"""
+Set of unit tests for teammates projection
+"""
+import random
+
+from grapher.graph.projection import TeammateProjection, merge_stints, sweep
+from grapher.models import PersonModel, SportsTeamModel
+
+
+def test_merge_stints():
+    assert merge_stints([
+        (2000, 2004, 'a'),
+        (2003, 2005, 'a'),  # a loan listed next to the contract
+        (2010, 2012, 'a'),
+        (2001, 2002, 'b'),
+    ]) == [(2000, 2005, 'a'), (2001, 2002, 'b'), (2010, 2012, 'a')]
+
+
+def test_sweep():
+    assert sorted(sweep([
+        (1990, 1995, 'a'),
+        (1994, 2000, 'b'),
+        (1995, 1995, 'c'),
+        (2001, 2003, 'd'),
+    ])) == [
+        ('a', 'b', 1994, 1995),
+        ('a', 'c', 1995, 1995),
+        ('b', 'c', 1995, 1995),
+    ]
+
+
+def test_projection():
+    projection = TeammateProjection(current_year=2019)
+
+    projection.add('Liverpool', 'gerrard', 1998, 2015)
+    projection.add('Liverpool', 'henderson', 2011, None)
+    projection.add('Liverpool', 'salah', 2017, None)
+    projection.add('Sunderland', 'henderson', 2008, 2011)
+    projection.add('Sunderland', 'foo', 2010, 2010)
+    projection.add('Chelsea', 'salah', 2014, 2016)
+    projection.add('Chelsea', 'foo', 2015, 2013)  # ends before it starts
+    projection.add('Sunderland', 'foo', 2011, 2012)  # the second stint, the same teammate
+
+    assert dict(projection.get_edges()) == {
+        ('gerrard', 'henderson'): {'years': 5, 'since': 2011, 'until': 2015, 'stints': 1},
+        ('henderson', 'salah'): {'years': 3, 'since': 2017, 'until': 2019, 'stints': 1},
+        ('foo', 'henderson'): {'years': 2, 'since': 2010, 'until': 2011, 'stints': 2},
+        ('foo', 'salah'): {'years': 1, 'since': 2015, 'until': 2015, 'stints': 1},
+    }
+
+    assert [(source, target) for (source, target, _) in projection.iter_edges()] == [
+        ('foo', 'henderson'), ('foo', 'salah'), ('gerrard', 'henderson'), ('henderson', 'salah'),
+    ]
+
+
+def test_projection_random():
+    generator = random.Random(42)
+    projection = TeammateProjection(current_year=2020)
+    stints = []
+
+    for player in range(300):
+        for _ in range(generator.randint(1, 4)):
+            club = generator.randint(0, 20)
+            since = generator.randint(1870, 2020)
+            until = min(since + generator.randint(0, 8), 2020) if generator.random() > 0.1 \
+                else None
+
+            projection.add(club, player, since, until)
+            stints.append((club, player, since, until if until is not None else 2020))
+
+    # the obvious pairwise check of stints at the same club, years are counted once per club
+    expected = dict()
+
+    for club in range(21):
+        years = dict()
+
+        for (stint_club, player, since, until) in stints:
+            if stint_club == club:
+                years.setdefault(player, set()).update(range(since, until + 1))
+
+        for player_a in years:
+            for player_b in years:
+                common = years[player_a] & years[player_b]
+
+                if player_a < player_b and common:
+                    expected.setdefault((player_a, player_b), 0)
+                    expected[(player_a, player_b)] += len(common)
+
+    assert {key: edge['years'] for (key, edge) in projection.get_edges().items()} == expected
+
+    # pairs spilled to files in small chunks are merged into the same relations
+    spilled = TeammateProjection(current_year=2020, chunk_size=50)
+    spilled.clubs = projection.clubs
+
+    assert list(spilled.iter_edges()) == list(projection.iter_edges())
+
+
+def test_projection_from_models():
+    players = []
+
+    for (name, since, until) in (('Projection A', 2000, 2004), ('Projection B', 2003, None)):
+        player = PersonModel(name=name)
+        player.add_relation('athlete', SportsTeamModel.get_node_id_by_name('Projection F.C.'),
+                            {'since': since, 'until': until})
+        player.add_relation('athlete', 'Other_F_C:SportsTeam')  # no years
+        players.append(player)
+
+    club = SportsTeamModel(name='Projection F.C.')
+    club.add_relation('athlete', players[0].get_node_id(), {'position': 'GK'})
+
+    projection = TeammateProjection.from_models(players + [club], current_year=2019)
+
+    assert list(projection.iter_edges()) == [
+        ('Projection_A:Person', 'Projection_B:Person',
+         {'years': 2, 'since': 2003, 'until': 2004, 'stints': 1}),
+    ]
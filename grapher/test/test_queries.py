@@ -0,0 +1,178 @@
+"""
+Set of unit tests for named queries
+"""
+from pytest import raises
+
+from grapher.graph.queries import QueryError, QueryRegistry, QueryTemplate, encode_value
+from grapher.scripts import query_football_graph
+
+
+def test_encode_value():
+    assert encode_value('John "Faxe" Jensen') == '"John \\"Faxe\\" Jensen"'
+    assert encode_value('C:\\') == '"C:\\\\"'
+    assert encode_value(2017) == '2017'
+    assert encode_value(1.78) == '1.78'
+    assert encode_value(True) == 'true'
+    assert encode_value(None) == 'NULL'
+
+    with raises(QueryError):
+        encode_value(['foo'])
+
+
+def test_template():
+    template = QueryTemplate('squad', """
+    MATCH (t:SportsTeam)-[a:athlete]->(p:Person)
+    WHERE t.name = $club AND a.since <= $year
+    RETURN p.name
+    """, params=('club', 'year'))
+
+    assert template.query == 'MATCH (t:SportsTeam)-[a:athlete]->(p:Person) ' \
+                             'WHERE t.name = $club AND a.since <= $year RETURN p.name'
+
+    assert template.render({'club': 'F.C. "Faxe"', 'year': 2017}) == \
+        'MATCH (t:SportsTeam)-[a:athlete]->(p:Person) ' \
+        'WHERE t.name = "F.C. \\"Faxe\\"" AND a.since <= 2017 RETURN p.name'
+
+    assert template.render_with_parameters({'club': 'Faxe', 'year': 2017}) == \
+        'CYPHER club="Faxe" year=2017 ' + template.query
+
+    # undeclared or unused parameters
+    with raises(QueryError):
+        QueryTemplate('foo', 'MATCH (n) WHERE n.name = $name RETURN n')
+
+    with raises(QueryError):
+        QueryTemplate('foo', 'MATCH (n) RETURN n', params=('name',))
+
+    with raises(QueryError):
+        QueryTemplate('foo', '  ')
+
+
+def test_registry():
+    registry = QueryRegistry()
+    registry.register('player', 'MATCH (p:Person) WHERE p.name = $name RETURN p',
+                      params=('name',))
+
+    with raises(QueryError):
+        registry.register('player', 'MATCH (p:Person) RETURN p')
+
+    assert registry.prepare('player', name='Faxe') == \
+        'MATCH (p:Person) WHERE p.name = "Faxe" RETURN p'
+    assert registry.prepare('player', name='Faxe') == \
+        'MATCH (p:Person) WHERE p.name = "Faxe" RETURN p'
+
+    # equal values of different types
+    assert registry.prepare('player', name=1) == 'MATCH (p:Person) WHERE p.name = 1 RETURN p'
+    assert registry.prepare('player', name=True) == \
+        'MATCH (p:Person) WHERE p.name = true RETURN p'
+
+    info = registry.get_cache_info()
+    assert (info.hits, info.misses) == (1, 3)
+
+    with raises(QueryError):
+        registry.prepare('player', name=['Faxe'])
+
+    with raises(QueryError):
+        registry.prepare('player', name='Faxe', year=2017)
+
+    with raises(QueryError):
+        registry.prepare('player')
+
+    with raises(QueryError):
+        registry.prepare('club', name='Faxe')
+
+
+def test_registry_parameters():
+    registry = QueryRegistry(parameters=True)
+    registry.register('player', 'MATCH (p:Person) WHERE p.name = $name RETURN p',
+                      params=('name',))
+
+    assert registry.prepare('player', name='Faxe') == \
+        'CYPHER name="Faxe" MATCH (p:Person) WHERE p.name = $name RETURN p'
+
+
+def test_batch():
+    template = QueryTemplate('league', """
+    MATCH (t:SportsTeam)<-[a:athlete]-(p:Person)
+    WHERE t.memberOf = $league AND p.nationality = $nationality
+    RETURN t.name,p.name
+    """, params=('league', 'nationality'))
+
+    assert template.get_batch_expression('nationality') == 'p.nationality'
+
+    # values are not searched for placeholders or RETURN
+    assert template.render_batch('nationality', ['Iceland', 'Foo $league'],
+                                 {'league': 'RETURN'}) == \
+        'MATCH (t:SportsTeam)<-[a:athlete]-(p:Person) WHERE t.memberOf = "RETURN" ' \
+        'AND (p.nationality = "Iceland" OR p.nationality = "Foo $league") ' \
+        'RETURN p.nationality AS batch_key, t.name,p.name'
+
+    assert template.render_batch('nationality', ['Iceland', 'Germany'], {'league': 'Premier'},
+                                 parameters=True) == \
+        'CYPHER league="Premier" nationality=["Iceland", "Germany"] ' \
+        'UNWIND $nationality AS batch_key ' \
+        'MATCH (t:SportsTeam)<-[a:athlete]-(p:Person) WHERE t.memberOf = $league ' \
+        'AND p.nationality = batch_key RETURN batch_key, t.name,p.name'
+
+    with raises(QueryError):
+        template.render_batch('nationality', [], {'league': 'Premier'})
+
+    # only parameters compared with "=" can be batched
+    template = QueryTemplate('squad', 'MATCH (a:athlete) WHERE a.since <= $year RETURN a',
+                             params=('year',))
+
+    with raises(QueryError):
+        template.get_batch_expression('year')
+
+    registry = QueryRegistry()
+    registry.register('player', 'MATCH (p:Person) WHERE p.name = $name RETURN p.number',
+                      params=('name',))
+
+    assert registry.prepare_batch('player', 'name', ['Faxe', 2]) == \
+        'MATCH (p:Person) WHERE (p.name = "Faxe" OR p.name = 2) ' \
+        'RETURN p.name AS batch_key, p.number'
+
+    with raises(QueryError):
+        registry.prepare_batch('player', 'name', ['Faxe'], year=2017)
+
+
+class FakeGraph(object):
+    """
+    Answers squad batch queries with a player for each club
+    """
+    def __init__(self):
+        self.queries = []
+
+    @staticmethod
+    def get_version(_):
+        return 1
+
+    def get_current_redisgraph(self, _):
+        return self
+
+    def query(self, query):
+        self.queries.append(query)
+        clubs = [club.split('"')[1] for club in query.split(' OR ')]
+
+        return type('Result', (object,), {'result_set': [
+            [b'batch_key', b'name', b'position', b'number'],
+        ] + [
+            [club.encode(), 'Player of {}'.format(club).encode(), b'MF', b'8.000000']
+            for club in clubs
+        ]})
+
+
+def test_query_redis_batch(monkeypatch):
+    graph = FakeGraph()
+
+    monkeypatch.setattr(query_football_graph, 'get_graph', lambda: graph)
+    monkeypatch.setattr(query_football_graph, 'BATCH_QUERY_SIZE', 2)
+
+    clubs = ['Foo', 'Bar', 'Foo', 'Baz']
+    results = query_football_graph.query_redis_batch('football', 'current_squad', 'club', clubs)
+
+    # one query for every two clubs, repeated ones are asked for once
+    assert len(graph.queries) == 2
+    assert list(results.keys()) == ['Foo', 'Bar', 'Baz']
+    assert [(row.name, row.number) for row in results['Baz']] == [('Player of Baz', 8)]
+
+    query_football_graph.RESULTS.entries.clear()
@@ -0,0 +1,53 @@
+"""
+Node registry test suite
+"""
+from grapher.models import BaseModel, NodeRegistry, PersonModel, SportsTeamModel
+
+
+def test_node_ids():
+    registry = NodeRegistry(BaseModel.encode_name)
+
+    assert registry.get_id('Person', 'Eric Idle') == 0
+    assert registry.get_id('Person', 'Graham Chapman') == 1
+    assert registry.get_id('Person', 'Eric Idle') == 0
+
+    # the same name, but a different type
+    assert registry.get_id('SportsTeam', 'Eric Idle') == 2
+
+    assert registry.get_alias(0) == 'Eric_Idle:Person'
+    assert registry.get_alias(2) == 'Eric_Idle:SportsTeam'
+    assert registry.get_key(1) == ('Person', 'Graham Chapman')
+
+    # nodes referred to by alias only
+    assert registry.get_alias_id('Graham_Chapman:Person') == 1
+    assert registry.get_alias_id('Michael_Palin:Person') == 3
+    assert registry.get_key(3) is None
+
+    assert registry.get_id('Person', 'Michael Palin') == 3
+    assert registry.get_key(3) == ('Person', 'Michael Palin')
+
+    assert len(registry) == 4
+    assert registry.get_collisions() == {}
+
+
+def test_collisions():
+    registry = NodeRegistry(BaseModel.encode_name)
+
+    assert registry.get_id('SportsTeam', 'Altınordu S.K.') == 0
+    assert registry.get_id('SportsTeam', 'Altnordu S.K.') == 0
+    assert registry.get_id('SportsTeam', 'Altnordu S K') == 0
+
+    assert registry.get_collisions() == {
+        'Altnordu_S_K:SportsTeam': ['Altnordu S K', 'Altnordu S.K.', 'Altınordu S.K.'],
+    }
+
+
+def test_relations_keep_ids():
+    model = PersonModel(name='Zlatan Ibrahimović')
+    model.add_relation('athlete', SportsTeamModel.get_node_id_by_name('Malmö FF'))
+    model.add_relation('athlete', 'Ajax:SportsTeam')
+
+    (_, target, _) = model.relations[0]
+
+    assert target == SportsTeamModel('Malmö FF').get_node_id()
+    assert model.get_relation_targets('athlete') == ['Malm_FF:SportsTeam', 'Ajax:SportsTeam']
@@ -0,0 +1,133 @@
+"""
+Set of unit tests for typed query results
+"""
+import json
+
+from grapher.graph.results import ResultSet, decode_value, get_field_name, get_statistics
+
+RESPONSE = [
+    [b'p.name', b'a.position', b'a.number', b'hist.until'],
+    [b'Nemanja Mati\xc4\x87', b'MF', b'31.000000', b'NULL'],
+    [b'John "Faxe" Jensen', b'DF', b'1.780000', b'1992.000000'],
+    [b'1860', b'NULL', b'-4.000000', b'1860.5'],
+]
+
+
+def test_decode_value():
+    assert decode_value(b'Nemanja Mati\xc4\x87') == 'Nemanja Matić'
+    assert decode_value(b'31.000000') == 31
+    assert isinstance(decode_value(b'31.000000'), int)
+    assert decode_value(b'-1.780000') == -1.78
+    assert decode_value(b'NULL') is None
+
+    # not formatted by RedisGraph as a number
+    assert decode_value(b'1860') == '1860'
+    assert decode_value(b'1.78') == '1.78'
+
+    # already decoded
+    assert decode_value(12) == 12
+    assert decode_value(None) is None
+
+
+def test_get_field_name():
+    assert get_field_name('name') == 'name'
+    assert get_field_name('p.name') == 'p_name'
+    assert get_field_name('count(n)') == 'count_n'
+
+
+def test_result_set():
+    result = ResultSet.from_response(RESPONSE)
+
+    assert len(result) == 3
+    assert result.columns == ('p.name', 'a.position', 'a.number', 'hist.until')
+
+    assert list(result.iter_tuples()) == [
+        ('Nemanja Matić', 'MF', 31, None),
+        ('John "Faxe" Jensen', 'DF', 1.78, 1992),
+        ('1860', None, -4, '1860.5'),
+    ]
+
+    assert list(result.iter_column('a.number')) == [31, 1.78, -4]
+
+    rows = list(result)
+
+    assert rows[0].p_name == 'Nemanja Matić'
+    assert rows[0].hist_until is None
+    assert rows[1]['a.number'] == 1.78
+    assert rows[1][0] == 'John "Faxe" Jensen'
+    assert rows[1].get('foo', 'bar') == 'bar'
+    assert rows[2].as_dict() == {
+        'p.name': '1860', 'a.position': None, 'a.number': -4, 'hist.until': '1860.5'}
+
+    # rows are tuples
+    assert rows[0] == ('Nemanja Matić', 'MF', 31, None)
+    (name, _, number, _) = rows[0]
+    assert (name, number) == ('Nemanja Matić', 31)
+
+    assert type(rows[0]) is result.get_row_class()
+
+
+def test_result_set_decoded():
+    # e.g. taken from the cache
+    result = ResultSet.from_response(RESPONSE)
+    cached = json.loads(json.dumps({
+        'columns': result.columns, 'rows': list(result.iter_tuples())}))
+
+    decoded = ResultSet(cached['columns'], cached['rows'], decoded=True)
+
+    assert list(decoded) == list(result)
+    assert list(decoded.iter_column('hist.until')) == [None, 1992, '1860.5']
+
+
+def test_result_set_empty():
+    result = ResultSet.from_response([])
+
+    assert len(result) == 0
+    assert list(result) == []
+    assert list(ResultSet.from_response(RESPONSE[:1])) == []
+
+
+def test_duplicated_columns():
+    result = ResultSet.from_response([[b'a.since', b'a_since', b'class'], [b'1', b'2', b'3']])
+
+    row = list(result)[0]
+
+    assert row.a_since == '1'
+    assert row['a_since'] == '2'
+    assert row['class'] == '3'
+
+
+def test_result_set_split():
+    result_set = ResultSet.from_response([
+        [b'batch_key', b'p.name'],
+        [b'Liverpool F.C.', b'Mohamed Salah'],
+        [b'1860.000000', b'Foo'],
+        [b'Liverpool F.C.', b'Jordan Henderson'],
+    ])
+
+    results = result_set.split(['Liverpool F.C.', 'Everton F.C.', 1860])
+
+    assert list(results.keys()) == ['Liverpool F.C.', 'Everton F.C.', 1860]
+    assert [row.p_name for row in results['Liverpool F.C.']] == \
+        ['Mohamed Salah', 'Jordan Henderson']
+    assert results['Liverpool F.C.'].columns == ('p.name',)
+
+    # no rows for the key
+    assert len(results['Everton F.C.']) == 0
+
+    # numeric keys are returned as "1860.000000"
+    assert list(results[1860].iter_tuples()) == [('Foo',)]
+
+
+def test_get_statistics():
+    assert get_statistics([[
+        b'Relationships created: 1',
+        b'Query internal execution time: 0.120100 milliseconds',
+    ]]) == {'Relationships created': 1, 'Query internal execution time': 0.1201}
+
+    # statistics follow the result set
+    assert get_statistics([RESPONSE, [b'Nodes created: 2']]) == {'Nodes created': 2}
+
+    # index queries get a status reply
+    assert get_statistics(b'Index created') == {}
+    assert get_statistics([]) == {}
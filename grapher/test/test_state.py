@@ -0,0 +1,108 @@
+from grapher.graph import RedisGraph
+from grapher.models import PersonModel
+from grapher.state import Checkpoint, IndexState
+
+
+def test_index_state(tmpdir):
+    state = IndexState(str(tmpdir.join('state.sqlite')))
+
+    assert state.get_last_run() is None
+    assert state.get_revisions() == {}
+    assert state.get_nodes() == {}
+
+    state.set_last_run('2019-01-09T12:50:59Z')
+    state.set_revisions([('Zlatan Ibrahimović', 123, '2019-01-08T10:00:00Z')])
+    state.set_revisions([('Zlatan Ibrahimović', 124, '2019-01-09T10:00:00Z'),
+                         ('Burnley F.C.', 42, '2018-12-01T10:00:00Z')])
+    state.set_nodes({'Zlatan_Ibrahimovi:Person': 'Zlatan Ibrahimović'})
+
+    # the state is persistent
+    state = IndexState(str(tmpdir.join('state.sqlite')))
+
+    assert state.get_last_run() == '2019-01-09T12:50:59Z'
+    assert state.get_revisions() == {
+        'Zlatan Ibrahimović': (124, '2019-01-09T10:00:00Z'),
+        'Burnley F.C.': (42, '2018-12-01T10:00:00Z'),
+    }
+    assert state.get_nodes() == {'Zlatan_Ibrahimovi:Person': 'Zlatan Ibrahimović'}
+
+    state.clear()
+    assert state.get_last_run() is None
+    assert state.get_revisions() == {}
+
+
+def get_pages():
+    graham = PersonModel(name='Graham Chapman')
+
+    john = PersonModel(name='John Cleese')
+    john.add_relation('plays_with', graham.get_node_name())
+    john.add_relation('plays_with', 'Michael_Palin:Person')
+
+    eric = PersonModel(name='Eric Idle')
+
+    return [('Flying Circus', [john, graham]), ('Eric Idle', [eric])]
+
+
+def test_checkpoint_resume(tmpdir):
+    state = IndexState(str(tmpdir.join('state.sqlite')))
+    edges_filename = str(tmpdir.join('edges.jsonl'))
+    graph = RedisGraph(host='foo')
+
+    # stored without interruptions
+    names = dict()
+    checkpoint = Checkpoint(state, edges_filename, interval=0)
+    expected = list(graph.iter_queries(checkpoint.iter_models(get_pages()), batch_size=1,
+                                       names=names, checkpoint=checkpoint))
+    checkpoint.finish()
+
+    assert len(expected) == 5
+    assert state.get_checkpoint() is None
+    assert not tmpdir.join('edges.jsonl').exists()
+
+    # interrupted before the third batch was committed
+    state.clear()
+    names = dict()
+    checkpoint = Checkpoint(state, edges_filename, interval=0)
+    batches = graph.iter_queries(checkpoint.iter_models(get_pages()), batch_size=1,
+                                 names=names, checkpoint=checkpoint)
+
+    assert [next(batches) for _ in range(3)] == expected[:3]
+    del batches
+
+    # only the first page was completely stored
+    assert state.get_processed_titles() == {'Flying Circus'}
+    assert state.get_nodes() == {
+        'John_Cleese:Person': 'John Cleese',
+        'Graham_Chapman:Person': 'Graham Chapman',
+    }
+
+    checkpoint = Checkpoint(state, edges_filename, interval=0, resume=True)
+    assert checkpoint.resumed is True
+
+    names = state.get_nodes()
+    pages = [page for page in get_pages() if page[0] not in state.get_processed_titles()]
+    batches = list(graph.iter_queries(checkpoint.iter_models(pages), batch_size=1,
+                                      names=names, checkpoint=checkpoint))
+
+    # the third batch is repeated, relations of the first page are not lost
+    assert batches == expected[2:]
+
+    checkpoint.finish()
+
+    # interrupted before the last batch of relations was committed
+    state.clear()
+    checkpoint = Checkpoint(state, edges_filename, interval=0)
+    batches = graph.iter_queries(checkpoint.iter_models(get_pages()), batch_size=1,
+                                 names=dict(), checkpoint=checkpoint)
+
+    assert [next(batches) for _ in range(5)] == expected
+    del batches
+
+    # nodes and the first batch of relations are not stored again
+    checkpoint = Checkpoint(state, edges_filename, interval=0, resume=True)
+    batches = list(graph.iter_queries(iter([]), batch_size=1, names=state.get_nodes(),
+                                      checkpoint=checkpoint))
+
+    # labels are indexed again (it does not change the graph when they already are)
+    assert batches == [expected[4][:1] + ['CREATE INDEX ON :Person(name)'] + expected[4][1:]]
+    checkpoint.finish()
@@ -0,0 +1,42 @@
+"""
+Model store test suite
+"""
+from grapher.models import BaseModel, ModelStore, PersonModel, SportsTeamModel
+
+
+def test_model_store():
+    zlatan = PersonModel(name='Zlatan Ibrahimović')
+    zlatan.add_property('height', 1.95)
+    zlatan.add_relation('athlete', SportsTeamModel.get_node_id_by_name('Malmö FF'),
+                        {'since': 1999, 'until': 2001})
+    zlatan.add_relation('athlete', 'Ajax:SportsTeam', {'since': 2001, 'until': 2004})
+
+    malmo = SportsTeamModel(name='Malmö FF')
+
+    ole = PersonModel(name='Ole Gunnar Solskjær')
+    ole.add_relation('athlete', 'Molde_FK:SportsTeam', {'since': 1999, 'until': 2001})
+    ole.add_relation('coach', 'Cardiff_City:SportsTeam')
+
+    store = ModelStore()
+
+    for model in (zlatan, malmo, ole, BaseModel(model_type='Thing', name='Foo')):
+        store.add(model)
+
+    assert len(store) == 4
+    assert store.get_edges_count() == 4
+
+    # shared tables
+    assert len(store.classes) == 3
+    assert len(store.shapes) == 2
+    assert store.relation_types == ['athlete', 'coach']
+    assert len(store.edge_properties) == 3
+
+    models = list(store)
+
+    assert [model.__class__ for model in models] == [PersonModel, SportsTeamModel, PersonModel, BaseModel]
+    assert [repr(model) for model in models][:3] == [repr(zlatan), repr(malmo), repr(ole)]
+    assert models[0].get_property('height') == 1.95
+    assert models[2].get_relation_targets('coach') == ['Cardiff_City:SportsTeam']
+
+    assert list(store.iter_edges())[-1] == \
+        (ole.get_node_id(), 'coach', ole.relations[1][1], None)
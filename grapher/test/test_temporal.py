@@ -0,0 +1,127 @@
+"""
+Set of unit tests for the index of careers
+"""
+import random
+
+from grapher.graph.delta import record_snapshot
+from grapher.graph.temporal import Interval, IntervalTree, TemporalIndex
+from grapher.models import PersonModel, SportsTeamModel
+from grapher.state import IndexState
+
+
+def test_interval_tree():
+    tree = IntervalTree([
+        Interval(1990, 1995, 'a'),
+        Interval(1994, None, 'b'),
+        Interval(2000, 2001, 'c'),
+        Interval(1980, 1980, 'd'),
+        Interval(2005, 2003, 'e'),  # ends before it starts
+    ])
+
+    assert len(tree) == 5
+
+    assert sorted(interval.value for interval in tree.at(1980)) == ['d']
+    assert sorted(interval.value for interval in tree.at(1994)) == ['a', 'b']
+    assert sorted(interval.value for interval in tree.at(1996)) == ['b']
+    assert sorted(interval.value for interval in tree.at(2005)) == ['b', 'e']
+    assert sorted(interval.value for interval in tree.at(1970)) == []
+
+    assert sorted(interval.value for interval in tree.overlapping(1981, 1990)) == ['a']
+    assert sorted(interval.value for interval in tree.overlapping(1996, 2000)) == ['b', 'c']
+    assert sorted(interval.value for interval in tree.overlapping(1900, 2100)) == \
+        ['a', 'b', 'c', 'd', 'e']
+
+    assert IntervalTree([]).at(2000) == []
+
+
+def test_interval_tree_random():
+    generator = random.Random(42)
+
+    intervals = []
+    for value in range(500):
+        since = generator.randint(1900, 2020)
+        until = since + generator.randint(0, 10) if generator.random() > 0.1 else None
+        intervals.append(Interval(since, until, value))
+
+    tree = IntervalTree(intervals)
+
+    for _ in range(200):
+        start = generator.randint(1890, 2030)
+        end = start + generator.randint(0, 5)
+
+        assert sorted(interval.value for interval in tree.overlapping(start, end)) == sorted(
+            interval.value for interval in intervals
+            if interval.since <= end and (interval.until is None or interval.until >= start))
+
+
+def get_models():
+    liverpool = SportsTeamModel(name='Liverpool F.C.')
+
+    players = []
+    for (name, careers, position) in (
+            ('Steven Gerrard', [('Liverpool F.C.', 1998, 2015)], None),
+            ('Mohamed Salah', [('Chelsea F.C.', 2014, 2016), ('Liverpool F.C.', 2017, None)],
+             'FW'),
+            ('Jordan Henderson', [('Sunderland A.F.C.', 2008, 2011),
+                                  ('Liverpool F.C.', 2011, None)], 'MF'),
+    ):
+        player = PersonModel(name=name)
+
+        for (club, since, until) in careers:
+            player.add_relation('athlete', SportsTeamModel.get_node_id_by_name(club),
+                                {'since': since, 'until': until})
+
+        if position:
+            liverpool.add_relation('athlete', player.get_node_id(),
+                                   {'position': position, 'number': 10})
+
+        players.append(player)
+
+    return [liverpool] + players
+
+
+def test_temporal_index(tmpdir):
+    state = IndexState(str(tmpdir.join('state.sqlite')))
+
+    for _ in record_snapshot(state, get_models()):
+        pass
+
+    index = TemporalIndex.from_snapshot(state)
+
+    assert index.get_players_at('Liverpool F.C.', 2012) == [
+        ('Jordan Henderson', 'MF', 2011, None),
+        ('Steven Gerrard', None, 1998, 2015),
+    ]
+    assert index.get_players_at('Liverpool F.C.', 2016) == [
+        ('Jordan Henderson', 'MF', 2011, None),
+    ]
+    assert index.get_players_at('Liverpool F.C.', 1990) == []
+    assert index.get_players_at('Everton F.C.', 2012) == []
+
+    assert index.get_players_between('Liverpool F.C.', 2015, 2017) == [
+        ('Jordan Henderson', 'MF', 2011, None),
+        ('Mohamed Salah', 'FW', 2017, None),
+        ('Steven Gerrard', None, 1998, 2015),
+    ]
+    assert index.get_players_between('Chelsea F.C.', 2010, 2020) == [
+        ('Mohamed Salah', 'FW', 2014, 2016),
+    ]
+
+    # saved by the indexer and loaded by queries
+    index.save(str(tmpdir.join('careers.json')))
+    loaded = TemporalIndex.load(str(tmpdir.join('careers.json')))
+
+    assert loaded.get_players_at('Liverpool F.C.', 2012) == \
+        index.get_players_at('Liverpool F.C.', 2012)
+    assert tmpdir.listdir(lambda file: file.ext == '.tmp') == []
+
+
+def test_team_alias_is_not_registered():
+    registered = len(SportsTeamModel.registry)
+
+    assert TemporalIndex.get_team_alias('Liverpool F.C.') == 'Liverpool_F_C:SportsTeam'
+    assert TemporalIndex.get_team_alias('Liverpol F.C. (typo)') == \
+        'Liverpol_F_C_typo:SportsTeam'
+
+    assert len(SportsTeamModel.registry) == registered
+    assert SportsTeamModel.registry.get_name('Liverpol_F_C_typo:SportsTeam') is None
@@ -1,4 +1,4 @@
-from grapher.utils import extract_link, extract_links, extract_year, extract_number
+from grapher.utils import extract_link, extract_links, extract_year, extract_number, chunks
 
 
 def test_extract_link():
@@ -39,3 +39,9 @@ def test_extract_number():
     assert extract_number(' heightm=1,72 ') == 1.72
 
     assert extract_number(' abc ') is None
+
+
+def test_chunks():
+    assert list(chunks(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(chunks([1, 2], 2)) == [[1, 2]]
+    assert list(chunks([], 2)) == []
@@ -0,0 +1,185 @@
+"""
+Set of unit tests for views computed when the graph is stored
+"""
+from grapher.graph.delta import record_snapshot
+from grapher.graph.temporal import TemporalIndex
+from grapher.graph.views import RedisViews, build_views
+from grapher.state import IndexState
+
+from test_temporal import get_models
+
+
+class FakeRedis(object):
+    """
+    Keeps strings, sets, hashes and sorted sets in memory
+    """
+    def __init__(self):
+        self.keys = {}
+
+    def execute_command(self, command, key, *args):
+        if command == 'SADD':
+            self.keys.setdefault(key, set()).update(args)
+        elif command == 'HSET':
+            self.keys.setdefault(key, dict()).update(
+                {str(field).encode(): value.encode() for (field, value) in zip(args[::2], args[1::2])})
+        elif command == 'ZADD':
+            self.keys.setdefault(key, dict()).update(
+                {member.encode(): float(score) for (score, member) in zip(args[::2], args[1::2])})
+
+        # HSET and ZADD take pairs of values
+        if command in ('HSET', 'ZADD'):
+            assert len(args) % 2 == 0
+
+        if command == 'ZRANGE':
+            return self.zrange(key, *args)
+        if command == 'HGET':
+            return self.hget(key, *args)
+
+    def pipeline(self, transaction=True):
+        assert transaction is False
+        return FakePipeline(self)
+
+    def get(self, key):
+        return self.keys.get(key)
+
+    def set(self, key, value):
+        self.keys[key] = str(value).encode()
+
+    def incr(self, key):
+        self.set(key, int(self.keys.get(key, 0)) + 1)
+        return int(self.keys[key])
+
+    def delete(self, *keys):
+        for key in keys:
+            self.keys.pop(key, None)
+
+    def smembers(self, key):
+        return {member.encode() for member in self.keys.get(key, set())}
+
+    def hget(self, key, field):
+        return self.keys.get(key, {}).get(str(field).encode())
+
+    def zrange(self, key, start, end):
+        members = sorted(self.keys.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+        return [member for (member, _) in members][start:end + 1 or None]
+
+    def zrevrange(self, key, start, end, withscores=False):
+        members = sorted(self.keys.get(key, {}).items(), key=lambda item: (item[1], item[0]),
+                         reverse=True)[start:end + 1 or None]
+        return members if withscores else [member for (member, _) in members]
+
+
+class FakePipeline(object):
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def execute_command(self, *args):
+        self.commands.append(args)
+
+    def zrange(self, key, start, end):
+        self.execute_command('ZRANGE', key, start, end)
+
+    def hget(self, key, field):
+        self.execute_command('HGET', key, field)
+
+    def execute(self):
+        return [self.redis.execute_command(*command) for command in self.commands]
+
+
+def get_views(tmpdir):
+    state = IndexState(str(tmpdir.join('state.sqlite')))
+
+    models = get_models()
+    models[0].add_property('memberOf', 'Premier League')
+
+    for _ in record_snapshot(state, models):
+        pass
+
+    return build_views(state, TemporalIndex.from_snapshot(state), current_year=2019)
+
+
+def test_build_views(tmpdir):
+    views = get_views(tmpdir)
+
+    liverpool = TemporalIndex.get_team_alias('Liverpool F.C.')
+    chelsea = TemporalIndex.get_team_alias('Chelsea F.C.')
+
+    # clubs are keyed by their aliases
+    assert views['names'][chelsea] == 'Chelsea F.C.'
+
+    assert sorted(views['squad'][liverpool]) == [
+        ('Jordan Henderson', 'MF', 10),
+        ('Mohamed Salah', 'FW', 10),
+    ]
+
+    seasons = views['seasons'][liverpool]
+    assert min(seasons) == 1998
+    assert max(seasons) == 2019
+    assert seasons[2012] == [
+        ('Jordan Henderson', 'MF', 2011, None),
+        ('Steven Gerrard', None, 1998, 2015),
+    ]
+    assert views['seasons'][chelsea] == {
+        year: [('Mohamed Salah', 'FW', 2014, 2016)] for year in (2014, 2015, 2016)
+    }
+
+    assert dict(views['transfers']) == {
+        (chelsea, 'Liverpool F.C.'): 1,
+        (TemporalIndex.get_team_alias('Sunderland A.F.C.'), 'Liverpool F.C.'): 1,
+    }
+
+    # only Liverpool F.C. is known to be a member of a league
+    assert views['league'] == {
+        'Premier League': {
+            'FW': [('Liverpool F.C.', 'Mohamed Salah', 2017, None)],
+            'MF': [('Liverpool F.C.', 'Jordan Henderson', 2011, None)],
+        }
+    }
+
+
+def test_redis_views(tmpdir):
+    redis = FakeRedis()
+    views = RedisViews(redis, 'football')
+
+    assert views.get_squad('Liverpool F.C.') is None
+    assert views.get_squads(['Liverpool F.C.']) is None
+    assert views.get_seasons(['Liverpool F.C.'], 2016) is None
+    assert views.get_top_transfers() is None
+
+    assert views.store(get_views(tmpdir)) == 1
+
+    assert views.get_squad('Liverpool F.C.') == [
+        ('Jordan Henderson', 'MF', 10),
+        ('Mohamed Salah', 'FW', 10),
+    ]
+    assert views.get_squad('Everton F.C.') == []
+
+    assert views.get_squads(['Everton F.C.', 'Liverpool F.C.']) == {
+        'Everton F.C.': [],
+        'Liverpool F.C.': views.get_squad('Liverpool F.C.'),
+    }
+
+    assert views.get_season('Liverpool F.C.', 2016) == [('Jordan Henderson', 'MF', 2011, None)]
+    assert views.get_season('Liverpool F.C.', 1990) == []
+
+    assert views.get_seasons(['Chelsea F.C.', 'Liverpool F.C.'], 2016) == {
+        'Chelsea F.C.': [('Mohamed Salah', 'FW', 2014, 2016)],
+        'Liverpool F.C.': views.get_season('Liverpool F.C.', 2016),
+    }
+
+    assert views.get_transfers('Chelsea F.C.') == [('Liverpool F.C.', 1)]
+    assert views.get_top_transfers(limit=1) == [('Sunderland A.F.C.', 'Liverpool F.C.', 1)]
+
+    assert views.get_league_players('Premier League', 'MF') == [
+        ('Liverpool F.C.', 'Jordan Henderson', 2011, None)
+    ]
+    assert views.get_league_players('Premier League', 'GK') == []
+
+    # the previous generation is removed once the new one is stored
+    keys = set(redis.keys)
+    assert views.store(get_views(tmpdir.mkdir('next'))) == 2
+
+    assert views.get_generation() == '2'
+    assert [key for key in keys if key in redis.keys and ':views:1:' in key] == []
+    assert views.get_transfers('Chelsea F.C.') == [('Liverpool F.C.', 1)]
@@ -0,0 +1,318 @@
+import json
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from os import path
+from threading import Thread
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from grapher.cache import CacheEntry, SqliteCache
+from grapher.scripts import index_football_wiki
+from grapher.scripts.index_football_wiki import Wiki
+from grapher.state import IndexState
+
+FIXTURES = {
+    'Ole Gunnar Solskjær': 'ole_gunnar.json',
+    'Zlatan Ibrahimović': 'zlatan.json',
+    'Manchester United F.C.': 'manchester_united.json',
+    'Burnley F.C.': 'burnley.json',
+    'Massimiliano Allegri': 'massimiliano_allegri.json',
+}
+
+
+def read_fixture(fixture_name):
+    """
+    :rtype: str
+    """
+    directory = path.dirname(__file__)
+
+    with open(path.join(directory, 'fixtures', fixture_name), 'rt') as fixture:
+        return fixture.read()
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, text=''):
+        self.status_code = status_code
+        self.text = text
+        self.headers = {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError('HTTP {}'.format(self.status_code), response=self)
+
+
+class FakePool(object):
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def get(self, url, params, headers, timeout):
+        self.calls += 1
+        response = self.responses.pop(0)
+
+        if isinstance(response, Exception):
+            raise response
+
+        return response
+
+
+def get_wiki(tmpdir, concurrency=1, retries=0):
+    cache = SqliteCache(str(tmpdir.join('cache.sqlite')))
+
+    wiki = Wiki('football.wikia.com', cache=cache, concurrency=concurrency, retries=retries,
+                backoff=0)
+    wiki._fetch_templates = lambda title, entry: \
+        (CacheEntry(read_fixture(FIXTURES[title]), None, None, 0), True)
+
+    return wiki
+
+
+def test_concurrent_models_are_the_same_as_sequential(tmpdir):
+    titles = sorted(FIXTURES.keys())
+
+    sequential = get_wiki(tmpdir.mkdir('sequential'), concurrency=1).get_models_from_pages(titles)
+    concurrent = get_wiki(tmpdir.mkdir('concurrent'), concurrency=4).get_models_from_pages(titles)
+
+    assert len(sequential) == 5
+    assert [repr(model) for model in concurrent] == [repr(model) for model in sequential]
+
+
+def test_cache_is_used(tmpdir):
+    wiki = get_wiki(tmpdir, concurrency=4)
+    wiki.batch_size = 2
+    wiki.get_models_from_pages(sorted(FIXTURES.keys()))
+
+    stats = wiki.cache.get_stats()
+    assert stats['entries'] == 5
+    assert stats['misses'] == 5
+    assert stats['hits'] == 0
+
+    # now cache hits only
+    wiki._fetch_templates = None
+    assert wiki.get_page_content('Zlatan Ibrahimović') == read_fixture('zlatan.json')
+    assert len(wiki.get_models_from_pages(sorted(FIXTURES.keys()))) == 5
+
+    assert wiki.cache.get_stats()['hits'] == 6
+
+
+def test_fetch_retries(tmpdir):
+    wiki = get_wiki(tmpdir, retries=2)
+    del wiki._fetch_templates
+    wiki.pool = FakePool([
+        requests.ConnectionError('connection reset'),
+        FakeResponse(503),
+        FakeResponse(200, '{"foo": "bar"}'),
+    ])
+
+    assert wiki._fetch_templates('Foo')[0].value == '{"foo": "bar"}'
+    assert wiki.pool.calls == 3
+
+
+def test_fetch_gives_up(tmpdir):
+    wiki = get_wiki(tmpdir, retries=1)
+    del wiki._fetch_templates
+    wiki.pool = FakePool([FakeResponse(500), FakeResponse(502)])
+
+    with pytest.raises(requests.HTTPError):
+        wiki._fetch_templates('Foo')
+
+    assert wiki.pool.calls == 2
+
+    # client errors are not retried
+    wiki.pool = FakePool([FakeResponse(404)])
+
+    with pytest.raises(requests.HTTPError):
+        wiki._fetch_templates('Foo')
+
+    assert wiki.pool.calls == 1
+
+
+class FakePage(object):
+    def __init__(self, name, namespace=0):
+        self.name = name
+        self.namespace = namespace
+
+
+def test_pages_in_categories(tmpdir):
+    wiki = get_wiki(tmpdir)
+    wiki._site = type('FakeSite', (object, ), {'categories': {
+        'Players': [FakePage('Ole Gunnar Solskjær'), FakePage('Category:Foo', namespace=14)],
+        'Managers': [FakePage('Massimiliano Allegri'), FakePage('Ole Gunnar Solskjær')],
+    }})
+
+    assert list(wiki.pages_in_categories(['Players', 'Managers'])) == \
+        ['Ole Gunnar Solskjær', 'Massimiliano Allegri']
+
+
+def test_iter_models_from_pages_is_lazy(tmpdir):
+    wiki = get_wiki(tmpdir, concurrency=2)
+    wiki.batch_size = 2
+    requested = []
+
+    def titles():
+        for title in sorted(FIXTURES.keys()):
+            requested.append(title)
+            yield title
+
+    models = wiki.iter_models_from_pages(titles())
+    first = next(models)
+
+    assert first.get_name() == 'Burnley F.C.'
+    assert len(requested) < len(FIXTURES), 'Only a bounded number of pages should be requested'
+
+    assert len(list(models)) == 4
+
+
+class FakeSite(object):
+    def __init__(self, changes, categories):
+        self.changes = changes
+        self.categories = categories
+
+    def recentchanges(self, **kwargs):
+        return self.changes
+
+    def api(self, action, **kwargs):
+        titles = kwargs['titles'].split('|')
+
+        if kwargs['prop'] == 'info':
+            return {'query': {'pages': {
+                str(i): {'title': title, 'lastrevid': 100 + i, 'touched': '2019-01-09T10:00:00Z'}
+                for (i, title) in enumerate(titles)
+            }}}
+
+        return {'query': {'pages': {
+            str(i): {'title': title, 'categories': self.categories.get(title, [])}
+            for (i, title) in enumerate(titles)
+        }}}
+
+
+def test_get_changed_pages(tmpdir):
+    wiki = get_wiki(tmpdir)
+    wiki._site = FakeSite(changes=[
+        {'title': 'Zlatan Ibrahimović', 'revid': 12, 'timestamp': '2019-01-09T12:00:00Z'},
+        {'title': 'New player', 'revid': 11, 'timestamp': '2019-01-09T11:00:00Z'},
+        {'title': 'Unrelated page', 'revid': 10, 'timestamp': '2019-01-09T10:00:00Z'},
+        {'title': 'Zlatan Ibrahimović', 'revid': 9, 'timestamp': '2019-01-09T09:00:00Z'},
+    ], categories={
+        'New player': [{'title': 'Category:Players'}],
+    })
+
+    assert wiki.get_changed_pages('2019-01-09T00:00:00Z', ['Players'], {'Zlatan Ibrahimović'}) == [
+        ('New player', 11, '2019-01-09T11:00:00Z'),
+        ('Zlatan Ibrahimović', 12, '2019-01-09T12:00:00Z'),
+    ]
+
+    assert list(wiki.get_pages_revisions(['Foo', 'Bar'])) == [
+        ('Foo', 100, '2019-01-09T10:00:00Z'),
+        ('Bar', 101, '2019-01-09T10:00:00Z'),
+    ]
+
+    # pages are passed through, their revisions are recorded
+    state = IndexState(str(tmpdir.join('state.sqlite')))
+
+    assert list(wiki.record_revisions(iter(['Foo', 'Bar']), state)) == ['Foo', 'Bar']
+    assert state.get_revisions() == {
+        'Foo': (100, '2019-01-09T10:00:00Z'), 'Bar': (101, '2019-01-09T10:00:00Z')}
+
+
+def test_refresh_ignores_cache(tmpdir):
+    wiki = get_wiki(tmpdir)
+    wiki.cache.set('templates', 'Zlatan Ibrahimović', '{"title": "Zlatan Ibrahimović", "templates": []}')
+
+    assert list(wiki.iter_models_from_pages(['Zlatan Ibrahimović'])) == []
+    assert len(list(wiki.iter_models_from_pages(['Zlatan Ibrahimović'], refresh=True))) == 1
+
+    assert wiki.cache.get('templates', 'Zlatan Ibrahimović') == read_fixture('zlatan.json')
+
+
+class TemplatesApiHandler(BaseHTTPRequestHandler):
+    """
+    Serves templates metadata with an ETag, supports conditional requests
+    """
+    version = 1
+    requests = []
+
+    def do_GET(self):
+        title = parse_qs(urlparse(self.path).query)['title'][0]
+        etag = '"v{}"'.format(self.version)
+
+        self.requests.append((title, self.headers.get('If-None-Match')))
+
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        body = json.dumps({'title': title, 'version': self.version, 'templates': []})
+
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', 'Wed, 09 Jan 2019 12:50:59 GMT')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode('utf-8'))
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def templates_api(monkeypatch):
+    server = HTTPServer(('127.0.0.1', 0), TemplatesApiHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+
+    monkeypatch.setattr(index_football_wiki, 'TEMPLATES_API_URL',
+                        'http://127.0.0.1:{}/api/v1/Templates/Metadata'.format(server.server_port))
+    TemplatesApiHandler.version = 1
+    TemplatesApiHandler.requests = []
+
+    yield TemplatesApiHandler
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_cache_revalidation(tmpdir, templates_api):
+    cache = SqliteCache(str(tmpdir.join('cache.sqlite')), ttl=3600)
+    wiki = Wiki('football.wikia.com', cache=cache)
+
+    # cache miss
+    assert json.loads(wiki.get_page_content('Foo'))['version'] == 1
+    assert templates_api.requests == [('Foo', None)]
+
+    entry = cache.get_entries('templates', ['Foo'])['Foo']
+    assert entry.etag == '"v1"'
+    assert entry.last_modified == 'Wed, 09 Jan 2019 12:50:59 GMT'
+
+    # fresh cache hit
+    assert json.loads(wiki.get_page_content('Foo'))['version'] == 1
+    assert len(templates_api.requests) == 1
+
+    # the entry has expired, but it was not modified
+    cache.ttl = 0
+    assert json.loads(wiki.get_page_content('Foo'))['version'] == 1
+    assert templates_api.requests[-1] == ('Foo', '"v1"')
+    assert cache.get_entries('templates', ['Foo'])['Foo'].fetched_at > entry.fetched_at
+
+    # the entry has expired and was modified
+    templates_api.version = 2
+    assert json.loads(wiki.get_page_content('Foo'))['version'] == 2
+    assert templates_api.requests[-1] == ('Foo', '"v1"')
+    assert cache.get_entries('templates', ['Foo'])['Foo'].etag == '"v2"'
+
+    stats = cache.get_stats()
+    assert stats['revalidated'] == 1
+    assert len(templates_api.requests) == 3
+
+
+def test_models_from_worker_processes_are_the_same_as_sequential(tmpdir):
+    titles = sorted(FIXTURES.keys())
+
+    wiki = get_wiki(tmpdir)
+    sequential = list(wiki.iter_models_from_pages(titles))
+    parallel = list(wiki.iter_models_from_pages(titles, workers=2))
+
+    assert len(parallel) == 5
+    assert [model.__class__ for model in parallel] == [model.__class__ for model in sequential]
+    assert [repr(model) for model in parallel] == [repr(model) for model in sequential]